@@ -1,6 +1,16 @@
 from django.contrib import admin
 
-from .models import UserProfile
+from .models import (
+    GenerationJob,
+    GenerationQuota,
+    GenerationUsageRollup,
+    Mannequin,
+    Outfit,
+    PendingUpload,
+    StoragePurgeJob,
+    UserProfile,
+    WardrobeItem,
+)
 
 
 @admin.register(UserProfile)
@@ -9,3 +19,81 @@ class UserProfileAdmin(admin.ModelAdmin):
     search_fields = ("user__email", "firebase_uid")
     readonly_fields = ("created_at", "updated_at")
     list_filter = ("created_at",)
+    # A select box would load every user's mannequins
+    raw_id_fields = ("default_mannequin",)
+
+
+@admin.register(Mannequin)
+class MannequinAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "pose", "uploaded_at", "prepared_at")
+    search_fields = ("user_profile__user__email", "user_profile__firebase_uid")
+    readonly_fields = ("id", "version", "created_at", "uploaded_at", "updated_at", "prepared_at")
+    list_filter = ("pose",)
+    raw_id_fields = ("user_profile",)
+    # __str__ shows the owner's UID; join it in the changelist query instead of per row
+    list_select_related = ("user_profile",)
+
+
+@admin.register(WardrobeItem)
+class WardrobeItemAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "category", "uploaded_at")
+    search_fields = ("user_profile__user__email", "user_profile__firebase_uid")
+    readonly_fields = ("id", "uploaded_at", "updated_at")
+    list_filter = ("category", "uploaded_at")
+    # __str__ shows the owner's email; join it in the changelist query instead of per row
+    list_select_related = ("user_profile__user",)
+
+
+@admin.register(Outfit)
+class OutfitAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "is_favorite", "created_at")
+    search_fields = ("user_profile__user__email", "user_profile__firebase_uid")
+    readonly_fields = ("id", "created_at", "updated_at")
+    list_filter = ("is_favorite",)
+    raw_id_fields = ("user_profile", "mannequin")
+    list_select_related = ("user_profile",)
+
+
+@admin.register(PendingUpload)
+class PendingUploadAdmin(admin.ModelAdmin):
+    list_display = ("image_path", "category", "expected_size", "created_at", "expires_at")
+    search_fields = ("image_path", "user_profile__firebase_uid")
+    readonly_fields = ("created_at",)
+    list_filter = ("category",)
+
+
+@admin.register(StoragePurgeJob)
+class StoragePurgeJobAdmin(admin.ModelAdmin):
+    list_display = ("prefix", "status", "deleted_count", "attempts", "created_at", "completed_at")
+    search_fields = ("firebase_uid", "prefix")
+    readonly_fields = ("created_at", "updated_at", "completed_at")
+    list_filter = ("status",)
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "status", "attempts", "created_at", "completed_at")
+    search_fields = ("user_profile__firebase_uid",)
+    readonly_fields = ("id", "created_at", "updated_at", "completed_at")
+    list_filter = ("status",)
+    raw_id_fields = ("user_profile", "outfit")
+
+
+@admin.register(GenerationQuota)
+class GenerationQuotaAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "day_used", "month_used", "daily_limit", "monthly_limit")
+    search_fields = ("user_profile__firebase_uid",)
+    # Counters are written by accounts.quotas; only the limits are edited here
+    readonly_fields = ("day_start", "day_used", "month_start", "month_used", "updated_at")
+    raw_id_fields = ("user_profile",)
+    list_select_related = ("user_profile",)
+
+
+@admin.register(GenerationUsageRollup)
+class GenerationUsageRollupAdmin(admin.ModelAdmin):
+    list_display = ("user_profile", "day", "charged", "refunded")
+    search_fields = ("user_profile__firebase_uid",)
+    readonly_fields = ("updated_at",)
+    list_filter = ("day",)
+    raw_id_fields = ("user_profile",)
+    list_select_related = ("user_profile__user",)
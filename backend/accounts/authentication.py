@@ -1,50 +1,80 @@
-import json
+import time
 from typing import Optional
 
-from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import IntegrityError, transaction
 from django.http import HttpRequest
-import firebase_admin
-from firebase_admin import auth, credentials
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
 
-from .models import UserProfile
+from .firebase import get_app as get_firebase_app
+from .metrics import observe_token_verification
+from .models import SessionUser, UserProfile
+from .sessions import (
+    ExpiredSessionTokenError,
+    InvalidSessionTokenError,
+    RevokedSessionTokenError,
+    SessionClaims,
+    check_session_epoch,
+    is_session_token,
+    verify_session_token,
+)
+from .tracing import start_span, traced
 
 
-# Initialize Firebase Admin SDK (only once)
-def _initialize_firebase() -> None:
-    """Initialize Firebase Admin SDK if not already initialized."""
-    if settings.FIREBASE_CREDENTIALS_JSON or settings.FIREBASE_CREDENTIALS_PATH:
+def _firebase_auth():
+    """firebase_admin.auth, imported on first use so startup doesn't pay for the SDK."""
+    from firebase_admin import auth
+
+    return auth
+
+
+def _bearer_token(request: HttpRequest) -> Optional[str]:
+    """The token of an "Authorization: Bearer <token>" header, if any."""
+    parts: list[str] = request.META.get("HTTP_AUTHORIZATION", "").split()
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        return None
+    return parts[1]
+
+
+class SessionTokenAuthentication(authentication.BaseAuthentication):
+    """
+    App session token authentication (see accounts.sessions).
+
+    Clients pass the session token like a Firebase ID token:
+    Authorization: Bearer st1.<payload>.<signature>. Other bearer tokens are
+    left to FirebaseAuthentication.
+
+    The user and profile are built from the token's claims without a query;
+    the user's other fields are loaded together, with one query, when one of
+    them is first accessed (SessionUser). request.auth holds the claims.
+    """
+
+    @traced("auth.authenticate_session")
+    def authenticate(self, request: HttpRequest) -> Optional[tuple[User, SessionClaims]]:
+        token = _bearer_token(request)
+        if token is None or not is_session_token(token):
+            return None
+
         try:
-            # Check if Firebase is already initialized
-            firebase_admin.get_app()
-        except ValueError:
-            # Not initialized yet, so initialize it
-            try:
-                # Try JSON credentials first (production), then fall back to file path (local dev)
-                if settings.FIREBASE_CREDENTIALS_JSON:
-                    # Parse JSON credentials from environment variable
-                    cred_dict = json.loads(settings.FIREBASE_CREDENTIALS_JSON)
-                    cred = credentials.Certificate(cred_dict)
-                elif settings.FIREBASE_CREDENTIALS_PATH:
-                    # Load credentials from file path
-                    cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
-                else:
-                    return
-
-                # Initialize with storage bucket if configured
-                options = {}
-                if settings.FIREBASE_STORAGE_BUCKET:
-                    options["storageBucket"] = settings.FIREBASE_STORAGE_BUCKET
-                firebase_admin.initialize_app(cred, options)
-            except Exception as e:
-                print(f"Warning: Firebase Admin SDK initialization failed: {e}")
-
-
-# Initialize on module import
-_initialize_firebase()
+            claims = verify_session_token(token)
+            check_session_epoch(claims)
+        except InvalidSessionTokenError:
+            raise AuthenticationFailed("Invalid session token")
+        except ExpiredSessionTokenError:
+            raise AuthenticationFailed("Session token has expired")
+        except RevokedSessionTokenError:
+            raise AuthenticationFailed("Session has been revoked")
+
+        user = SessionUser.from_db("default", ["id"], [claims.user_id])
+        profile = UserProfile.from_db(
+            "default",
+            ["id", "user_id", "firebase_uid", "session_epoch"],
+            [claims.user_profile_id, claims.user_id, claims.firebase_uid, claims.epoch],
+        )
+        # Also caches the profile on the user (request.user.profile)
+        profile.user = user
+        return (user, claims)
 
 
 class FirebaseAuthentication(authentication.BaseAuthentication):
@@ -57,22 +87,15 @@ class FirebaseAuthentication(authentication.BaseAuthentication):
     Example: Authorization: Bearer <firebase_id_token>
     """
 
+    @traced("auth.authenticate")
     def authenticate(self, request: HttpRequest) -> Optional[tuple[User, None]]:
-        auth_header: str = request.META.get("HTTP_AUTHORIZATION", "")
-
-        if not auth_header:
+        token: Optional[str] = _bearer_token(request)
+        if token is None:
             return None
 
-        # Check if the header starts with 'Bearer '
-        parts: list[str] = auth_header.split()
-        if len(parts) != 2 or parts[0].lower() != "bearer":
-            return None
-
-        token: str = parts[1]
-
         try:
             # Verify the Firebase ID token
-            decoded_token: dict = auth.verify_id_token(token)
+            decoded_token: dict = self.timed_verify_token(token)
             firebase_uid: str = decoded_token["uid"]
             email: Optional[str] = decoded_token.get("email")
 
@@ -81,13 +104,41 @@ class FirebaseAuthentication(authentication.BaseAuthentication):
 
             return (user, None)
 
-        except auth.InvalidIdTokenError:
-            raise AuthenticationFailed("Invalid Firebase ID token")
-        except auth.ExpiredIdTokenError:
-            raise AuthenticationFailed("Firebase ID token has expired")
         except Exception as e:
+            auth = _firebase_auth()
+            # Expired tokens are a kind of invalid token, so check for them first
+            if isinstance(e, auth.ExpiredIdTokenError):
+                raise AuthenticationFailed("Firebase ID token has expired")
+            if isinstance(e, auth.InvalidIdTokenError):
+                raise AuthenticationFailed("Invalid Firebase ID token")
             raise AuthenticationFailed(f"Authentication failed: {str(e)}")
 
+    def timed_verify_token(self, token: str) -> dict:
+        """Verify a token, recording the verification latency and outcome."""
+        started = time.perf_counter()
+        result = "error"
+        try:
+            with start_span("auth.verify_token"):
+                decoded_token = self.verify_token(token)
+            result = "valid"
+            return decoded_token
+        except Exception as e:
+            auth = _firebase_auth()
+            if isinstance(e, auth.ExpiredIdTokenError):
+                result = "expired"
+            elif isinstance(e, auth.InvalidIdTokenError):
+                result = "invalid"
+            raise
+        finally:
+            observe_token_verification(result, time.perf_counter() - started)
+
+    def verify_token(self, token: str) -> dict:
+        """
+        Verify a Firebase ID token and return its decoded claims.
+        Subclasses can override this to substitute token verification.
+        """
+        return _firebase_auth().verify_id_token(token, app=get_firebase_app())
+
     def get_or_create_user(self, firebase_uid: str, email: Optional[str]) -> User:
         """
         Get or create a Django user based on Firebase UID.
@@ -0,0 +1,653 @@
+"""
+End-to-end API benchmark harness.
+
+Runs real requests through the full Django stack (middleware, DRF,
+authentication, ORM) against the configured database, with Firebase token
+verification and storage replaced by local stand-ins (see
+config/settings_benchmark.py). Used by the benchmark_api management command.
+
+Also holds a local stand-in for the upstream generation API, used by the
+benchmark_generation command to measure micro-batching and connection reuse,
+and the primary key insert benchmark of the benchmark_ids command.
+"""
+
+import base64
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import statistics
+import subprocess
+import threading
+import time
+from typing import Optional
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection, connections
+from django.utils import timezone
+
+from .authentication import FirebaseAuthentication
+from .generation import GenerationClient, GenerationRequest, MicroBatcher
+from .ids import uuid7
+from .models import Mannequin, Outfit, PendingUpload, StoragePurgeJob, UserProfile, WardrobeItem
+from .storage import (
+    UPLOAD_URL_EXPIRATION,
+    generate_mannequin_path,
+    generate_wardrobe_item_path,
+    get_backend,
+    sign_download_url,
+)
+
+# Benchmark tokens look like "bench:<firebase_uid>"; seeded users share a UID prefix
+BENCHMARK_TOKEN_PREFIX = "bench:"
+BENCHMARK_UID_PREFIX = "bench-user-"
+
+# Placeholder object body; the API never reads image bytes
+SEED_IMAGE = b"\xff\xd8\xff\xe0" + b"\x00" * 2048
+
+ENDPOINTS = ["me", "wardrobe", "mannequin", "poses", "outfits", "upload-url", "confirm"]
+
+
+class FakeFirebaseAuthentication(FirebaseAuthentication):
+    """
+    FirebaseAuthentication that accepts "bench:<uid>" tokens without calling Firebase.
+
+    BENCHMARK_AUTH_LATENCY (seconds) simulates the cost of real verification.
+    """
+
+    def verify_token(self, token: str) -> dict:
+        if not token.startswith(BENCHMARK_TOKEN_PREFIX):
+            raise ValueError("Not a benchmark token")
+
+        latency = getattr(settings, "BENCHMARK_AUTH_LATENCY", 0.0)
+        if latency:
+            time.sleep(latency)
+
+        firebase_uid = token[len(BENCHMARK_TOKEN_PREFIX) :]
+        return {"uid": firebase_uid, "email": f"{firebase_uid}@bench.local"}
+
+
+def benchmark_token(firebase_uid: str) -> str:
+    """Bearer token accepted by FakeFirebaseAuthentication."""
+    return f"{BENCHMARK_TOKEN_PREFIX}{firebase_uid}"
+
+
+def remove_benchmark_users() -> int:
+    """Delete previously seeded benchmark users and the purge jobs their deletion queues."""
+    users = User.objects.filter(profile__firebase_uid__startswith=BENCHMARK_UID_PREFIX)
+    count = users.count()
+    users.delete()
+    StoragePurgeJob.objects.filter(firebase_uid__startswith=BENCHMARK_UID_PREFIX).delete()
+    return count
+
+
+def seed_users(num_users: int, wardrobe_sizes: list[int], history_size: int = 0) -> list[str]:
+    """
+    Create benchmark users with wardrobes, mannequins, outfit history and stored objects.
+
+    Users cycle through wardrobe_sizes, so "--items 10,500" seeds a mix of
+    small and large wardrobes. Every user gets history_size outfits, one in
+    ten of them favorites.
+
+    Returns:
+        Firebase UIDs of the seeded users
+    """
+    backend = get_backend()
+    firebase_uids = []
+
+    for index in range(num_users):
+        firebase_uid = f"{BENCHMARK_UID_PREFIX}{index}"
+        user = User.objects.create_user(
+            username=f"{firebase_uid}@bench.local", email=f"{firebase_uid}@bench.local"
+        )
+
+        profile = UserProfile.objects.create(user=user, firebase_uid=firebase_uid)
+
+        mannequins = []
+        for pose, _ in Mannequin.POSE_CHOICES:
+            mannequin_version = uuid.uuid4()
+            mannequin_path = generate_mannequin_path(
+                firebase_uid, pose, str(mannequin_version), "jpg"
+            )
+            backend.save(mannequin_path, SEED_IMAGE, "image/jpeg")
+            mannequins.append(
+                Mannequin(
+                    user_profile=profile,
+                    pose=pose,
+                    version=mannequin_version,
+                    image_path=mannequin_path,
+                    image_url=sign_download_url(mannequin_path),
+                    uploaded_at=timezone.now(),
+                )
+            )
+        Mannequin.objects.bulk_create(mannequins)
+        profile.default_mannequin = mannequins[0]
+        profile.save(update_fields=["default_mannequin"])
+
+        items = []
+        for item_index in range(wardrobe_sizes[index % len(wardrobe_sizes)]):
+            item_id = uuid7()
+            category = "top" if item_index % 2 == 0 else "bottom"
+            image_path = generate_wardrobe_item_path(firebase_uid, category, str(item_id), "jpg")
+            backend.save(image_path, SEED_IMAGE, "image/jpeg")
+            items.append(
+                WardrobeItem(
+                    id=item_id,
+                    user_profile=profile,
+                    category=category,
+                    image_path=image_path,
+                    image_url=sign_download_url(image_path),
+                )
+            )
+        WardrobeItem.objects.bulk_create(items, batch_size=1000)
+
+        if items:
+            now = timezone.now()
+            Outfit.objects.bulk_create(
+                [
+                    Outfit(
+                        user_profile=profile,
+                        mannequin=mannequins[0],
+                        mannequin_version=mannequins[0].version,
+                        item_ids=[
+                            str(items[outfit_index % len(items)].id),
+                            str(items[(outfit_index + 1) % len(items)].id),
+                        ],
+                        is_favorite=outfit_index % 10 == 0,
+                        created_at=now - timedelta(minutes=outfit_index),
+                    )
+                    for outfit_index in range(history_size)
+                ],
+                batch_size=1000,
+            )
+
+        firebase_uids.append(firebase_uid)
+
+    return firebase_uids
+
+
+def prepare_confirms(firebase_uids: list[str], count: int) -> list[tuple[str, dict]]:
+    """
+    Create reservations and uploaded objects for confirm requests (untimed setup).
+
+    Returns:
+        (firebase_uid, request body) pairs, one per confirm request
+    """
+    backend = get_backend()
+    profiles = {
+        profile.firebase_uid: profile
+        for profile in UserProfile.objects.filter(firebase_uid__in=firebase_uids)
+    }
+
+    requests = []
+    reservations = []
+    for index in range(count):
+        firebase_uid = firebase_uids[index % len(firebase_uids)]
+        item_id = uuid7()
+        image_path = generate_wardrobe_item_path(firebase_uid, "top", str(item_id), "jpg")
+        backend.save(image_path, SEED_IMAGE, "image/jpeg")
+        reservations.append(
+            PendingUpload(
+                id=item_id,
+                user_profile=profiles[firebase_uid],
+                category="top",
+                image_path=image_path,
+                content_type="image/jpeg",
+                expected_size=len(SEED_IMAGE),
+                expires_at=timezone.now() + UPLOAD_URL_EXPIRATION + timedelta(hours=1),
+            )
+        )
+        requests.append((firebase_uid, {"itemId": str(item_id), "filePath": image_path}))
+
+    PendingUpload.objects.bulk_create(reservations, batch_size=1000)
+    return requests
+
+
+def build_requests(endpoint: str, firebase_uids: list[str], count: int) -> list[tuple]:
+    """
+    Build (method, path, firebase_uid, json body) tuples for one endpoint.
+    """
+    if endpoint == "confirm":
+        return [
+            ("POST", "/api/auth/wardrobe/confirm/", firebase_uid, body)
+            for firebase_uid, body in prepare_confirms(firebase_uids, count)
+        ]
+
+    templates = {
+        "me": ("GET", "/api/auth/me/", None),
+        "wardrobe": ("GET", "/api/auth/wardrobe/", None),
+        "mannequin": ("GET", "/api/auth/mannequin/", None),
+        "poses": ("GET", "/api/auth/mannequin/poses/", None),
+        "outfits": ("GET", "/api/auth/outfits/", None),
+        "upload-url": (
+            "POST",
+            "/api/auth/wardrobe/upload-url/",
+            {
+                "category": "top",
+                "filename": "shirt.jpg",
+                "contentType": "image/jpeg",
+                "fileSize": len(SEED_IMAGE),
+            },
+        ),
+    }
+    method, path, body = templates[endpoint]
+    return [
+        (method, path, firebase_uids[index % len(firebase_uids)], body) for index in range(count)
+    ]
+
+
+class InProcessTransport:
+    """Sends requests through Django's test client (no network, same process)."""
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+
+    def send(self, method: str, path: str, token: str, body: Optional[dict]) -> int:
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        if method == "GET":
+            response = self.client.get(path, **headers)
+        else:
+            response = self.client.generic(
+                method,
+                path,
+                json.dumps(body or {}),
+                content_type="application/json",
+                **headers,
+            )
+        return response.status_code
+
+    def close(self) -> None:
+        # Each worker thread owns its own database connection
+        connections.close_all()
+
+
+class HttpTransport:
+    """Sends requests to a running server over HTTP with a keep-alive session."""
+
+    def __init__(self, base_url: str):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def send(self, method: str, path: str, token: str, body: Optional[dict]) -> int:
+        response = self.session.request(
+            method,
+            f"{self.base_url}{path}",
+            json=body if method != "GET" else None,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=60,
+        )
+        return response.status_code
+
+    def close(self) -> None:
+        self.session.close()
+
+
+@dataclass
+class ScenarioResult:
+    """Latency and throughput of one endpoint at one concurrency level."""
+
+    endpoint: str
+    concurrency: int
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def as_dict(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            "endpoint": self.endpoint,
+            "concurrency": self.concurrency,
+            "requests": len(ordered),
+            "errors": self.errors,
+            "throughput_rps": round(len(ordered) / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(ordered, 50) * 1000, 3),
+                "p95": round(percentile(ordered, 95) * 1000, 3),
+                "p99": round(percentile(ordered, 99) * 1000, 3),
+                "mean": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+                "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            },
+        }
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def run_scenario(
+    endpoint: str,
+    requests: list[tuple],
+    concurrency: int,
+    transport_factory: Callable,
+) -> ScenarioResult:
+    """
+    Replay requests with a fixed number of worker threads.
+
+    Each worker owns a transport (and therefore its own DB connection or
+    HTTP session) and pulls the next request from a shared cursor until all
+    requests are sent.
+    """
+    result = ScenarioResult(endpoint=endpoint, concurrency=concurrency)
+    lock = threading.Lock()
+    cursor = iter(requests)
+
+    def worker():
+        transport = transport_factory()
+        try:
+            while True:
+                with lock:
+                    request = next(cursor, None)
+                if request is None:
+                    break
+
+                method, path, firebase_uid, body = request
+                started = time.perf_counter()
+                try:
+                    status_code = transport.send(method, path, benchmark_token(firebase_uid), body)
+                except Exception:
+                    status_code = 599
+                latency = time.perf_counter() - started
+
+                with lock:
+                    result.latencies.append(latency)
+                    if status_code >= 400:
+                        result.errors += 1
+        finally:
+            transport.close()
+
+    close_old_connections()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+
+    return result
+
+
+def git_commit() -> Optional[str]:
+    """Current git commit, recorded so results can be compared across commits."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline: dict, current: dict, threshold_pct: float) -> list[str]:
+    """
+    Find regressions between two result documents.
+
+    A scenario regresses when its p95 latency grows, or its throughput drops,
+    by more than threshold_pct percent.
+
+    Returns:
+        Human-readable regression descriptions (empty if none)
+    """
+    baseline_by_key = {
+        (result["endpoint"], result["concurrency"]): result for result in baseline["results"]
+    }
+    regressions = []
+
+    for result in current["results"]:
+        previous = baseline_by_key.get((result["endpoint"], result["concurrency"]))
+        if previous is None:
+            continue
+
+        label = f"{result['endpoint']} @ c={result['concurrency']}"
+        old_p95 = previous["latency_ms"]["p95"]
+        new_p95 = result["latency_ms"]["p95"]
+        if old_p95 and (new_p95 - old_p95) / old_p95 * 100 > threshold_pct:
+            regressions.append(f"{label}: p95 {old_p95:.1f}ms -> {new_p95:.1f}ms")
+
+        old_rps = previous["throughput_rps"]
+        new_rps = result["throughput_rps"]
+        if old_rps and (old_rps - new_rps) / old_rps * 100 > threshold_pct:
+            regressions.append(f"{label}: throughput {old_rps:.1f} -> {new_rps:.1f} req/s")
+
+    return regressions
+
+
+class FakeGenerationUpstream:
+    """
+    Local stand-in for the generation API (protocol in accounts.generation).
+
+    Every call costs call_latency plus item_latency per render, like a model
+    server that amortizes its fixed cost over a batch, and every new
+    connection costs connect_latency (the TLS handshake to a remote API).
+    Counts calls, renders and connections so benchmarks can show the effect
+    of batching and of keeping connections alive.
+    """
+
+    def __init__(
+        self, call_latency: float = 0.2, item_latency: float = 0.01, connect_latency: float = 0.05
+    ):
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self.connect_latency = connect_latency
+        self.calls = 0
+        self.renders = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGenerationUpstream":
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections open between requests
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with upstream._lock:
+                    upstream.connections += 1
+                time.sleep(upstream.connect_latency)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                image = base64.b64encode(SEED_IMAGE).decode()
+                if self.path == "/v1/generate:batch":
+                    count = len(body["requests"])
+                    payload = {"results": [{"image": image}] * count}
+                elif self.path == "/v1/generate":
+                    count = 1
+                    payload = {"image": image}
+                else:
+                    self.send_error(404)
+                    return
+
+                with upstream._lock:
+                    upstream.calls += 1
+                    upstream.renders += count
+                time.sleep(upstream.call_latency + upstream.item_latency * count)
+
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.calls = self.renders = self.connections = 0
+
+
+def run_generation_scenario(
+    label: str,
+    base_url: str,
+    jobs: int,
+    concurrency: int,
+    batch_size: int,
+    max_wait: float,
+    pool_size: int,
+    keep_alive: bool = True,
+    input_bytes: int = 150_000,
+    garments: int = 2,
+) -> ScenarioResult:
+    """
+    Render jobs through a fresh client and batcher from concurrent threads.
+
+    Each thread plays a generation worker thread: it submits one render (with
+    inputs the size of prepared 1024px JPEGs) and waits for it before the next.
+    """
+    client = GenerationClient(base_url, timeout=60, pool_size=pool_size, keep_alive=keep_alive)
+    batcher = MicroBatcher(client.generate_batch, batch_size, max_wait, max_in_flight=pool_size)
+    request = GenerationRequest(
+        mannequin=b"\x00" * input_bytes, garments=[b"\x00" * input_bytes] * garments
+    )
+
+    result = ScenarioResult(endpoint=label, concurrency=concurrency)
+    lock = threading.Lock()
+    remaining = jobs
+
+    def worker():
+        nonlocal remaining
+        while True:
+            with lock:
+                if remaining == 0:
+                    break
+                remaining -= 1
+
+            started = time.perf_counter()
+            try:
+                batcher.submit(request).result()
+                failed = False
+            except Exception:
+                failed = True
+            latency = time.perf_counter() - started
+
+            with lock:
+                result.latencies.append(latency)
+                result.errors += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+
+    client.session().close()
+    return result
+
+
+def run_id_insert_benchmark(
+    label: str, generate_id: Callable[[], uuid.UUID], rows: int, batch_size: int
+) -> dict:
+    """
+    Insert rows keyed by generate_id() into a scratch table and measure the primary key.
+
+    The table mimics a wardrobe row (UUID key, owner id, path) and is dropped
+    afterwards. Every batch is committed separately, like requests would.
+
+    Returns:
+        Insert throughput and, on PostgreSQL, the size of the table and its
+        primary key index and the index's average leaf density
+    """
+    from django.db import models, transaction
+
+    table = f"benchmark_ids_{label}"
+    id_field = models.UUIDField()
+    id_type = id_field.db_type(connection)
+    quote = connection.ops.quote_name
+    is_postgresql = connection.vendor == "postgresql"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {quote(table)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} ("
+            f"id {id_type} PRIMARY KEY, user_profile_id bigint NOT NULL, "
+            "image_path varchar(500) NOT NULL)"
+        )
+
+    try:
+        insert_sql = (
+            f"INSERT INTO {quote(table)} (id, user_profile_id, image_path) VALUES (%s, %s, %s)"
+        )
+        started = time.perf_counter()
+        for start in range(0, rows, batch_size):
+            batch = []
+            for index in range(start, min(start + batch_size, rows)):
+                row_id = generate_id()
+                batch.append(
+                    (
+                        id_field.get_db_prep_value(row_id, connection),
+                        index % 1000,
+                        f"users/bench-user-{index % 1000}/wardrobe/tops/{row_id}.jpg",
+                    )
+                )
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(insert_sql, batch)
+        elapsed = time.perf_counter() - started
+
+        result = {
+            "ids": label,
+            "rows": rows,
+            "insert_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed else 0.0,
+        }
+        if is_postgresql:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE " + quote(table))
+                cursor.execute(
+                    "SELECT pg_relation_size(%s), pg_relation_size(%s)",
+                    [table, f"{table}_pkey"],
+                )
+                table_bytes, index_bytes = cursor.fetchone()
+            result.update(table_bytes=table_bytes, index_bytes=index_bytes)
+            result["leaf_density"] = _leaf_density(f"{table}_pkey")
+        return result
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {quote(table)}")
+
+
+def _leaf_density(index: str) -> Optional[float]:
+    """Average fill of an index's leaf pages (needs the pgstattuple extension)."""
+    from django.db import DatabaseError, transaction
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT avg_leaf_density FROM pgstatindex(%s)", [index])
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
@@ -0,0 +1,126 @@
+"""
+Firebase Admin SDK app, initialized lazily once per process.
+
+Nothing here runs at import time, so management commands and migrations that
+never verify a token or touch storage don't pay for parsing credentials or
+importing the SDK. Workers can call warmup() after boot to take that cost
+before their first request instead of during it.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_app = None
+
+
+def is_configured() -> bool:
+    return bool(settings.FIREBASE_CREDENTIALS_JSON or settings.FIREBASE_CREDENTIALS_PATH)
+
+
+def get_app():
+    """
+    Return the default Firebase app, initializing it on first use.
+
+    Thread-safe: concurrent first calls initialize the app exactly once.
+
+    Raises:
+        ImproperlyConfigured: If no credentials are configured or they can't be loaded
+    """
+    global _app
+
+    if _app is None:
+        with _lock:
+            if _app is None:
+                _app = _initialize()
+    return _app
+
+
+def _initialize():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        # Already initialized elsewhere in this process
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+
+    if not is_configured():
+        raise ImproperlyConfigured(
+            "Firebase credentials are not configured "
+            "(set FIREBASE_CREDENTIALS_JSON or FIREBASE_CREDENTIALS_PATH)"
+        )
+
+    try:
+        # Try JSON credentials first (production), then fall back to file path (local dev)
+        if settings.FIREBASE_CREDENTIALS_JSON:
+            cred = credentials.Certificate(json.loads(settings.FIREBASE_CREDENTIALS_JSON))
+        else:
+            cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
+    except (ValueError, OSError) as e:
+        raise ImproperlyConfigured(f"Invalid Firebase credentials: {e}") from e
+
+    # Initialize with storage bucket if configured
+    options = {}
+    if settings.FIREBASE_STORAGE_BUCKET:
+        options["storageBucket"] = settings.FIREBASE_STORAGE_BUCKET
+
+    app = firebase_admin.initialize_app(cred, options)
+    logger.info(f"Initialized Firebase app for project {app.project_id}")
+    return app
+
+
+def delete_user(firebase_uid: str) -> None:
+    """
+    Delete a Firebase Auth user, so they can no longer sign in or refresh tokens.
+
+    A user that is already gone is not an error.
+    """
+    from firebase_admin import auth
+
+    try:
+        auth.delete_user(firebase_uid, app=get_app())
+    except auth.UserNotFoundError:
+        logger.info(f"Firebase user {firebase_uid} was already deleted")
+
+
+def warmup() -> bool:
+    """
+    Initialize Firebase and the storage client ahead of the first request.
+
+    Failures are logged, not raised: a worker without working credentials can
+    still serve health checks, and requests report the error when they need
+    Firebase.
+
+    Returns:
+        True if Firebase is ready
+    """
+    if not is_configured():
+        return False
+
+    started = time.perf_counter()
+    try:
+        get_app()
+        # Token verification module and the storage client's HTTP session
+        from firebase_admin import auth  # noqa: F401
+
+        from .storage_backends import FirebaseStorageBackend, get_storage_backend
+
+        if isinstance(get_storage_backend(), FirebaseStorageBackend):
+            from .storage_client import storage_client
+
+            storage_client.get_bucket()
+    except Exception:
+        logger.exception("Firebase warmup failed")
+        return False
+
+    logger.info(f"Firebase warmup took {(time.perf_counter() - started) * 1000:.0f}ms")
+    return True
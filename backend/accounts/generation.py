@@ -0,0 +1,522 @@
+"""
+Rendering outfits with the upstream generation API.
+
+Outfits are rendered by background workers (the run_generation_worker
+command), not in requests. Every upstream call has a fixed cost (connection,
+queueing, model warm-up) on top of the per-render cost, so a worker runs
+several jobs concurrently and a MicroBatcher groups the renders they request
+within GENERATION_BATCH_WAIT_MS into one batch call of up to
+GENERATION_BATCH_SIZE renders. Calls go over one session per process whose
+connections are kept alive and reused.
+
+Upstream protocol (JSON, images base64-encoded):
+    POST {GENERATION_API_URL}/v1/generate
+        {"mannequin": "...", "garments": ["...", ...]} -> {"image": "..."}
+    POST {GENERATION_API_URL}/v1/generate:batch
+        {"requests": [<generate body>, ...]} -> {"results": [{"image": "..."} or {"error": "..."}]}
+"""
+
+import base64
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from typing import NamedTuple, Optional, Union
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+import requests
+from requests.adapters import HTTPAdapter
+
+from .generation_inputs import UndecodableImageError, load_generation_inputs
+from .models import GenerationJob, Outfit, WardrobeItem
+from .quotas import charge_generation, refund_generation
+from .renders import attach_render
+from .storage import delete_file, generate_render_path, save_file
+
+logger = logging.getLogger(__name__)
+
+CLIENT_SETTINGS = {
+    "GENERATION_API_URL",
+    "GENERATION_API_KEY",
+    "GENERATION_BATCH_SIZE",
+    "GENERATION_BATCH_WAIT_MS",
+    "GENERATION_POOL_SIZE",
+    "GENERATION_TIMEOUT",
+}
+
+RENDER_CONTENT_TYPE = "image/jpeg"
+
+# A running job that hasn't finished for this long is assumed to belong to a dead worker
+STALE_JOB_TIMEOUT = timedelta(minutes=10)
+
+# Give up on a job after this many failed runs
+MAX_ATTEMPTS = 3
+
+
+class GenerationError(Exception):
+    """The upstream API failed or rejected a render."""
+
+
+class UnrenderableOutfitError(Exception):
+    """The outfit can't be rendered (no mannequin or no items left); retrying won't help."""
+
+
+class GenerationRequest(NamedTuple):
+    """Prepared inputs of one render."""
+
+    mannequin: bytes
+    garments: list[bytes]
+
+
+def _encode(request: GenerationRequest) -> dict:
+    return {
+        "mannequin": base64.b64encode(request.mannequin).decode(),
+        "garments": [base64.b64encode(garment).decode() for garment in request.garments],
+    }
+
+
+class GenerationClient:
+    """
+    Client of the upstream generation API.
+
+    Uses one requests session per process, mounted with a connection pool of
+    pool_size kept-alive connections (pool_block makes callers wait for a
+    pooled connection rather than open throwaway ones). Sessions are
+    recreated after a fork because sockets must not be shared between processes.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str = "",
+        timeout: float = 120.0,
+        pool_size: int = 4,
+        keep_alive: bool = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._session: Optional[requests.Session] = None
+
+    def session(self) -> requests.Session:
+        """Return this process's session, creating it on first use."""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._create_session()
+                    self._pid = pid
+        return self._session
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if self.api_key:
+            session.headers["Authorization"] = f"Bearer {self.api_key}"
+        if not self.keep_alive:
+            # Only for comparison in benchmarks: a new connection per call
+            session.headers["Connection"] = "close"
+        return session
+
+    def _post(self, path: str, body: dict) -> dict:
+        try:
+            response = self.session().post(
+                f"{self.base_url}{path}", json=body, timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise GenerationError(f"Generation API call to {path} failed: {e}") from e
+
+    def generate(self, request: GenerationRequest) -> bytes:
+        """
+        Render one outfit.
+
+        Returns:
+            The rendered image (JPEG)
+
+        Raises:
+            GenerationError: If the call fails
+        """
+        data = self._post("/v1/generate", _encode(request))
+        return base64.b64decode(data["image"])
+
+    def generate_batch(self, batch: list[GenerationRequest]) -> list[Union[bytes, GenerationError]]:
+        """
+        Render several outfits with one call (a single one uses the plain endpoint).
+
+        Returns:
+            Per request, in order, the rendered image or the error for that render
+
+        Raises:
+            GenerationError: If the call as a whole fails
+        """
+        if len(batch) == 1:
+            return [self.generate(batch[0])]
+
+        data = self._post("/v1/generate:batch", {"requests": [_encode(r) for r in batch]})
+        results = data.get("results", [])
+        if len(results) != len(batch):
+            raise GenerationError(f"Expected {len(batch)} results, got {len(results)}")
+        return [
+            (
+                base64.b64decode(result["image"])
+                if "image" in result
+                else GenerationError(result.get("error", "Render failed"))
+            )
+            for result in results
+        ]
+
+
+class MicroBatcher:
+    """
+    Groups items submitted from many threads into batches for one handler call.
+
+    A batch is dispatched when it has max_batch_size items or max_wait seconds
+    after its first item arrived, whichever comes first. Up to max_in_flight
+    batches are handled concurrently, so a slow call doesn't hold up the next
+    batch. While all of them are busy items keep queueing, and the next batch
+    takes as many of them as fit at once.
+
+    The handler gets a list of items and returns a list of results in the same
+    order; an Exception in the results fails just that item's future.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list], list],
+        max_batch_size: int,
+        max_wait: float,
+        max_in_flight: int = 1,
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._queue: queue.Queue[tuple[object, Future]] = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="generation-batch"
+        )
+        self._slots = threading.Semaphore(max_in_flight)
+        self._collector: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Batch size counters, for benchmarks and logs (guarded by _lock)
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item) -> Future:
+        """Queue an item; the future resolves to its result once its batch is handled."""
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(
+                        target=self._collect, name="generation-batcher", daemon=True
+                    )
+                    self._collector.start()
+
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            # Wait for a free slot first, so items queue up meanwhile instead of
+            # being split into batches waiting for the executor
+            self._slots.acquire()
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: list[tuple[object, Future]]) -> None:
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+
+        try:
+            results = self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+@functools.cache
+def get_generation_batcher() -> MicroBatcher:
+    """Return this process's batcher of upstream generation calls, configured from settings."""
+    client = GenerationClient(
+        settings.GENERATION_API_URL,
+        api_key=settings.GENERATION_API_KEY,
+        timeout=settings.GENERATION_TIMEOUT,
+        pool_size=settings.GENERATION_POOL_SIZE,
+    )
+    return MicroBatcher(
+        client.generate_batch,
+        max_batch_size=settings.GENERATION_BATCH_SIZE,
+        max_wait=settings.GENERATION_BATCH_WAIT_MS / 1000,
+        max_in_flight=settings.GENERATION_POOL_SIZE,
+    )
+
+
+@receiver(setting_changed)
+def _reset_generation_batcher(setting: str, **kwargs) -> None:
+    if setting in CLIENT_SETTINGS:
+        get_generation_batcher.cache_clear()
+
+
+def enqueue_generation(outfit: Outfit) -> GenerationJob:
+    """
+    Queue a render of an outfit, charging it to the owner's generation quota.
+
+    Enqueueing is idempotent: an unfinished job for the same outfit is reused
+    (and not charged again). Concurrent requests for the same outfit are
+    serialized by the unique_active_generation_job constraint.
+
+    Returns:
+        The pending or running job
+
+    Raises:
+        QuotaExceededError: If the owner has used up their generations
+    """
+    active = GenerationJob.objects.filter(
+        outfit=outfit,
+        status__in=[GenerationJob.STATUS_PENDING, GenerationJob.STATUS_RUNNING],
+    )
+    existing = active.first()
+    if existing:
+        return existing
+
+    try:
+        with transaction.atomic():
+            job = GenerationJob.objects.create(
+                user_profile_id=outfit.user_profile_id, outfit=outfit
+            )
+            charge_generation(outfit.user_profile_id, job=job, now=job.created_at)
+    except IntegrityError:
+        # A concurrent request queued (and charged) the job first
+        existing = active.first()
+        if existing is None:
+            raise
+        return existing
+    return job
+
+
+def fail_exhausted_generation_jobs() -> int:
+    """
+    Fail and refund stale running jobs that have no attempts left.
+
+    A job whose run kills its worker (e.g. an input too large to process)
+    is never marked failed by run_generation_job, so it ends up here rather
+    than being reclaimed forever.
+
+    Returns:
+        Number of jobs failed
+    """
+    stale_before = timezone.now() - STALE_JOB_TIMEOUT
+
+    with transaction.atomic():
+        jobs = list(
+            GenerationJob.objects.select_for_update(skip_locked=True).filter(
+                status=GenerationJob.STATUS_RUNNING,
+                updated_at__lt=stale_before,
+                attempts__gte=MAX_ATTEMPTS,
+            )
+        )
+        for job in jobs:
+            logger.warning(f"Generation job {job.id} stalled on its last attempt; failing it")
+            job.status = GenerationJob.STATUS_FAILED
+            job.last_error = job.last_error or "The worker stopped while running the job"
+            job.save(update_fields=["status", "last_error", "updated_at"])
+            refund_generation(job.user_profile_id, job.created_at, job=job)
+    return len(jobs)
+
+
+def claim_next_generation_job() -> Optional[GenerationJob]:
+    """
+    Claim the oldest runnable job (pending, or running but stale with attempts left).
+
+    Rows are locked with SKIP LOCKED so several workers (and the threads of
+    one worker) can drain the queue concurrently without picking up the same job.
+
+    Returns:
+        The claimed job, or None if the queue is empty
+    """
+    stale_before = timezone.now() - STALE_JOB_TIMEOUT
+
+    with transaction.atomic():
+        job = (
+            GenerationJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=GenerationJob.STATUS_PENDING)
+                | Q(
+                    status=GenerationJob.STATUS_RUNNING,
+                    updated_at__lt=stale_before,
+                    attempts__lt=MAX_ATTEMPTS,
+                )
+            )
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = GenerationJob.STATUS_RUNNING
+        job.attempts += 1
+        job.save(update_fields=["status", "attempts", "updated_at"])
+
+    return job
+
+
+def build_generation_request(outfit: Outfit) -> GenerationRequest:
+    """
+    Load the prepared inputs of an outfit's mannequin and items.
+
+    Raises:
+        UnrenderableOutfitError: If the outfit has no mannequin or none of its items are left
+    """
+    if outfit.mannequin is None:
+        raise UnrenderableOutfitError("Outfit has no mannequin")
+
+    # Items deleted from the wardrobe since are left out; the rest keep the outfit's order
+    item_paths = {
+        str(item_id): image_path
+        for item_id, image_path in WardrobeItem.objects.filter(
+            user_profile_id=outfit.user_profile_id, id__in=outfit.item_ids
+        ).values_list("id", "image_path")
+    }
+    garment_paths = [item_paths[item_id] for item_id in outfit.item_ids if item_id in item_paths]
+    if not garment_paths:
+        raise UnrenderableOutfitError("None of the outfit's items are left")
+
+    inputs = load_generation_inputs([outfit.mannequin.image_path, *garment_paths])
+    return GenerationRequest(
+        mannequin=inputs[outfit.mannequin.image_path],
+        garments=[inputs[path] for path in garment_paths],
+    )
+
+
+def run_generation_job(job: GenerationJob, batcher: Optional[MicroBatcher] = None) -> GenerationJob:
+    """
+    Render a job's outfit and store the render on it.
+
+    The render is requested through the batcher, so it blocks until the batch
+    it joined has been generated. Failed jobs are retried up to MAX_ATTEMPTS
+    times, except for outfits that can't be rendered at all (including ones
+    with an image that can't be decoded).
+
+    Args:
+        job: A claimed (running) job
+        batcher: Batcher of upstream calls (default get_generation_batcher())
+
+    Returns:
+        The updated job
+    """
+    batcher = batcher or get_generation_batcher()
+
+    try:
+        outfit = Outfit.objects.select_related("mannequin", "user_profile").get(id=job.outfit_id)
+        image = batcher.submit(build_generation_request(outfit)).result()
+
+        # Named after the job: every generation gets a new, immutable path
+        image_path = generate_render_path(outfit.user_profile.firebase_uid, str(job.id))
+        save_file(image_path, image, RENDER_CONTENT_TYPE)
+        if not attach_render(outfit, image_path, len(image)):
+            # The outfit was deleted while it was being rendered
+            delete_file(image_path)
+
+        job.status = GenerationJob.STATUS_COMPLETED
+        job.completed_at = timezone.now()
+        job.last_error = ""
+        job.save(update_fields=["status", "completed_at", "last_error", "updated_at"])
+
+    except Exception as e:
+        logger.warning(f"Generation job {job.id} failed (attempt {job.attempts}): {e}")
+        job.last_error = str(e)
+        job.status = (
+            GenerationJob.STATUS_FAILED
+            if isinstance(e, (UnrenderableOutfitError, UndecodableImageError, Outfit.DoesNotExist))
+            or job.attempts >= MAX_ATTEMPTS
+            else GenerationJob.STATUS_PENDING
+        )
+        with transaction.atomic():
+            job.save(update_fields=["last_error", "status", "updated_at"])
+            if job.status == GenerationJob.STATUS_FAILED:
+                # The user didn't get a render, so they get the generation back
+                refund_generation(job.user_profile_id, job.created_at, job=job)
+
+    return job
+
+
+def run_pending_generation_jobs(concurrency: int, limit: Optional[int] = None) -> int:
+    """
+    Drain the generation queue with several threads.
+
+    Each thread runs one job at a time; the jobs they run concurrently are
+    what the batcher groups into batch calls, so concurrency should be at
+    least GENERATION_BATCH_SIZE times GENERATION_POOL_SIZE to keep batches full.
+
+    Args:
+        concurrency: Number of jobs run at the same time
+        limit: Maximum number of jobs to run, or None to run until the queue is empty
+
+    Returns:
+        Number of jobs processed
+    """
+    fail_exhausted_generation_jobs()
+    batcher = get_generation_batcher()
+    lock = threading.Lock()
+    claimed = 0
+
+    def work() -> int:
+        nonlocal claimed
+        processed = 0
+        try:
+            while True:
+                with lock:
+                    if limit is not None and claimed >= limit:
+                        break
+                    claimed += 1
+                job = claim_next_generation_job()
+                if job is None:
+                    break
+                run_generation_job(job, batcher)
+                processed += 1
+        finally:
+            # Each thread has its own database connection
+            close_old_connections()
+        return processed
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="generation") as executor:
+        return sum(executor.map(lambda _: work(), range(concurrency)))
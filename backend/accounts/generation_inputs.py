@@ -0,0 +1,201 @@
+"""
+Model-ready inputs for the generation API.
+
+Originals can be 10 MB each, but the generator only needs a downscaled JPEG.
+Each image version is prepared once (image_prep.make_generation_input) and the
+result is stored next to the original (storage.generate_prepared_input_path),
+so every generation that references the same wardrobe item or mannequin pose
+reuses it. Workers also keep recently used inputs in a local on-disk LRU
+cache, which saves the storage round trip for items used over and over.
+
+Image paths are never overwritten (a new version gets a new path), so cached
+inputs never need invalidating; they are deleted with their image.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import logging
+import os
+from pathlib import Path
+import tempfile
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import record_cache_lookup
+from .storage import generate_prepared_input_path, read_file_range, save_file, stat_file
+
+logger = logging.getLogger(__name__)
+
+CACHE_SETTINGS = {"GENERATION_INPUT_CACHE_DIR", "GENERATION_INPUT_CACHE_BYTES"}
+
+# Concurrent storage reads when loading the inputs of one generation
+INPUT_WORKERS = 8
+
+
+class UndecodableImageError(Exception):
+    """An original image can't be decoded, so no input can be prepared from it."""
+
+
+class LocalInputCache:
+    """
+    Size-bounded cache of prepared inputs in a local directory.
+
+    Files are named by a hash of their storage path. Recency is tracked in
+    memory and mirrored in file modification times, so a restarted worker
+    picks up the existing files in LRU order.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = [path for path in self.directory.iterdir() if not path.name.startswith(".")]
+        for path in sorted(files, key=lambda path: path.stat().st_mtime):
+            self._entries[path.name] = path.stat().st_size
+            self._size += self._entries[path.name]
+        self._evict()
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached bytes for key, or None if they aren't cached."""
+        name = self._name(key)
+        path = self.directory / name
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(name, 0)
+            return None
+
+        with self._lock:
+            if name not in self._entries:
+                # Written by another process sharing the directory
+                self._entries[name] = len(data)
+                self._size += len(data)
+            self._entries.move_to_end(name)
+        os.utime(path)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Cache bytes for key, evicting the least recently used files to stay within size."""
+        if len(data) > self.max_bytes:
+            return
+        name = self._name(key)
+
+        # Write to a temporary file and rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".input-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.directory / name)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+        self._evict()
+
+    def _evict(self) -> None:
+        victims = []
+        with self._lock:
+            while self._size > self.max_bytes and self._entries:
+                name, size = self._entries.popitem(last=False)
+                self._size -= size
+                victims.append(name)
+        for name in victims:
+            (self.directory / name).unlink(missing_ok=True)
+
+
+@functools.cache
+def get_local_input_cache() -> LocalInputCache:
+    """Return this process's local input cache, configured from settings."""
+    return LocalInputCache(
+        settings.GENERATION_INPUT_CACHE_DIR, settings.GENERATION_INPUT_CACHE_BYTES
+    )
+
+
+@receiver(setting_changed)
+def _reset_local_input_cache(setting: str, **kwargs) -> None:
+    if setting in CACHE_SETTINGS:
+        get_local_input_cache.cache_clear()
+
+
+def get_prepared_input(image_path: str) -> bytes:
+    """
+    Return the generation input for an image, preparing it on first use.
+
+    Looks in the local cache, then in storage; only if neither has the input
+    is the original downloaded and prepared, and the result stored in both.
+
+    Args:
+        image_path: Storage path of a wardrobe item or mannequin image
+
+    Returns:
+        The JPEG-encoded input
+
+    Raises:
+        UndecodableImageError: If the original can't be decoded
+    """
+    input_path = generate_prepared_input_path(image_path)
+    cache = get_local_input_cache()
+
+    data = cache.get(input_path)
+    record_cache_lookup("generation_input_local", data is not None)
+    if data is not None:
+        return data
+
+    stored = stat_file(input_path)
+    record_cache_lookup("generation_input_storage", stored is not None)
+    if stored is not None:
+        data = read_file_range(input_path)
+    else:
+        # Pillow is only loaded by the processes that prepare images
+        from PIL import UnidentifiedImageError
+
+        from .image_prep import GENERATION_INPUT_CONTENT_TYPE, make_generation_input
+
+        try:
+            data = make_generation_input(read_file_range(image_path))
+        except UnidentifiedImageError as e:
+            raise UndecodableImageError(f"Can't decode {image_path}") from e
+        save_file(input_path, data, GENERATION_INPUT_CONTENT_TYPE)
+        logger.info(f"Prepared generation input {input_path} ({len(data)} bytes)")
+
+    cache.put(input_path, data)
+    return data
+
+
+def load_generation_inputs(
+    image_paths: list[str], max_workers: int = INPUT_WORKERS
+) -> dict[str, bytes]:
+    """
+    Load the prepared inputs of several images concurrently.
+
+    Args:
+        image_paths: Storage paths of the images (duplicates are loaded once)
+        max_workers: Maximum number of concurrent loads
+
+    Returns:
+        Prepared inputs by image path
+    """
+    unique_paths = list(dict.fromkeys(image_paths))
+    if not unique_paths:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_paths))) as executor:
+        return dict(zip(unique_paths, executor.map(get_prepared_input, unique_paths)))
@@ -0,0 +1,75 @@
+"""
+Time-ordered UUIDs (version 7, RFC 9562) for primary keys of high-insert tables.
+
+Random (version 4) keys land at random positions in the primary key B-tree:
+every insert touches a different leaf page, pages split half-full and the
+index outgrows the cache as the table grows. Version 7 UUIDs start with a
+millisecond timestamp, so new keys are appended at the right edge of the
+index like a sequence would be, while staying valid UUIDs in the same
+column type and string format (storage paths named after ids are unchanged).
+
+They reveal when a row was created, which wardrobe items, outfits and jobs
+already expose through their timestamps.
+"""
+
+from datetime import datetime
+from datetime import timezone as dt_timezone
+import os
+import threading
+import time
+import uuid
+
+# 12 bits between the version and variant fields hold a counter, so ids from
+# one process are strictly increasing even within the same millisecond
+COUNTER_BITS = 12
+COUNTER_MAX = (1 << COUNTER_BITS) - 1
+
+RANDOM_BITS = 62
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a version 7 UUID.
+
+    Layout: 48-bit Unix time in milliseconds, version (7), 12-bit counter,
+    variant (RFC 9562), 62 random bits. The counter starts at a random value
+    in its lower half each millisecond and is incremented for every further
+    id in that millisecond; if it overflows (or the clock goes backwards)
+    the timestamp is advanced instead, so ordering is never violated.
+
+    Usable as a model field default (default=uuid7).
+    """
+    global _last_ms, _counter
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = int.from_bytes(os.urandom(2), "big") & (COUNTER_MAX >> 1)
+        elif _counter < COUNTER_MAX:
+            _counter += 1
+        else:
+            _last_ms += 1
+            _counter = 0
+        timestamp_ms, counter = _last_ms, _counter
+
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << RANDOM_BITS) - 1)
+    return uuid.UUID(
+        int=(timestamp_ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits
+    )
+
+
+def uuid7_time(value: uuid.UUID) -> datetime:
+    """
+    When a version 7 UUID was generated (millisecond precision).
+
+    Raises:
+        ValueError: If the UUID isn't version 7
+    """
+    if value.version != 7:
+        raise ValueError(f"Not a version 7 UUID: {value}")
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=dt_timezone.utc)
@@ -0,0 +1,100 @@
+"""Image processing for assets precomputed from uploaded images (Pillow)."""
+
+import io
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+from pillow_heif import register_heif_opener
+
+# Uploads may be HEIC/HEIF (the iPhone camera default), which Pillow can't decode itself
+register_heif_opener()
+
+# Longest side of thumbnails, in pixels
+THUMBNAIL_SIZE = 256
+
+THUMBNAIL_QUALITY = 80
+
+THUMBNAIL_CONTENT_TYPE = "image/jpeg"
+
+# Longest side of the inputs sent to the generation API, in pixels
+GENERATION_INPUT_SIZE = 1024
+
+GENERATION_INPUT_QUALITY = 85
+
+GENERATION_INPUT_CONTENT_TYPE = "image/jpeg"
+
+# Transparent areas of cutouts (e.g. garments with the background removed) become this
+CUTOUT_BACKGROUND = (255, 255, 255)
+
+
+class Thumbnail(NamedTuple):
+    """A JPEG thumbnail and the dimensions of the image it was made from."""
+
+    data: bytes
+    width: int
+    height: int
+
+
+def make_thumbnail(data: bytes, size: int = THUMBNAIL_SIZE) -> Thumbnail:
+    """
+    Downscale an image to a JPEG thumbnail.
+
+    The EXIF orientation is applied first, so the thumbnail and the reported
+    dimensions are upright like the image a browser displays.
+
+    Args:
+        data: Encoded image (any format Pillow can open)
+        size: Longest side of the thumbnail, in pixels
+
+    Returns:
+        The thumbnail and the upright width and height of the original
+
+    Raises:
+        PIL.UnidentifiedImageError: If the data isn't an image Pillow can decode
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        image.thumbnail((size, size))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+
+    return Thumbnail(output.getvalue(), width, height)
+
+
+def make_generation_input(data: bytes, size: int = GENERATION_INPUT_SIZE) -> bytes:
+    """
+    Downscale and recompress an image to the input the generation API expects.
+
+    Like make_thumbnail the image is turned upright first. Transparent areas
+    are flattened onto CUTOUT_BACKGROUND, so a cutout keeps its shape in the
+    JPEG instead of getting a black background.
+
+    Args:
+        data: Encoded image (any format Pillow can open)
+        size: Longest side of the input, in pixels (smaller images are not enlarged)
+
+    Returns:
+        The JPEG-encoded input
+
+    Raises:
+        PIL.UnidentifiedImageError: If the data isn't an image Pillow can decode
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, CUTOUT_BACKGROUND)
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=GENERATION_INPUT_QUALITY, optimize=True)
+
+    return output.getvalue()
@@ -0,0 +1,98 @@
+"""Per-request accounting of database queries and storage calls."""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+import functools
+import time
+from typing import Callable, Optional
+
+from django.db import connection
+
+from . import metrics, tracing
+from .load_shedding import get_storage_guard
+
+
+@dataclass
+class RequestStats:
+    """Work done while handling one request."""
+
+    db_queries: int = 0
+    db_time: float = 0.0
+    storage_calls: int = 0
+    storage_time: float = 0.0
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats of the request being handled in this context, if any."""
+    return _current_stats.get()
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@contextmanager
+def collect_request_stats() -> Iterator[RequestStats]:
+    """Count queries and storage calls made inside the block."""
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    try:
+        with connection.execute_wrapper(_record_query):
+            yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def record_storage_call(operation: str, duration: float) -> None:
+    """Record a storage call's latency and attribute it to the current request, if any."""
+    metrics.observe_storage_call(operation, duration)
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.storage_calls += 1
+        stats.storage_time += duration
+
+
+def instrument_storage_call(operation: str, guarded: bool = False) -> Callable:
+    """
+    Decorator that times a storage helper and records it as one storage call.
+
+    The call also gets a "storage.<operation>" tracing span when tracing is enabled.
+    Guarded calls go through the storage guard's concurrency limit and circuit
+    breaker first (see accounts.load_shedding) and may raise StorageUnavailableError.
+    """
+    span_name = f"storage.{operation}"
+
+    def decorator(func: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with tracing.start_span(span_name):
+                    return func(*args, **kwargs)
+            finally:
+                record_storage_call(operation, time.perf_counter() - started)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if guarded:
+                with get_storage_guard().admit():
+                    return timed(*args, **kwargs)
+            return timed(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,220 @@
+"""
+Load shedding for storage calls: an adaptive concurrency limit and a circuit breaker.
+
+When storage slows down, every worker thread ends up blocked in a storage
+call and the whole API stalls, including requests that don't need storage.
+Storage calls made through the helpers in accounts.storage are therefore
+admitted by a per-process StorageGuard:
+
+- AIMDLimiter caps concurrent storage calls. The limit grows by one per
+  limit's worth of fast calls (additive increase) and is cut by a constant
+  factor on every slow or failed call (multiplicative decrease), so it
+  settles around the concurrency storage can actually sustain.
+- CircuitBreaker opens after STORAGE_BREAKER_FAILURES consecutive slow or
+  failed calls and rejects every call for STORAGE_BREAKER_OPEN_SECONDS.
+  After that a single probe call is let through; it closes the breaker if
+  it succeeds and reopens it otherwise.
+
+Rejected calls raise StorageUnavailableError immediately instead of waiting.
+Read endpoints fall back to the URLs stored in the database, and write
+endpoints decorated with @shed_load answer 503 with Retry-After.
+"""
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+import functools
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .metrics import record_storage_shed
+
+GUARD_SETTINGS = {
+    "STORAGE_CONCURRENCY_MIN",
+    "STORAGE_CONCURRENCY_MAX",
+    "STORAGE_SLOW_CALL_SECONDS",
+    "STORAGE_BREAKER_FAILURES",
+    "STORAGE_BREAKER_OPEN_SECONDS",
+}
+
+
+class StorageUnavailableError(Exception):
+    """A storage call was shed instead of being sent to storage."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Storage call shed ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AIMDLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease."""
+
+    def __init__(self, min_limit: int, max_limit: int, backoff: float = 0.9):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self._limit = float(max_limit)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, ok: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if ok:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            else:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through (0 when closed)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        return self.retry_after() > 0
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() < self._opened_at + self.open_seconds:
+                return False
+            self._probing = True
+            return True
+
+    def cancel(self) -> None:
+        """Give back an admission that didn't result in a call."""
+        with self._lock:
+            self._probing = False
+
+    def release(self, ok: bool) -> None:
+        with self._lock:
+            was_probe = self._probing
+            self._probing = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if was_probe or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class StorageGuard:
+    """Admission control for storage calls in this process."""
+
+    def __init__(
+        self,
+        min_concurrency: int,
+        max_concurrency: int,
+        slow_call_seconds: float,
+        breaker_failures: int,
+        breaker_open_seconds: float,
+    ):
+        self.limiter = AIMDLimiter(min_concurrency, max_concurrency)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_open_seconds)
+        self.slow_call_seconds = slow_call_seconds
+
+    def retry_after(self) -> float:
+        return self.breaker.retry_after()
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        """Run the block as one storage call, or raise StorageUnavailableError."""
+        if not self.breaker.try_acquire():
+            record_storage_shed("circuit_open")
+            raise StorageUnavailableError("circuit_open", self.breaker.retry_after())
+        if not self.limiter.try_acquire():
+            self.breaker.cancel()
+            record_storage_shed("concurrency")
+            raise StorageUnavailableError("concurrency", 1.0)
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            ok = ok and time.perf_counter() - started <= self.slow_call_seconds
+            self.limiter.release(ok)
+            self.breaker.release(ok)
+
+
+@functools.cache
+def get_storage_guard() -> StorageGuard:
+    """Return this process's storage guard, configured from settings."""
+    return StorageGuard(
+        min_concurrency=settings.STORAGE_CONCURRENCY_MIN,
+        max_concurrency=settings.STORAGE_CONCURRENCY_MAX,
+        slow_call_seconds=settings.STORAGE_SLOW_CALL_SECONDS,
+        breaker_failures=settings.STORAGE_BREAKER_FAILURES,
+        breaker_open_seconds=settings.STORAGE_BREAKER_OPEN_SECONDS,
+    )
+
+
+@receiver(setting_changed)
+def _reset_storage_guard(setting: str, **kwargs) -> None:
+    if setting in GUARD_SETTINGS:
+        get_storage_guard.cache_clear()
+
+
+def storage_unavailable_response(retry_after: float) -> Response:
+    """503 response telling the client when to retry."""
+    return Response(
+        {"error": "Storage is temporarily unavailable. Try again later."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def shed_load(view: Callable) -> Callable:
+    """
+    Answer 503 with Retry-After instead of running a storage-bound DRF view
+    while the storage circuit is open, or when one of its storage calls is shed.
+    """
+
+    @functools.wraps(view)
+    def wrapper(request: Request, *args, **kwargs):
+        guard = get_storage_guard()
+        if guard.breaker.is_open():
+            record_storage_shed("circuit_open")
+            return storage_unavailable_response(guard.retry_after())
+        try:
+            return view(request, *args, **kwargs)
+        except StorageUnavailableError as e:
+            return storage_unavailable_response(e.retry_after)
+
+    return wrapper
@@ -0,0 +1,77 @@
+"""Serve signed upload/download URLs issued by the local filesystem storage backend."""
+
+from django.http import FileResponse, HttpRequest, HttpResponse, JsonResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .storage import (
+    IMMUTABLE_CACHE_CONTROL,
+    MAX_FILE_SIZE_BYTES,
+    get_backend,
+    is_immutable_path,
+)
+from .storage_backends import LocalFileSystemStorageBackend
+
+
+@csrf_exempt
+@require_http_methods(["GET", "HEAD", "PUT"])
+def local_storage_file(request: HttpRequest, file_path: str) -> HttpResponse:
+    """
+    Read or write an object through a URL signed by LocalFileSystemStorageBackend.
+
+    Query parameters:
+        expires: Unix timestamp after which the URL is rejected
+        signature: HMAC over method, path, expiry and (for PUT) content type
+
+    PUT requests must send the Content-Type the URL was signed for, like a
+    V4-signed Cloud Storage upload URL.
+    """
+    backend = get_backend()
+    if not isinstance(backend, LocalFileSystemStorageBackend):
+        return JsonResponse({"error": "Local storage is not enabled"}, status=404)
+
+    method = "GET" if request.method == "HEAD" else request.method
+    content_type = request.content_type if method == "PUT" else ""
+
+    # SECURITY: Every request must carry an unexpired signature for this exact operation
+    if not backend.verify_signature(
+        method,
+        file_path,
+        request.GET.get("expires"),
+        request.GET.get("signature"),
+        content_type,
+    ):
+        return JsonResponse({"error": "Invalid or expired signature"}, status=403)
+
+    if method == "PUT":
+        if len(request.body) > MAX_FILE_SIZE_BYTES:
+            return JsonResponse({"error": "File too large"}, status=413)
+        # Like x-goog-if-generation-match: 0 - immutable objects can only be created
+        if is_immutable_path(file_path) and backend.exists(file_path):
+            return JsonResponse({"error": "Object already exists"}, status=412)
+        backend.save(file_path, request.body, content_type)
+        return HttpResponse(status=200)
+
+    stored = backend.stat(file_path)
+    if stored is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+
+    # Like Cloud Storage: a strong ETag for revalidation, and the object's
+    # Cache-Control (immutable objects are cached for as long as their URL lives)
+    etag = f'"{stored.size:x}-{int(stored.updated.timestamp() * 1000):x}"'
+    if is_immutable_path(file_path):
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = "private, max-age=0"
+
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponse(status=304)
+    else:
+        response = FileResponse(
+            open(backend.local_path(file_path), "rb"),
+            content_type=stored.content_type or "application/octet-stream",
+        )
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    return response
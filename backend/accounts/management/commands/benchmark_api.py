@@ -0,0 +1,152 @@
+"""Benchmark API endpoints end to end and write comparable JSON results."""
+
+import json
+from pathlib import Path
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.benchmark import (
+    ENDPOINTS,
+    HttpTransport,
+    InProcessTransport,
+    build_requests,
+    compare_results,
+    git_commit,
+    remove_benchmark_users,
+    run_scenario,
+    seed_users,
+)
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure p50/p95/p99 latency and throughput of the API at several concurrency "
+        "levels. Run with --settings=config.settings_benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Number of seeded users")
+        parser.add_argument(
+            "--items",
+            type=_int_list,
+            default=[50],
+            help="Wardrobe sizes to seed, comma-separated; users cycle through them",
+        )
+        parser.add_argument(
+            "--history", type=int, default=0, help="Outfit history entries seeded per user"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=_int_list,
+            default=[1, 8, 32],
+            help="Concurrency levels, comma-separated",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per endpoint per level"
+        )
+        parser.add_argument(
+            "--endpoints",
+            default=",".join(ENDPOINTS),
+            help=f"Endpoints to benchmark, comma-separated ({', '.join(ENDPOINTS)})",
+        )
+        parser.add_argument(
+            "--base-url",
+            default="",
+            help="Benchmark a running server over HTTP instead of in-process",
+        )
+        parser.add_argument("--output", default="", help="Write JSON results to this file")
+        parser.add_argument("--compare", default="", help="Baseline JSON results to compare")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="Regression threshold in percent for --compare",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "BENCHMARK_MODE", False):
+            raise CommandError(
+                "benchmark_api seeds and deletes users; run it with "
+                "--settings=config.settings_benchmark"
+            )
+
+        endpoints = [name for name in options["endpoints"].split(",") if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        removed = remove_benchmark_users()
+        if removed:
+            self.stdout.write(f"Removed {removed} users from a previous run")
+
+        self.stdout.write(
+            f"Seeding {options['users']} users with wardrobes of {options['items']} items..."
+        )
+        firebase_uids = seed_users(options["users"], options["items"], options["history"])
+
+        if options["base_url"]:
+            base_url = options["base_url"]
+
+            def transport_factory():
+                return HttpTransport(base_url)
+
+        else:
+            transport_factory = InProcessTransport
+
+        results = []
+        try:
+            for concurrency in options["concurrency"]:
+                for endpoint in endpoints:
+                    requests = build_requests(endpoint, firebase_uids, options["requests"])
+                    result = run_scenario(endpoint, requests, concurrency, transport_factory)
+                    summary = result.as_dict()
+                    results.append(summary)
+
+                    latency = summary["latency_ms"]
+                    self.stdout.write(
+                        f"{endpoint:>11} c={concurrency:<3} "
+                        f"p50={latency['p50']:8.2f}ms p95={latency['p95']:8.2f}ms "
+                        f"p99={latency['p99']:8.2f}ms {summary['throughput_rps']:8.1f} req/s"
+                        + (f"  errors={summary['errors']}" if summary["errors"] else "")
+                    )
+        finally:
+            remove_benchmark_users()
+
+        document = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "transport": "http" if options["base_url"] else "in-process",
+                "storage_backend": settings.STORAGE_BACKEND,
+                "storage_backend_options": settings.STORAGE_BACKEND_OPTIONS,
+                "auth_latency": getattr(settings, "BENCHMARK_AUTH_LATENCY", 0.0),
+                "users": options["users"],
+                "items": options["items"],
+                "history": options["history"],
+                "requests": options["requests"],
+            },
+            "results": results,
+        }
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(document, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            regressions = compare_results(baseline, document, options["threshold"])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(f"REGRESSION {regression}"))
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
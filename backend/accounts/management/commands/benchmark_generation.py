@@ -0,0 +1,124 @@
+"""Measure the throughput gain of micro-batched, kept-alive generation calls."""
+
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.benchmark import FakeGenerationUpstream, git_commit, run_generation_scenario
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+class Command(BaseCommand):
+    help = (
+        "Render jobs against a local fake generation API, one call per job over new "
+        "connections versus micro-batched calls over kept-alive connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=400, help="Renders per configuration")
+        parser.add_argument(
+            "--concurrency", type=int, default=32, help="Jobs in flight (worker threads)"
+        )
+        parser.add_argument(
+            "--batch-sizes",
+            type=_int_list,
+            default=[1, 4, 8, 16],
+            help="Comma-separated batch sizes to compare",
+        )
+        parser.add_argument(
+            "--wait-ms", type=float, default=20.0, help="Longest wait for a batch to fill"
+        )
+        parser.add_argument(
+            "--pool-size", type=int, default=4, help="Kept-alive connections (batches in flight)"
+        )
+        parser.add_argument(
+            "--call-latency", type=float, default=0.2, help="Fixed upstream cost per call (s)"
+        )
+        parser.add_argument(
+            "--item-latency", type=float, default=0.01, help="Upstream cost per render (s)"
+        )
+        parser.add_argument(
+            "--connect-latency",
+            type=float,
+            default=0.05,
+            help="Cost of opening a connection, e.g. a TLS handshake (s)",
+        )
+        parser.add_argument("--output", default="", help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        upstream = FakeGenerationUpstream(
+            call_latency=options["call_latency"],
+            item_latency=options["item_latency"],
+            connect_latency=options["connect_latency"],
+        ).start()
+
+        # The baseline: one call per job, each over a new connection
+        configurations = [("unbatched, no keep-alive", 1, False)] + [
+            (f"batch={batch_size}", batch_size, True) for batch_size in options["batch_sizes"]
+        ]
+
+        results = []
+        baseline_rps = None
+        try:
+            for label, batch_size, keep_alive in configurations:
+                upstream.reset_counters()
+                result = run_generation_scenario(
+                    label,
+                    upstream.url,
+                    jobs=options["jobs"],
+                    concurrency=options["concurrency"],
+                    batch_size=batch_size,
+                    max_wait=options["wait_ms"] / 1000,
+                    pool_size=options["pool_size"],
+                    keep_alive=keep_alive,
+                )
+                summary = result.as_dict()
+                summary.update(
+                    batch_size=batch_size,
+                    keep_alive=keep_alive,
+                    upstream_calls=upstream.calls,
+                    connections=upstream.connections,
+                    mean_batch=round(upstream.renders / upstream.calls, 2) if upstream.calls else 0,
+                )
+                results.append(summary)
+
+                baseline_rps = baseline_rps or summary["throughput_rps"]
+                latency = summary["latency_ms"]
+                self.stdout.write(
+                    f"{label:>24} {summary['throughput_rps']:7.1f} jobs/s "
+                    f"(x{summary['throughput_rps'] / baseline_rps:4.1f}) "
+                    f"p50={latency['p50']:8.1f}ms p95={latency['p95']:8.1f}ms "
+                    f"calls={summary['upstream_calls']:<4} connections={summary['connections']:<4} "
+                    f"mean batch={summary['mean_batch']}"
+                    + (f"  errors={summary['errors']}" if summary["errors"] else "")
+                )
+        finally:
+            upstream.stop()
+
+        if options["output"]:
+            document = {
+                "meta": {
+                    "commit": git_commit(),
+                    "timestamp": timezone.now().isoformat(),
+                    **{
+                        key: options[key]
+                        for key in (
+                            "jobs",
+                            "concurrency",
+                            "wait_ms",
+                            "pool_size",
+                            "call_latency",
+                            "item_latency",
+                            "connect_latency",
+                        )
+                    },
+                },
+                "results": results,
+            }
+            Path(options["output"]).write_text(json.dumps(document, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,61 @@
+"""Compare insert throughput and primary key index size of random and time-ordered UUIDs."""
+
+import json
+from pathlib import Path
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from accounts.benchmark import git_commit, run_id_insert_benchmark
+from accounts.ids import uuid7
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert rows keyed by uuid4 and by uuid7 into scratch tables and report insert "
+        "throughput and (on PostgreSQL) primary key index size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200_000, help="Rows per key type")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction")
+        parser.add_argument("--output", default="", help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING("Index sizes are only measured on PostgreSQL"))
+
+        results = []
+        for label, generate_id in GENERATORS.items():
+            result = run_id_insert_benchmark(
+                label, generate_id, rows=options["rows"], batch_size=options["batch_size"]
+            )
+            results.append(result)
+
+            line = f"{label:>6} {result['rows_per_second']:10.1f} rows/s"
+            if "index_bytes" in result:
+                line += (
+                    f"  table={result['table_bytes'] / 2**20:7.1f}MB"
+                    f"  pkey={result['index_bytes'] / 2**20:7.1f}MB"
+                )
+                if result["leaf_density"] is not None:
+                    line += f"  leaf density={result['leaf_density']:.1f}%"
+            self.stdout.write(line)
+
+        if options["output"]:
+            document = {
+                "meta": {
+                    "commit": git_commit(),
+                    "timestamp": timezone.now().isoformat(),
+                    "database": connection.vendor,
+                    "rows": options["rows"],
+                    "batch_size": options["batch_size"],
+                },
+                "results": results,
+            }
+            Path(options["output"]).write_text(json.dumps(document, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
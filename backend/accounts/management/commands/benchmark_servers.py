@@ -0,0 +1,203 @@
+"""Compare gunicorn worker classes on the storage-heavy endpoints over HTTP."""
+
+import json
+import os
+from pathlib import Path
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+import requests
+
+from accounts.benchmark import (
+    ENDPOINTS,
+    HttpTransport,
+    build_requests,
+    git_commit,
+    remove_benchmark_users,
+    run_scenario,
+    seed_users,
+)
+
+LOCAL_BACKEND = "accounts.storage_backends.LocalFileSystemStorageBackend"
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn with each worker class (gunicorn.conf.py) and benchmark the "
+        "storage-heavy endpoints over HTTP. Run with --settings=config.settings_benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--worker-classes",
+            default="sync,gthread,uvicorn",
+            help="Worker classes to compare, comma-separated",
+        )
+        parser.add_argument("--workers", type=int, default=2, help="Worker processes")
+        parser.add_argument("--threads", type=int, default=8, help="Threads per gthread worker")
+        parser.add_argument("--users", type=int, default=10, help="Number of seeded users")
+        parser.add_argument("--items", type=_int_list, default=[50], help="Wardrobe sizes")
+        parser.add_argument(
+            "--concurrency", type=_int_list, default=[1, 8, 32], help="Concurrency levels"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per endpoint per level"
+        )
+        parser.add_argument(
+            "--endpoints",
+            default="wardrobe,mannequin,confirm",
+            help=f"Endpoints to benchmark, comma-separated ({', '.join(ENDPOINTS)})",
+        )
+        parser.add_argument(
+            "--storage-latency",
+            type=float,
+            default=0.02,
+            help="Simulated latency in seconds of each storage call in the servers",
+        )
+        parser.add_argument("--output", default="", help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "BENCHMARK_MODE", False):
+            raise CommandError(
+                "benchmark_servers seeds and deletes users; run it with "
+                "--settings=config.settings_benchmark"
+            )
+
+        worker_classes = [name for name in options["worker_classes"].split(",") if name]
+        endpoints = [name for name in options["endpoints"].split(",") if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        # Objects must be visible to the server processes, so use files, not memory
+        storage_root = tempfile.mkdtemp(prefix="ctrlchic-bench-storage-")
+        with override_settings(
+            STORAGE_BACKEND=LOCAL_BACKEND, STORAGE_BACKEND_OPTIONS={"root": storage_root}
+        ):
+            remove_benchmark_users()
+            self.stdout.write(f"Seeding {options['users']} users into {storage_root}...")
+            firebase_uids = seed_users(options["users"], options["items"])
+
+            results = []
+            try:
+                for worker_class in worker_classes:
+                    results.extend(
+                        self.benchmark_worker_class(
+                            worker_class, storage_root, firebase_uids, endpoints, options
+                        )
+                    )
+            finally:
+                remove_benchmark_users()
+
+        document = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "transport": "http",
+                "workers": options["workers"],
+                "threads": options["threads"],
+                "storage_latency": options["storage_latency"],
+                "users": options["users"],
+                "items": options["items"],
+                "requests": options["requests"],
+            },
+            "results": results,
+        }
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(document, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def benchmark_worker_class(
+        self,
+        worker_class: str,
+        storage_root: str,
+        firebase_uids: list[str],
+        endpoints: list[str],
+        options: dict,
+    ) -> list[dict]:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": "config.settings_benchmark",
+            "GUNICORN_WORKER_CLASS": worker_class,
+            "GUNICORN_WORKERS": str(options["workers"]),
+            "GUNICORN_THREADS": str(options["threads"]),
+            "GUNICORN_BIND": f"127.0.0.1:{port}",
+            "PROMETHEUS_MULTIPROC_DIR": tempfile.mkdtemp(prefix="ctrlchic-bench-metrics-"),
+            "STORAGE_BACKEND": LOCAL_BACKEND,
+            "BENCHMARK_STORAGE_LATENCY": str(options["storage_latency"]),
+            "BENCHMARK_STORAGE_OPTIONS": json.dumps({"root": storage_root}),
+        }
+
+        self.stdout.write(f"Starting gunicorn ({worker_class}) on {base_url}...")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            self.wait_until_live(server, base_url)
+
+            def transport_factory():
+                return HttpTransport(base_url)
+
+            results = []
+            for concurrency in options["concurrency"]:
+                for endpoint in endpoints:
+                    requests_ = build_requests(endpoint, firebase_uids, options["requests"])
+                    summary = run_scenario(
+                        endpoint, requests_, concurrency, transport_factory
+                    ).as_dict()
+                    summary["worker_class"] = worker_class
+                    results.append(summary)
+
+                    latency = summary["latency_ms"]
+                    self.stdout.write(
+                        f"{worker_class:>8} {endpoint:>11} c={concurrency:<3} "
+                        f"p50={latency['p50']:8.2f}ms p95={latency['p95']:8.2f}ms "
+                        f"{summary['throughput_rps']:8.1f} req/s"
+                        + (f"  errors={summary['errors']}" if summary["errors"] else "")
+                    )
+            return results
+        finally:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    def wait_until_live(self, server: subprocess.Popen, base_url: str, timeout: float = 60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited:\n{server.stderr.read().decode()[-4000:]}")
+            try:
+                if requests.get(f"{base_url}/api/health/live/", timeout=1).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise CommandError(f"gunicorn did not become live within {timeout}s")
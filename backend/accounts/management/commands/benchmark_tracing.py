@@ -0,0 +1,113 @@
+"""Measure the request latency overhead of tracing at different sampling ratios."""
+
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import tracing
+from accounts.benchmark import (
+    ENDPOINTS,
+    InProcessTransport,
+    build_requests,
+    remove_benchmark_users,
+    run_scenario,
+    seed_users,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare API latency with tracing off, at TRACING_SAMPLE_RATIO and fully "
+        "sampled. Run with --settings=config.settings_benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5, help="Number of seeded users")
+        parser.add_argument("--items", type=int, default=50, help="Wardrobe size per user")
+        parser.add_argument(
+            "--requests", type=int, default=300, help="Requests per endpoint per round"
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=3,
+            help="Alternating rounds per configuration; the median round is reported",
+        )
+        parser.add_argument(
+            "--endpoints",
+            default="me,wardrobe",
+            help=f"Endpoints to measure, comma-separated ({', '.join(ENDPOINTS)})",
+        )
+        parser.add_argument(
+            "--exporter",
+            default="memory",
+            help="Span exporter while measuring (memory discards spans after export)",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=5.0,
+            help="Maximum mean latency overhead in percent at TRACING_SAMPLE_RATIO",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "BENCHMARK_MODE", False):
+            raise CommandError(
+                "benchmark_tracing seeds and deletes users; run it with "
+                "--settings=config.settings_benchmark"
+            )
+
+        endpoints = [name for name in options["endpoints"].split(",") if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        ratio = settings.TRACING_SAMPLE_RATIO
+        configurations = [
+            ("off", {"enabled": False}),
+            (f"ratio={ratio:g}", {"enabled": True, "sample_ratio": ratio}),
+            ("ratio=1", {"enabled": True, "sample_ratio": 1.0}),
+        ]
+
+        remove_benchmark_users()
+        firebase_uids = seed_users(options["users"], [options["items"]])
+
+        failures = []
+        try:
+            for endpoint in endpoints:
+                # Warm up connections and caches before timing
+                run_scenario(
+                    endpoint,
+                    build_requests(endpoint, firebase_uids, options["requests"]),
+                    1,
+                    InProcessTransport,
+                )
+
+                means = {label: [] for label, _ in configurations}
+                for _ in range(options["rounds"]):
+                    for label, overrides in configurations:
+                        tracing.configure_tracing(exporter=options["exporter"], **overrides)
+                        requests = build_requests(endpoint, firebase_uids, options["requests"])
+                        result = run_scenario(endpoint, requests, 1, InProcessTransport)
+                        means[label].append(statistics.fmean(result.latencies))
+
+                baseline = statistics.median(means["off"])
+                for label, _ in configurations:
+                    mean = statistics.median(means[label])
+                    overhead = (mean - baseline) / baseline * 100
+                    self.stdout.write(
+                        f"{endpoint:>11} {label:<12} mean={mean * 1000:8.3f}ms "
+                        f"overhead={overhead:+6.2f}%"
+                    )
+                    if label == configurations[1][0] and overhead > options["threshold"]:
+                        failures.append(f"{endpoint}: {overhead:.2f}% at {label}")
+        finally:
+            tracing.configure_tracing()
+            remove_benchmark_users()
+
+        if failures:
+            raise CommandError(
+                f"Tracing overhead above {options['threshold']}%: {'; '.join(failures)}"
+            )
+        self.stdout.write(self.style.SUCCESS("Tracing overhead within threshold"))
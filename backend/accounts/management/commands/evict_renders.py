@@ -0,0 +1,55 @@
+"""Evict cached outfit renders to keep them within their storage budgets."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.renders import EVICTION_ORDER, evict_renders
+from accounts.storage import DELETE_WORKERS
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the least recently (or frequently) used renders of users over "
+        "RENDER_BUDGET_BYTES_PER_USER and until RENDER_BUDGET_BYTES_TOTAL is met. "
+        "Favorites are never evicted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-budget", type=int, default=None, help="Bytes per user")
+        parser.add_argument("--total-budget", type=int, default=None, help="Bytes overall")
+        parser.add_argument("--policy", choices=sorted(EVICTION_ORDER), default=None)
+        parser.add_argument("--workers", type=int, default=DELETE_WORKERS)
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be evicted")
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep evicting periodically instead of exiting"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=300.0, help="Seconds between runs with --loop"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                stats = evict_renders(
+                    user_budget=options["user_budget"],
+                    total_budget=options["total_budget"],
+                    policy=options["policy"],
+                    max_workers=options["workers"],
+                    dry_run=options["dry_run"],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            prefix = "[dry run] " if options["dry_run"] else ""
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{prefix}{stats['users_over_budget']} user(s) over budget, "
+                    f"evicted {stats['evicted']} render(s) ({stats['evicted_bytes']} bytes), "
+                    f"deleted {stats['deleted']} object(s)"
+                )
+            )
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
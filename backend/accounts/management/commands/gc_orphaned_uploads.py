@@ -0,0 +1,216 @@
+"""Delete uploads that were never confirmed and renders nothing refers to."""
+
+from datetime import timedelta
+import heapq
+from itertools import islice
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+from django.utils import timezone
+
+from accounts.models import Mannequin, Outfit, PendingUpload, WardrobeItem
+from accounts.storage import (
+    DELETE_WORKERS,
+    delete_files,
+    generate_prepared_input_path,
+    iter_files,
+)
+
+# Every wardrobe object lives at users/{uid}/wardrobe/{category}s/{uuid}.{ext}
+# every mannequin version (and its thumbnail) under users/{uid}/mannequin/{pose}/
+# (each with the generation input prepared from it, if any)
+# and every render at users/{uid}/renders/{uuid}.jpg
+UPLOADS_PREFIX = "users/"
+WARDROBE_GLOB = "users/*/wardrobe/**"
+MANNEQUIN_GLOB = "users/*/mannequin/**"
+RENDERS_GLOB = "users/*/renders/*"
+
+
+def _ordered_paths(queryset, field, chunk_size):
+    """
+    Stream a path column in byte order, the order storage listings use.
+
+    Rows come from a server-side cursor; PostgreSQL sorts with the "C"
+    collation, as its default collation ignores punctuation.
+    """
+    ordering = Collate(field, "C") if connection.vendor == "postgresql" else F(field)
+    return queryset.order_by(ordering).values_list(field, flat=True).iterator(chunk_size=chunk_size)
+
+
+def _checked_order(paths):
+    """Skip duplicate paths, and stop the scan if the merged paths aren't sorted."""
+    previous = None
+    for path in paths:
+        if previous is not None and path < previous:
+            # Anything listed between the two paths would be wrongly taken for an orphan
+            raise CommandError(f"Known paths out of order: {path!r} after {previous!r}")
+        if path != previous:
+            yield path
+        previous = path
+
+
+class Command(BaseCommand):
+    help = (
+        "Garbage-collect wardrobe objects with no WardrobeItem row, mannequin "
+        "versions no pose points to (uploads whose confirm call never arrived) and "
+        "renders no outfit points to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24.0,
+            help="Only delete orphans last modified more than this many hours ago",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report orphans without deleting them"
+        )
+        parser.add_argument(
+            "--scan-bucket",
+            action="store_true",
+            help=(
+                "Diff a full bucket listing against the database instead of sweeping "
+                "expired upload reservations (finds uploads issued before reservations "
+                "existed, unconfirmed mannequin versions and unreferenced renders)"
+            ),
+        )
+        parser.add_argument("--workers", type=int, default=DELETE_WORKERS)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Orphans re-checked against the database and deleted per batch",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched per round trip while streaming from the database",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+        self.stats = {"scanned": 0, "orphans": 0, "orphan_bytes": 0, "too_recent": 0, "deleted": 0}
+
+        if options["scan_bucket"]:
+            candidates = self._scan_bucket(cutoff, options["chunk_size"])
+            source = "objects"
+        else:
+            candidates = self._expired_reservations(cutoff, options["chunk_size"])
+            source = "reservations"
+
+        while batch := list(islice(candidates, options["batch_size"])):
+            self._collect(batch, options)
+
+        elapsed = time.monotonic() - started
+        rate = self.stats["scanned"] / elapsed if elapsed else 0.0
+
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        count = self.stats["orphans"] if options["dry_run"] else self.stats["deleted"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {count} orphan(s), {self.stats['orphan_bytes'] / (1024 * 1024):.1f} MB"
+            )
+        )
+        self.stdout.write(
+            f"Scanned {self.stats['scanned']} {source} in {elapsed:.1f}s ({rate:.0f}/s); "
+            f"skipped {self.stats['too_recent']} orphan(s) inside the grace period"
+        )
+
+    def _expired_reservations(self, cutoff, chunk_size):
+        """Yield (path, size) for reservations whose upload URL expired before the cutoff."""
+        expired = PendingUpload.objects.filter(expires_at__lt=cutoff).values_list(
+            "image_path", "expected_size"
+        )
+        for image_path, expected_size in expired.iterator(chunk_size=chunk_size):
+            self.stats["scanned"] += 1
+            yield image_path, expected_size
+
+    def _scan_bucket(self, cutoff, chunk_size):
+        """Yield (path, size) for listed uploads that no row refers to."""
+        for glob, known_streams in (
+            (WARDROBE_GLOB, self._wardrobe_paths(chunk_size)),
+            (MANNEQUIN_GLOB, self._mannequin_paths(chunk_size)),
+            (RENDERS_GLOB, self._render_paths(chunk_size)),
+        ):
+            # Both sides are in byte order, so one pass over each finds the orphans
+            # without holding the known paths in memory
+            known_paths = _checked_order(heapq.merge(*known_streams))
+            next_known = next(known_paths, None)
+
+            for stored in iter_files(UPLOADS_PREFIX, match_glob=glob):
+                self.stats["scanned"] += 1
+                while next_known is not None and next_known < stored.path:
+                    next_known = next(known_paths, None)
+                if stored.path == next_known:
+                    continue
+                if stored.updated is None or stored.updated > cutoff:
+                    self.stats["too_recent"] += 1
+                    continue
+                yield stored.path, stored.size
+
+    # Known paths per listing glob, as sorted streams. Images are named
+    # {prefix}/{uuid}.{ext}, so sorting by image path also sorts the input
+    # paths derived from them ({prefix}/{uuid}.input.jpg).
+
+    def _wardrobe_paths(self, chunk_size):
+        images = WardrobeItem.objects.all()
+        return [
+            _ordered_paths(images, "image_path", chunk_size),
+            map(generate_prepared_input_path, _ordered_paths(images, "image_path", chunk_size)),
+        ]
+
+    def _mannequin_paths(self, chunk_size):
+        mannequins = Mannequin.objects.all()
+        return [
+            _ordered_paths(mannequins, "image_path", chunk_size),
+            _ordered_paths(mannequins.exclude(thumbnail_path=None), "thumbnail_path", chunk_size),
+            map(
+                generate_prepared_input_path,
+                _ordered_paths(mannequins, "image_path", chunk_size),
+            ),
+        ]
+
+    def _render_paths(self, chunk_size):
+        return [_ordered_paths(Outfit.objects.exclude(image_path=None), "image_path", chunk_size)]
+
+    def _collect(self, batch, options):
+        """Delete one batch of orphan candidates and their reservations."""
+        paths = [path for path, _ in batch]
+
+        # Re-check the batch in case an upload was confirmed mid-scan (generation
+        # inputs are only prepared from confirmed images, so they can't be
+        # orphans that old unless their image is gone)
+        confirmed = set(
+            WardrobeItem.objects.filter(image_path__in=paths).values_list("image_path", flat=True)
+        )
+        confirmed.update(
+            Mannequin.objects.filter(image_path__in=paths).values_list("image_path", flat=True)
+        )
+        confirmed.update(
+            Mannequin.objects.filter(thumbnail_path__in=paths).values_list(
+                "thumbnail_path", flat=True
+            )
+        )
+        confirmed.update(
+            Outfit.objects.filter(image_path__in=paths).values_list("image_path", flat=True)
+        )
+        batch = [(path, size) for path, size in batch if path not in confirmed]
+        paths = [path for path, _ in batch]
+
+        self.stats["orphans"] += len(batch)
+        self.stats["orphan_bytes"] += sum(size for _, size in batch)
+
+        if options["dry_run"]:
+            for path, size in batch:
+                self.stdout.write(f"  orphan {path} ({size} bytes)")
+            return
+
+        # Objects that were never uploaded are skipped by delete_files
+        self.stats["deleted"] += delete_files(paths, max_workers=options["workers"])
+        PendingUpload.objects.filter(image_path__in=paths).delete()
@@ -0,0 +1,41 @@
+"""Precompute thumbnails and dimensions for mannequin poses that don't have them yet."""
+
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from accounts.mannequins import prepare_mannequin_assets
+from accounts.models import Mannequin
+
+
+class Command(BaseCommand):
+    help = (
+        "Prepare assets of mannequin poses whose preparation failed or was skipped "
+        "(e.g. confirmed by an upload notification)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Maximum poses to prepare")
+
+    def handle(self, *args, **options):
+        mannequins = Mannequin.objects.filter(prepared_at=None).order_by("uploaded_at")
+        if options["limit"] is not None:
+            mannequins = mannequins[: options["limit"]]
+
+        stats = {"prepared": 0, "replaced": 0, "undecodable": 0, "failed": 0}
+        for mannequin in mannequins.iterator():
+            try:
+                prepared = prepare_mannequin_assets(mannequin)
+            except UnidentifiedImageError:
+                # Marked prepared (without assets), so it isn't picked up again
+                self.stderr.write(f"Can't decode {mannequin.image_path}")
+                stats["undecodable"] += 1
+                continue
+            except Exception as e:
+                self.stderr.write(f"Failed to prepare {mannequin.image_path}: {e}")
+                stats["failed"] += 1
+                continue
+            stats["prepared" if prepared else "replaced"] += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(", ".join(f"{key}: {value}" for key, value in stats.items()))
+        )
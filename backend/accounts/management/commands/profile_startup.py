@@ -0,0 +1,111 @@
+"""Profile worker cold start: module import times and setup phases."""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter under -X importtime, reproducing what a gunicorn
+# worker does before it can serve: load the WSGI app, build the URL conf
+# (which imports every view) and optionally warm up Firebase.
+BOOT_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+phases = {}
+
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+phases["wsgi_app"] = time.perf_counter() - started
+
+mark = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+phases["url_conf"] = time.perf_counter() - mark
+
+if os.environ.get("PROFILE_WARMUP") == "1":
+    mark = time.perf_counter()
+    from accounts.firebase import warmup
+    phases["warmup_ok"] = warmup()
+    phases["warmup"] = time.perf_counter() - mark
+
+phases["total"] = time.perf_counter() - started
+print(json.dumps(phases))
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """Parse -X importtime output into (module, self_us, cumulative_us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append((module.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker boot time in a fresh interpreter and list the slowest imports "
+        "(python -X importtime)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="Number of imports to list")
+        parser.add_argument(
+            "--warmup", action="store_true", help="Include Firebase warmup in the profile"
+        )
+        parser.add_argument(
+            "--raw", default="", help="Also write the raw -X importtime output to this file"
+        )
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings"),
+            "PROFILE_WARMUP": "1" if options["warmup"] else "0",
+        }
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        if options["raw"]:
+            with open(options["raw"], "w") as raw_file:
+                raw_file.write(process.stderr)
+        if process.returncode != 0:
+            self.stderr.write(process.stderr[-4000:])
+            raise CommandError(f"Boot failed with exit code {process.returncode}")
+
+        phases = json.loads(process.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(process.stderr)
+
+        self.stdout.write("Boot phases:")
+        for name, value in phases.items():
+            if isinstance(value, bool):
+                self.stdout.write(f"  {name:<10} {value}")
+            else:
+                self.stdout.write(f"  {name:<10} {value * 1000:8.1f}ms")
+
+        # Top-level imports (including packages) by cumulative time
+        self.stdout.write(f"\nSlowest imports (cumulative, of {len(rows)} modules):")
+        for module, _, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[
+            : options["top"]
+        ]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f}ms  {module}")
+
+        # Self time summed per top-level package: where the import time actually goes
+        packages: dict[str, int] = {}
+        for module, self_us, _ in rows:
+            package = module.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + self_us
+        self.stdout.write("\nSelf time by package:")
+        for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[
+            : options["top"]
+        ]:
+            self.stdout.write(f"  {self_us / 1000:8.1f}ms  {package}")
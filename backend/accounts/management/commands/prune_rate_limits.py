@@ -0,0 +1,24 @@
+"""Delete idle rate limit buckets from the shared store."""
+
+from django.core.management.base import BaseCommand
+
+from accounts.ratelimit import get_rate_limit_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete rate limit buckets that haven't been used recently. An idle bucket is "
+        "full again, so deleting it doesn't change any limit; this only keeps the store small."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--idle-minutes",
+            type=float,
+            default=60.0,
+            help="Delete buckets not updated for this many minutes",
+        )
+
+    def handle(self, *args, **options):
+        deleted = get_rate_limit_store().prune(options["idle_minutes"] * 60)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idle bucket(s)"))
@@ -0,0 +1,53 @@
+"""Run queued storage purge jobs for deleted accounts."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.purge import prune_completed_jobs, run_pending_jobs, schedule_account_purge
+from accounts.storage import DELETE_WORKERS, LIST_PAGE_SIZE
+
+
+class Command(BaseCommand):
+    help = "Delete storage objects of deleted accounts (resumable background job)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--uid",
+            action="append",
+            default=[],
+            help="Queue a purge for this Firebase UID before running (repeatable)",
+        )
+        parser.add_argument("--page-size", type=int, default=LIST_PAGE_SIZE)
+        parser.add_argument("--workers", type=int, default=DELETE_WORKERS)
+        parser.add_argument("--limit", type=int, default=None, help="Maximum jobs to run")
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new jobs instead of exiting"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=30.0, help="Seconds between polls with --loop"
+        )
+
+    def handle(self, *args, **options):
+        for firebase_uid in options["uid"]:
+            try:
+                job = schedule_account_purge(firebase_uid)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Queued purge of {job.prefix}")
+
+        while True:
+            processed = run_pending_jobs(
+                limit=options["limit"],
+                page_size=options["page_size"],
+                max_workers=options["workers"],
+            )
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} purge job(s)"))
+            pruned = prune_completed_jobs()
+            if pruned:
+                self.stdout.write(f"Pruned {pruned} completed purge job(s)")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
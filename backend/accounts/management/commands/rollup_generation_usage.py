@@ -0,0 +1,32 @@
+"""Fold the generation usage ledger into per-user daily rollups."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.quotas import ROLLUP_BATCH_SIZE, rollup_usage_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Add generation usage events of completed days to per-user daily rollups and "
+        "delete them from the ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep rolling up instead of exiting"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=3600.0, help="Seconds between runs with --loop"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            rolled_up = rollup_usage_events(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Rolled up {rolled_up} usage event(s)"))
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
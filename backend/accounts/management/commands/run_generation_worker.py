@@ -0,0 +1,47 @@
+"""Render queued outfits with the upstream generation API."""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.generation import run_pending_generation_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued generation jobs, sending the renders of concurrently running jobs "
+        "to the upstream API in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Jobs run at the same time (default GENERATION_BATCH_SIZE x GENERATION_POOL_SIZE)",
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Maximum jobs to run")
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new jobs instead of exiting"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=1.0, help="Seconds between polls with --loop"
+        )
+
+    def handle(self, *args, **options):
+        if not settings.GENERATION_API_URL:
+            raise CommandError("GENERATION_API_URL is not set")
+
+        concurrency = options["concurrency"] or (
+            settings.GENERATION_BATCH_SIZE * settings.GENERATION_POOL_SIZE
+        )
+
+        while True:
+            processed = run_pending_generation_jobs(concurrency, limit=options["limit"])
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} generation job(s)"))
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
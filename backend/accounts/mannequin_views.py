@@ -1,29 +1,60 @@
-"""Views for mannequin image upload and management."""
+"""Views for mannequin pose upload and management."""
+
+import uuid
 
 from django.contrib.auth.models import User
-from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from .models import UserProfile
+from .load_shedding import StorageUnavailableError, shed_load, storage_unavailable_response
+from .mannequins import activate_mannequin_version, delete_mannequins, try_prepare_mannequin_assets
+from .metrics import record_cache_lookup
+from .models import Mannequin, UserProfile
+from .ratelimit import rate_limit
 from .storage import (
     ALLOWED_IMAGE_EXTENSIONS,
+    DEFAULT_MANNEQUIN_POSE,
     MAX_FILE_SIZE_BYTES,
     MAX_FILE_SIZE_MB,
-    delete_file,
     file_exists,
     generate_mannequin_path,
     get_download_url,
     get_signed_upload_url,
+    is_immutable_path,
+    parse_mannequin_path,
+    sign_download_url,
+    upload_headers,
     validate_file_extension,
 )
 
+VALID_POSES = [pose for pose, _ in Mannequin.POSE_CHOICES]
+
+
+def _pose_data(mannequin: Mannequin, is_default: bool) -> dict:
+    """Serialize a pose with freshly signed URLs (local signatures, no storage calls)."""
+    url = sign_download_url(mannequin.image_path)
+    record_cache_lookup("signed_url", url == mannequin.image_url)
+    return {
+        "id": str(mannequin.id),
+        "pose": mannequin.pose,
+        "url": url,
+        "thumbnailUrl": (
+            sign_download_url(mannequin.thumbnail_path) if mannequin.thumbnail_path else None
+        ),
+        "width": mannequin.width,
+        "height": mannequin.height,
+        "isDefault": is_default,
+        "uploadedAt": mannequin.uploaded_at.isoformat(),
+    }
+
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@rate_limit("upload_url")
+@shed_load
 def get_upload_url(request: Request) -> Response:
     """
     Get a signed URL for direct client-side upload to Firebase Storage.
@@ -32,14 +63,18 @@ def get_upload_url(request: Request) -> Response:
         {
             "filename": "photo.jpg",
             "contentType": "image/jpeg",
-            "fileSize": 1234567  // bytes
+            "fileSize": 1234567,  // bytes
+            "pose": "front"  // optional, defaults to "front"
         }
 
     Returns:
         {
             "uploadUrl": "https://storage.googleapis.com/...",
-            "filePath": "users/abc123/mannequin"
+            "uploadHeaders": {"Content-Type": "image/jpeg", "Cache-Control": "..."},
+            "filePath": "users/abc123/mannequin/front/550e8400-....jpg"
         }
+
+        The upload must send uploadHeaders.
     """
     user: User = request.user
 
@@ -47,6 +82,7 @@ def get_upload_url(request: Request) -> Response:
     filename = request.data.get("filename")
     content_type = request.data.get("contentType")
     file_size = request.data.get("fileSize")
+    pose = request.data.get("pose") or DEFAULT_MANNEQUIN_POSE
 
     if not all([filename, content_type, file_size]):
         return Response(
@@ -54,8 +90,14 @@ def get_upload_url(request: Request) -> Response:
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    if pose not in VALID_POSES:
+        return Response(
+            {"error": f'Invalid pose. Must be one of: {", ".join(VALID_POSES)}'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     # Validate file extension
-    is_valid, _ = validate_file_extension(filename)
+    is_valid, extension = validate_file_extension(filename)
     if not is_valid:
         return Response(
             {"error": f"Invalid file type. Allowed types: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"},
@@ -87,9 +129,12 @@ def get_upload_url(request: Request) -> Response:
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # Generate storage path
+    # Every upload is a new version at its own path; confirming switches the pose to it
     firebase_uid = user.profile.firebase_uid
-    file_path = generate_mannequin_path(firebase_uid)
+    try:
+        file_path = generate_mannequin_path(firebase_uid, pose, str(uuid.uuid4()), extension)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     # Get signed upload URL
     try:
@@ -100,26 +145,35 @@ def get_upload_url(request: Request) -> Response:
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    return Response({"uploadUrl": upload_url, "filePath": file_path})
+    return Response(
+        {
+            "uploadUrl": upload_url,
+            "uploadHeaders": upload_headers(file_path, content_type),
+            "filePath": file_path,
+        }
+    )
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@shed_load
 def confirm_upload(request: Request) -> Response:
     """
     Confirm that the file was uploaded successfully.
-    Updates the user profile with the file path and download URL.
+    Switches the pose to the uploaded version and prepares its thumbnail;
+    the previous version is deleted in the background after a grace period.
 
     Request body:
         {
-            "filePath": "users/abc123/mannequin"
+            "filePath": "users/abc123/mannequin/front/550e8400-....jpg"
         }
 
     Returns:
         {
             "success": true,
             "url": "https://storage.googleapis.com/...",
-            "uploadedAt": "2024-01-04T12:00:00Z"
+            "uploadedAt": "2024-01-04T12:00:00Z",
+            "mannequin": {"id": "...", "pose": "front", "thumbnailUrl": "...", ...}
         }
     """
     user: User = request.user
@@ -128,10 +182,11 @@ def confirm_upload(request: Request) -> Response:
     if not file_path:
         return Response({"error": "filePath is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # SECURITY: Verify the filePath belongs to this user
+    # SECURITY: Verify the filePath is a mannequin version of this user
     # This prevents users from confirming uploads to other users' paths
-    expected_path = generate_mannequin_path(user.profile.firebase_uid)
-    if file_path != expected_path:
+    firebase_uid = user.profile.firebase_uid
+    parsed = parse_mannequin_path(file_path)
+    if parsed is None or parsed[0] != firebase_uid:
         return Response(
             {"error": "Invalid filePath. Path does not belong to authenticated user."},
             status=status.HTTP_403_FORBIDDEN,
@@ -144,32 +199,31 @@ def confirm_upload(request: Request) -> Response:
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    # Get download URL
+    # Switch to the new version (existence was just checked, so its URL is only signed)
     try:
-        download_url = get_download_url(file_path)
-        if not download_url:
-            return Response(
-                {"error": "Failed to generate download URL"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        mannequin = activate_mannequin_version(firebase_uid, file_path)
     except Exception as e:
         return Response(
             {"error": f"Failed to get download URL: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+    if mannequin is None:
+        return Response(
+            {"error": "This upload has been replaced by a newer one."},
+            status=status.HTTP_409_CONFLICT,
+        )
 
-    # Update user profile
-    profile: UserProfile = user.profile
-    profile.mannequin_image_path = file_path
-    profile.mannequin_image_url = download_url
-    profile.mannequin_uploaded_at = timezone.now()
-    profile.save()
+    # Once per version, so switching to this pose later needs no processing
+    if mannequin.prepared_at is None:
+        try_prepare_mannequin_assets(mannequin)
 
+    user.profile.refresh_from_db(fields=["default_mannequin"])
     return Response(
         {
             "success": True,
-            "url": download_url,
-            "uploadedAt": profile.mannequin_uploaded_at.isoformat(),
+            "url": mannequin.image_url,
+            "uploadedAt": mannequin.uploaded_at.isoformat(),
+            "mannequin": _pose_data(mannequin, mannequin.id == user.profile.default_mannequin_id),
         }
     )
 
@@ -178,10 +232,12 @@ def confirm_upload(request: Request) -> Response:
 @permission_classes([IsAuthenticated])
 def get_mannequin(request: Request) -> Response:
     """
-    Get the current mannequin image for the authenticated user.
+    Get the default mannequin pose image for the authenticated user.
 
     Returns:
         {
+            "id": "550e8400-...",
+            "pose": "front",
             "url": "https://storage.googleapis.com/...",
             "uploadedAt": "2024-01-04T12:00:00Z"
         }
@@ -195,13 +251,19 @@ def get_mannequin(request: Request) -> Response:
     user: User = request.user
     profile: UserProfile = user.profile
 
-    if not profile.mannequin_image_path:
+    if not profile.default_mannequin_id:
         return Response({"url": None, "uploadedAt": None})
+    mannequin = profile.default_mannequin
 
     # Refresh download URL (they expire after 7 days)
     # Regenerate on every request to ensure URL is always valid
     try:
-        download_url = get_download_url(profile.mannequin_image_path)
+        if is_immutable_path(mannequin.image_path):
+            # A confirmed version is never overwritten, so it only needs signing
+            download_url = sign_download_url(mannequin.image_path)
+        else:
+            # Pre-versioning path: the object may have been replaced or removed
+            download_url = get_download_url(mannequin.image_path)
         if not download_url:
             # File no longer exists in storage
             return Response(
@@ -210,9 +272,17 @@ def get_mannequin(request: Request) -> Response:
             )
 
         # Update cached URL if it changed
-        if download_url != profile.mannequin_image_url:
-            profile.mannequin_image_url = download_url
-            profile.save()
+        url_cache_hit = download_url == mannequin.image_url
+        record_cache_lookup("signed_url", url_cache_hit)
+        if not url_cache_hit:
+            mannequin.image_url = download_url
+            mannequin.save(update_fields=["image_url", "updated_at"])
+
+    except StorageUnavailableError as e:
+        # Storage is overloaded: the stored URL is better than blocking on it
+        if not mannequin.image_url:
+            return storage_unavailable_response(e.retry_after)
+        download_url = mannequin.image_url
 
     except Exception as e:
         # Don't silently fall back to potentially expired cached URL
@@ -224,9 +294,138 @@ def get_mannequin(request: Request) -> Response:
 
     return Response(
         {
+            "id": str(mannequin.id),
+            "pose": mannequin.pose,
             "url": download_url,
-            "uploadedAt": (
-                profile.mannequin_uploaded_at.isoformat() if profile.mannequin_uploaded_at else None
+            "uploadedAt": mannequin.uploaded_at.isoformat(),
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def list_poses(request: Request) -> Response:
+    """
+    List every mannequin pose of the authenticated user.
+
+    All poses come from one query on the (user, pose) index, with URLs that
+    stay the same for a whole rotation period, so the client can load every
+    pose once and switch between them without further requests.
+
+    Returns:
+        {
+            "poses": [
+                {
+                    "id": "550e8400-...",
+                    "pose": "front",
+                    "url": "https://storage.googleapis.com/...",
+                    "thumbnailUrl": "https://storage.googleapis.com/...",
+                    "width": 1200,
+                    "height": 1800,
+                    "isDefault": true,
+                    "uploadedAt": "2024-01-04T12:00:00Z"
+                }
+            ],
+            "defaultId": "550e8400-..."
+        }
+
+        thumbnailUrl, width and height are null until the pose's assets are prepared.
+    """
+    user: User = request.user
+    profile: UserProfile = user.profile
+
+    poses = [
+        _pose_data(mannequin, mannequin.id == profile.default_mannequin_id)
+        for mannequin in Mannequin.objects.filter(user_profile=profile)
+    ]
+
+    return Response(
+        {
+            "poses": poses,
+            "defaultId": (
+                str(profile.default_mannequin_id) if profile.default_mannequin_id else None
+            ),
+        }
+    )
+
+
+def _get_own_pose(request: Request, mannequin_id: str):
+    """Return (pose, None) for a pose of the requesting user, or (None, error response)."""
+    try:
+        mannequin_uuid = uuid.UUID(mannequin_id)
+    except ValueError:
+        return None, Response(
+            {"error": "Invalid mannequin ID format"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    mannequin = Mannequin.objects.filter(
+        id=mannequin_uuid, user_profile=request.user.profile
+    ).first()
+    if mannequin is None:
+        return None, Response(
+            {"error": "Mannequin not found or does not belong to user"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return mannequin, None
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def set_default_pose(request: Request, mannequin_id: str) -> Response:
+    """
+    Make a pose the user's default mannequin.
+
+    Returns:
+        {
+            "success": true,
+            "defaultId": "550e8400-..."
+        }
+    """
+    mannequin, error = _get_own_pose(request, mannequin_id)
+    if error:
+        return error
+
+    profile: UserProfile = request.user.profile
+    profile.default_mannequin = mannequin
+    profile.save(update_fields=["default_mannequin", "updated_at"])
+
+    return Response({"success": True, "defaultId": str(mannequin.id)})
+
+
+@api_view(["DELETE"])
+@permission_classes([IsAuthenticated])
+@shed_load
+def delete_pose(request: Request, mannequin_id: str) -> Response:
+    """
+    Delete one mannequin pose. If it was the default, the oldest remaining
+    pose becomes the default.
+
+    Returns:
+        {
+            "success": true,
+            "defaultId": "550e8400-..."  // or null when no poses are left
+        }
+    """
+    mannequin, error = _get_own_pose(request, mannequin_id)
+    if error:
+        return error
+
+    profile: UserProfile = request.user.profile
+    try:
+        delete_mannequins(profile, [mannequin])
+    except StorageUnavailableError:
+        raise
+    except Exception as e:
+        return Response(
+            {"error": f"Failed to delete file from storage: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    return Response(
+        {
+            "success": True,
+            "defaultId": (
+                str(profile.default_mannequin_id) if profile.default_mannequin_id else None
             ),
         }
     )
@@ -234,9 +433,10 @@ def get_mannequin(request: Request) -> Response:
 
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
+@shed_load
 def delete_mannequin(request: Request) -> Response:
     """
-    Delete the mannequin image for the authenticated user.
+    Delete every mannequin pose of the authenticated user.
 
     Returns:
         {
@@ -247,25 +447,19 @@ def delete_mannequin(request: Request) -> Response:
     user: User = request.user
     profile: UserProfile = user.profile
 
-    if not profile.mannequin_image_path:
+    mannequins = list(Mannequin.objects.filter(user_profile=profile))
+    if not mannequins:
         return Response({"error": "No mannequin image to delete"}, status=status.HTTP_404_NOT_FOUND)
 
-    # Delete from Firebase Storage
+    # Delete from Firebase Storage, then the rows (objects that are already gone are skipped)
     try:
-        deleted = delete_file(profile.mannequin_image_path)
-        if not deleted:
-            # File didn't exist in storage, but clear DB reference anyway
-            pass
+        delete_mannequins(profile, mannequins)
+    except StorageUnavailableError:
+        raise
     except Exception as e:
         return Response(
             {"error": f"Failed to delete file from storage: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    # Clear database references
-    profile.mannequin_image_path = None
-    profile.mannequin_image_url = None
-    profile.mannequin_uploaded_at = None
-    profile.save()
-
     return Response({"success": True, "message": "Mannequin image deleted successfully"})
@@ -0,0 +1,192 @@
+"""Mannequin poses: switching image versions and precomputing their assets."""
+
+import logging
+from typing import Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Mannequin, StoragePurgeJob, UserProfile
+from .purge import schedule_object_cleanup
+from .storage import (
+    delete_file,
+    delete_files,
+    generate_prepared_input_path,
+    generate_thumbnail_path,
+    parse_mannequin_path,
+    read_file_range,
+    save_file,
+    sign_download_url,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def activate_mannequin_version(firebase_uid: str, file_path: str) -> Optional[Mannequin]:
+    """
+    Make an uploaded mannequin version the current image of its pose.
+
+    The profile row is locked while the pose moves, so concurrent confirms
+    (client confirm and upload notification) apply one after the other and
+    each retires exactly the version it replaced. The replaced image and its
+    assets are deleted by a purge job after a grace period rather than in
+    the request. The first pose of a user becomes their default.
+
+    A version that was already replaced (e.g. a late notification for an
+    earlier upload) is never reactivated.
+
+    Args:
+        firebase_uid: Owner of the upload
+        file_path: Versioned mannequin path (users/{uid}/mannequin/{pose}/{version}.{ext})
+
+    Returns:
+        The updated pose, or None if there is no such user or the path isn't
+        a current version of theirs
+    """
+    parsed = parse_mannequin_path(file_path)
+    if parsed is None or parsed[0] != firebase_uid:
+        return None
+    _, pose, version = parsed
+
+    with transaction.atomic():
+        profile = UserProfile.objects.select_for_update().filter(firebase_uid=firebase_uid).first()
+        if profile is None:
+            return None
+        mannequin = Mannequin.objects.filter(user_profile=profile, pose=pose).first()
+        if mannequin is not None and mannequin.version == version:
+            # Retried confirm or duplicate notification
+            return mannequin
+        # Superseded versions have a purge job (kept for COMPLETED_JOB_RETENTION)
+        if StoragePurgeJob.objects.filter(prefix=file_path).exists():
+            return None
+
+        if mannequin is None:
+            mannequin = Mannequin(user_profile=profile, pose=pose)
+            retired_paths = []
+        else:
+            retired_paths = [
+                mannequin.image_path,
+                mannequin.thumbnail_path,
+                generate_prepared_input_path(mannequin.image_path),
+            ]
+
+        mannequin.version = version
+        mannequin.image_path = file_path
+        mannequin.image_url = sign_download_url(file_path)
+        mannequin.uploaded_at = timezone.now()
+        mannequin.thumbnail_path = None
+        mannequin.width = None
+        mannequin.height = None
+        mannequin.prepared_at = None
+        mannequin.save()
+
+        if profile.default_mannequin_id is None:
+            profile.default_mannequin = mannequin
+            profile.save(update_fields=["default_mannequin", "updated_at"])
+
+        for path in retired_paths:
+            if path:
+                schedule_object_cleanup(firebase_uid, path)
+
+    return mannequin
+
+
+def prepare_mannequin_assets(mannequin: Mannequin) -> bool:
+    """
+    Compute the dimensions and thumbnail of a pose's current version.
+
+    Runs once per version: the results are stored on the row only if the
+    pose still has the version that was processed. A version that can't be
+    decoded is marked prepared without assets, so it isn't tried again.
+
+    Args:
+        mannequin: Pose to prepare
+
+    Returns:
+        True if the assets were stored, False if the version was replaced meanwhile
+
+    Raises:
+        PIL.UnidentifiedImageError: If the image can't be decoded
+    """
+    # Pillow is only loaded by the processes that prepare images
+    from PIL import UnidentifiedImageError
+
+    from .image_prep import THUMBNAIL_CONTENT_TYPE, make_thumbnail
+
+    try:
+        thumbnail = make_thumbnail(read_file_range(mannequin.image_path))
+    except UnidentifiedImageError:
+        # Retrying won't help; mark the version done without assets
+        prepared_at = timezone.now()
+        Mannequin.objects.filter(id=mannequin.id, version=mannequin.version).update(
+            prepared_at=prepared_at, updated_at=prepared_at
+        )
+        mannequin.prepared_at = prepared_at
+        raise
+    thumbnail_path = generate_thumbnail_path(mannequin.image_path)
+    save_file(thumbnail_path, thumbnail.data, THUMBNAIL_CONTENT_TYPE)
+
+    prepared_at = timezone.now()
+    updated = Mannequin.objects.filter(id=mannequin.id, version=mannequin.version).update(
+        thumbnail_path=thumbnail_path,
+        width=thumbnail.width,
+        height=thumbnail.height,
+        prepared_at=prepared_at,
+        updated_at=prepared_at,
+    )
+    if not updated:
+        # Nothing refers to the thumbnail of a replaced version
+        delete_file(thumbnail_path)
+        return False
+
+    mannequin.thumbnail_path = thumbnail_path
+    mannequin.width = thumbnail.width
+    mannequin.height = thumbnail.height
+    mannequin.prepared_at = prepared_at
+    return True
+
+
+def try_prepare_mannequin_assets(mannequin: Mannequin) -> None:
+    """
+    Prepare a pose's assets without failing the caller.
+
+    Poses left unprepared are picked up by the prepare_mannequins command.
+    """
+    try:
+        prepare_mannequin_assets(mannequin)
+    except Exception as e:
+        logger.warning(f"Could not prepare assets for mannequin {mannequin.id}: {e}")
+
+
+def delete_mannequins(profile: UserProfile, mannequins: list[Mannequin]) -> int:
+    """
+    Delete poses together with their images and assets.
+
+    If the default pose is deleted, the oldest remaining pose becomes the default.
+
+    Args:
+        profile: Owner of the poses
+        mannequins: Poses to delete
+
+    Returns:
+        Number of storage objects deleted
+    """
+    paths = [
+        path
+        for mannequin in mannequins
+        for path in (
+            mannequin.image_path,
+            mannequin.thumbnail_path,
+            generate_prepared_input_path(mannequin.image_path),
+        )
+        if path
+    ]
+    deleted = delete_files(paths)
+
+    with transaction.atomic():
+        Mannequin.objects.filter(id__in=[mannequin.id for mannequin in mannequins]).delete()
+        if profile.default_mannequin_id in {mannequin.id for mannequin in mannequins}:
+            profile.default_mannequin = Mannequin.objects.filter(user_profile=profile).first()
+            profile.save(update_fields=["default_mannequin", "updated_at"])
+
+    return deleted
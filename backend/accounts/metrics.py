@@ -0,0 +1,189 @@
+"""
+Prometheus metrics for the API.
+
+Metrics are plain prometheus_client objects updated in-process. When
+PROMETHEUS_MULTIPROC_DIR is set before the app is imported (gunicorn.conf.py
+does this), each worker writes its samples to memory-mapped files in that
+directory and the scrape endpoint aggregates them, so any worker can answer
+a scrape with totals for the whole server.
+"""
+
+import hmac
+import os
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Latency buckets (seconds) sized for API calls: sub-millisecond cache hits up
+# to multi-second storage timeouts
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "ctrlchic_http_request_duration_seconds",
+    "Time to handle a request, by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "ctrlchic_http_requests_in_flight",
+    "Requests currently being handled",
+    multiprocess_mode="livesum",
+)
+REQUEST_DB_TIME = Histogram(
+    "ctrlchic_http_request_db_seconds",
+    "Time spent in database queries per request, by route",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "ctrlchic_http_request_db_queries",
+    "Database queries per request, by route",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+TOKEN_VERIFICATION_LATENCY = Histogram(
+    "ctrlchic_auth_token_verification_seconds",
+    "Time to verify a Firebase ID token, by outcome",
+    ["result"],
+    buckets=LATENCY_BUCKETS,
+)
+STORAGE_CALL_LATENCY = Histogram(
+    "ctrlchic_storage_call_duration_seconds",
+    "Storage backend call latency, by operation",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "ctrlchic_cache_lookups_total",
+    "Cache lookups, by cache and result (hit/miss)",
+    ["cache", "result"],
+)
+STORAGE_CALLS_SHED = Counter(
+    "ctrlchic_storage_calls_shed_total",
+    "Storage calls rejected without being sent, by reason (circuit_open/concurrency)",
+    ["reason"],
+)
+STORAGE_POOL_SIZE = Gauge(
+    "ctrlchic_storage_pool_connections",
+    "Connections in the storage client's HTTP pool (summed over workers)",
+    multiprocess_mode="livesum",
+)
+STORAGE_POOL_IN_FLIGHT = Gauge(
+    "ctrlchic_storage_pool_calls_in_flight",
+    "Storage calls currently holding or waiting for a pooled connection",
+    multiprocess_mode="livesum",
+)
+STORAGE_POOL_CALLS = Counter(
+    "ctrlchic_storage_pool_calls_total",
+    "Storage calls made through the connection pool",
+)
+STORAGE_POOL_SATURATED_CALLS = Counter(
+    "ctrlchic_storage_pool_saturated_calls_total",
+    "Storage calls that found every pooled connection busy and had to wait",
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "ctrlchic_rate_limit_rejections_total",
+    "Requests rejected with 429, by the limit that was exceeded",
+    ["limit"],
+)
+
+# Label for requests that did not resolve to a URL pattern (404s, probes)
+UNMATCHED_ROUTE = "unmatched"
+
+
+def request_route(request: HttpRequest) -> str:
+    """
+    URL pattern of the request (e.g. "api/auth/wardrobe/<str:item_id>/").
+
+    Patterns rather than paths keep label cardinality bounded.
+    """
+    resolver_match = getattr(request, "resolver_match", None)
+    if resolver_match is None:
+        return UNMATCHED_ROUTE
+    return resolver_match.route
+
+
+def observe_request(
+    request: HttpRequest, status_code: int, duration: float, db_time: float, db_queries: int
+) -> None:
+    route = request_route(request)
+    REQUEST_LATENCY.labels(request.method, route, str(status_code)).observe(duration)
+    REQUEST_DB_TIME.labels(route).observe(db_time)
+    REQUEST_DB_QUERIES.labels(route).observe(db_queries)
+
+
+def observe_storage_call(operation: str, duration: float) -> None:
+    STORAGE_CALL_LATENCY.labels(operation).observe(duration)
+
+
+def observe_token_verification(result: str, duration: float) -> None:
+    TOKEN_VERIFICATION_LATENCY.labels(result).observe(duration)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_storage_shed(reason: str) -> None:
+    STORAGE_CALLS_SHED.labels(reason).inc()
+
+
+def set_storage_pool_size(size: int) -> None:
+    STORAGE_POOL_SIZE.set(size)
+
+
+def storage_pool_call_started(saturated: bool) -> None:
+    STORAGE_POOL_IN_FLIGHT.inc()
+    STORAGE_POOL_CALLS.inc()
+    if saturated:
+        STORAGE_POOL_SATURATED_CALLS.inc()
+
+
+def storage_pool_call_finished() -> None:
+    STORAGE_POOL_IN_FLIGHT.dec()
+
+
+def record_rate_limit_rejection(limit: str) -> None:
+    RATE_LIMIT_REJECTIONS.labels(limit).inc()
+
+
+def _registry() -> CollectorRegistry:
+    """Registry to export: aggregated worker files in multiprocess mode, else this process."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Prometheus scrape endpoint.
+
+    Scrapers must send "Authorization: Bearer <METRICS_TOKEN>". Without a
+    token the endpoint is only open in development (DEBUG), so a deploy that
+    forgot the token doesn't publish its routes and latencies.
+    """
+    expected_token: Optional[str] = settings.METRICS_TOKEN
+    if expected_token:
+        auth_header = request.META.get("HTTP_AUTHORIZATION", "")
+        if not hmac.compare_digest(auth_header, f"Bearer {expected_token}"):
+            return HttpResponse("Invalid metrics token", status=403, content_type="text/plain")
+    elif not settings.DEBUG:
+        return HttpResponse(
+            "Metrics are disabled until METRICS_TOKEN is set", status=403, content_type="text/plain"
+        )
+
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
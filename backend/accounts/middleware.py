@@ -0,0 +1,114 @@
+"""Request middleware for the accounts app."""
+
+from contextlib import ExitStack
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+from . import metrics, ratelimit, tracing
+from .instrumentation import collect_request_stats
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Measure latency, database and storage work per request.
+
+    Every request is recorded in the Prometheus metrics (see accounts.metrics).
+
+    With EXPOSE_REQUEST_METRICS enabled (the default in DEBUG and benchmark
+    settings) the totals are returned as response headers:
+
+        X-DB-Queries, X-DB-Time-Ms, X-Storage-Calls, X-Storage-Time-Ms
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.expose_headers = settings.EXPOSE_REQUEST_METRICS
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        started = time.perf_counter()
+        with metrics.REQUESTS_IN_FLIGHT.track_inprogress(), collect_request_stats() as stats:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        request.stats = stats
+        metrics.observe_request(
+            request, response.status_code, duration, stats.db_time, stats.db_queries
+        )
+
+        if self.expose_headers:
+            response["X-DB-Queries"] = str(stats.db_queries)
+            response["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.2f}"
+            response["X-Storage-Calls"] = str(stats.storage_calls)
+            response["X-Storage-Time-Ms"] = f"{stats.storage_time * 1000:.2f}"
+
+        return response
+
+
+class TracingMiddleware:
+    """
+    Wrap each request in a tracing span, with a child span per database query.
+
+    Does nothing unless tracing is enabled (see accounts.tracing).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not tracing.is_enabled():
+            return self.get_response(request)
+
+        with tracing.request_span(request) as span, ExitStack() as stack:
+            # Unsampled requests skip the per-query wrapper entirely
+            if span.is_recording():
+                stack.enter_context(connection.execute_wrapper(tracing.trace_query))
+            response = self.get_response(request)
+
+            route = metrics.request_route(request)
+            span.update_name(f"{request.method} {route}")
+            span.set_attribute("http.route", route)
+            span.set_attribute("http.response.status_code", response.status_code)
+
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Enforce the global and per-IP limits on API requests.
+
+    Runs before authentication, so floods are rejected without verifying
+    tokens or touching storage. Health checks, metrics and storage event
+    pushes are exempt: Pub/Sub delivers in bursts from a few addresses and
+    backs off on 429s, and the event endpoint checks its own token.
+    """
+
+    EXEMPT_PREFIXES = ("/api/health/", "/api/metrics/", "/api/auth/storage/events/")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest):
+        if (
+            settings.RATE_LIMIT_ENABLED
+            and request.path.startswith("/api/")
+            and not request.path.startswith(self.EXEMPT_PREFIXES)
+        ):
+            # The global limit is split between processes rather than kept in
+            # the shared store, where every request would contend for its bucket
+            decision = ratelimit.check_process_limits(
+                [ratelimit.Bucket.for_process_share("global", "all")]
+            )
+            if decision.allowed:
+                decision = ratelimit.check_limits(
+                    [ratelimit.Bucket.for_limit("ip", ratelimit.client_ip(request))]
+                )
+            if not decision.allowed:
+                body, retry_after = ratelimit.rejection_body(decision)
+                response = JsonResponse(body, status=429)
+                response["Retry-After"] = retry_after
+                return response
+
+        return self.get_response(request)
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0004_wardrobeitem"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoragePurgeJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("firebase_uid", models.CharField(db_index=True, max_length=255)),
+                ("prefix", models.CharField(help_text="Storage prefix to purge", max_length=500)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        db_index=True,
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "page_token",
+                    models.CharField(
+                        blank=True,
+                        help_text="Listing cursor of the next page to purge (resume point)",
+                        max_length=1024,
+                        null=True,
+                    ),
+                ),
+                ("deleted_count", models.PositiveIntegerField(default=0)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Storage Purge Job",
+                "verbose_name_plural": "Storage Purge Jobs",
+                "db_table": "storage_purge_jobs",
+                "ordering": ["created_at"],
+            },
+        ),
+    ]
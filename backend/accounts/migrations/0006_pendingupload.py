@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0005_storagepurgejob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingUpload",
+            fields=[
+                ("id", models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                (
+                    "category",
+                    models.CharField(choices=[("top", "Top"), ("bottom", "Bottom")], max_length=10),
+                ),
+                (
+                    "image_path",
+                    models.CharField(
+                        help_text="Firebase Storage path the upload URL was signed for",
+                        max_length=500,
+                        unique=True,
+                    ),
+                ),
+                ("content_type", models.CharField(max_length=50)),
+                (
+                    "expected_size",
+                    models.PositiveIntegerField(help_text="File size declared by the client"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        db_index=True, help_text="When the signed upload URL stops being valid"
+                    ),
+                ),
+                (
+                    "user_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_uploads",
+                        to="accounts.userprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pending Upload",
+                "verbose_name_plural": "Pending Uploads",
+                "db_table": "pending_uploads",
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# accounts.ratelimit.BUCKET_TABLE
+BUCKET_TABLE = "rate_limit_buckets"
+
+
+def create_bucket_table(apps, schema_editor):
+    # Only DatabaseRateLimitStore uses this table, and only on PostgreSQL.
+    # UNLOGGED: no WAL for these high-churn rows; they're emptied after a crash.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"""
+        CREATE UNLOGGED TABLE IF NOT EXISTS {BUCKET_TABLE} (
+            key text PRIMARY KEY,
+            tokens double precision NOT NULL,
+            capacity double precision NOT NULL,
+            rate double precision NOT NULL,
+            updated_at double precision NOT NULL,
+            allowed boolean NOT NULL
+        )
+        """)
+
+
+def drop_bucket_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {BUCKET_TABLE}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0006_pendingupload"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_bucket_table, drop_bucket_table),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_rate_limit_buckets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="storagepurgejob",
+            name="not_before",
+            field=models.DateTimeField(
+                blank=True, help_text="Don't run the job before this time", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="mannequin_version",
+            field=models.UUIDField(
+                blank=True,
+                help_text="Version of the current mannequin image (in its path)",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="storagepurgejob",
+            name="prefix",
+            field=models.CharField(
+                help_text="Storage prefix to purge (ending in '/'), or the path of a single object",
+                max_length=500,
+            ),
+        ),
+    ]
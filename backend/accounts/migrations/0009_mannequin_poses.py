@@ -0,0 +1,155 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:07
+
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_profile_mannequins(apps, schema_editor):
+    """Turn each profile's single mannequin image into its default front pose."""
+    UserProfile = apps.get_model("accounts", "UserProfile")
+    Mannequin = apps.get_model("accounts", "Mannequin")
+
+    profiles = UserProfile.objects.exclude(mannequin_image_path=None).exclude(
+        mannequin_image_path=""
+    )
+    for profile in profiles.iterator():
+        mannequin = Mannequin.objects.create(
+            user_profile=profile,
+            pose="front",
+            # The pre-versioning path has no version; give it one
+            version=profile.mannequin_version or uuid.uuid4(),
+            image_path=profile.mannequin_image_path,
+            image_url=profile.mannequin_image_url or "",
+            uploaded_at=profile.mannequin_uploaded_at or django.utils.timezone.now(),
+        )
+        profile.default_mannequin = mannequin
+        profile.save(update_fields=["default_mannequin"])
+
+    if schema_editor.connection.vendor == "postgresql":
+        # Check the deferred foreign keys now: the columns dropped next can't be
+        # altered while these rows have pending trigger events
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_mannequin_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Mannequin",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "pose",
+                    models.CharField(
+                        choices=[
+                            ("front", "Front"),
+                            ("three_quarter", "Three-quarter"),
+                            ("side", "Side"),
+                            ("back", "Back"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "version",
+                    models.UUIDField(help_text="Version of the current image", unique=True),
+                ),
+                (
+                    "image_path",
+                    models.CharField(
+                        help_text="Firebase Storage path for the image", max_length=500
+                    ),
+                ),
+                (
+                    "image_url",
+                    models.URLField(help_text="Signed download URL for the image", max_length=2048),
+                ),
+                (
+                    "thumbnail_path",
+                    models.CharField(
+                        blank=True,
+                        help_text="Firebase Storage path for the thumbnail",
+                        max_length=500,
+                        null=True,
+                    ),
+                ),
+                ("width", models.PositiveIntegerField(blank=True, null=True)),
+                ("height", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "prepared_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When assets were computed for the current version",
+                        null=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "uploaded_at",
+                    models.DateTimeField(help_text="When the current version was uploaded"),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mannequins",
+                        to="accounts.userprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mannequin",
+                "verbose_name_plural": "Mannequins",
+                "db_table": "mannequins",
+                "ordering": ["created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="default_mannequin",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Mannequin pose shown by default",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="accounts.mannequin",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="mannequin",
+            constraint=models.UniqueConstraint(
+                fields=("user_profile", "pose"), name="unique_mannequin_pose"
+            ),
+        ),
+        migrations.RunPython(copy_profile_mannequins, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="userprofile",
+            name="mannequin_image_path",
+        ),
+        migrations.RemoveField(
+            model_name="userprofile",
+            name="mannequin_image_url",
+        ),
+        migrations.RemoveField(
+            model_name="userprofile",
+            name="mannequin_uploaded_at",
+        ),
+        migrations.RemoveField(
+            model_name="userprofile",
+            name="mannequin_version",
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:11
+
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_mannequin_poses"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Outfit",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "mannequin_version",
+                    models.UUIDField(
+                        blank=True,
+                        help_text="Mannequin image version the outfit was put on",
+                        null=True,
+                    ),
+                ),
+                (
+                    "item_ids",
+                    models.JSONField(default=list, help_text="IDs of the wardrobe items worn"),
+                ),
+                (
+                    "image_path",
+                    models.CharField(
+                        blank=True,
+                        help_text="Firebase Storage path for the render",
+                        max_length=500,
+                        null=True,
+                    ),
+                ),
+                ("is_favorite", models.BooleanField(default=False)),
+                (
+                    "created_at",
+                    models.DateTimeField(default=django.utils.timezone.now, editable=False),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "mannequin",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="accounts.mannequin",
+                    ),
+                ),
+                (
+                    "user_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outfits",
+                        to="accounts.userprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Outfit",
+                "verbose_name_plural": "Outfits",
+                "db_table": "outfits",
+                "ordering": ["-created_at", "-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["user_profile", "-created_at", "-id"], name="outfits_history_idx"
+                    ),
+                    models.Index(
+                        condition=models.Q(("is_favorite", True)),
+                        fields=["user_profile", "-created_at", "-id"],
+                        name="outfits_favorites_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0010_outfit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outfit",
+            name="access_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Debounce windows in which the render was served"
+            ),
+        ),
+        migrations.AddField(
+            model_name="outfit",
+            name="image_size",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Size of the render in bytes", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="outfit",
+            name="last_accessed_at",
+            field=models.DateTimeField(
+                blank=True, help_text="When the render was last served (approximate)", null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outfit",
+            index=models.Index(
+                condition=models.Q(("image_path__isnull", False), ("is_favorite", False)),
+                fields=["last_accessed_at"],
+                name="outfits_evictable_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0012_generation_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GenerationQuota",
+            fields=[
+                (
+                    "user_profile",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="generation_quota",
+                        serialize=False,
+                        to="accounts.userprofile",
+                    ),
+                ),
+                ("daily_limit", models.PositiveIntegerField(blank=True, null=True)),
+                ("monthly_limit", models.PositiveIntegerField(blank=True, null=True)),
+                ("day_start", models.DateField(help_text="Day (UTC) day_used counts")),
+                ("day_used", models.PositiveIntegerField(default=0)),
+                (
+                    "month_start",
+                    models.DateField(help_text="First day of the month month_used counts"),
+                ),
+                ("month_used", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Generation Quota",
+                "verbose_name_plural": "Generation Quotas",
+                "db_table": "generation_quotas",
+            },
+        ),
+        migrations.CreateModel(
+            name="GenerationUsageRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("charged", models.PositiveIntegerField(default=0)),
+                ("refunded", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="generation_usage",
+                        to="accounts.userprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Generation Usage Rollup",
+                "verbose_name_plural": "Generation Usage Rollups",
+                "db_table": "generation_usage_rollups",
+                "ordering": ["-day"],
+            },
+        ),
+        migrations.CreateModel(
+            name="GenerationUsageEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("amount", models.SmallIntegerField(help_text="1 for a charge, -1 for a refund")),
+                (
+                    "created_at",
+                    models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+                ),
+                (
+                    "job",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="accounts.generationjob",
+                    ),
+                ),
+                (
+                    "user_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="accounts.userprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Generation Usage Event",
+                "verbose_name_plural": "Generation Usage Events",
+                "db_table": "generation_usage_events",
+                "ordering": ["created_at"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="generationusagerollup",
+            constraint=models.UniqueConstraint(
+                fields=("user_profile", "day"), name="unique_generation_usage_day"
+            ),
+        ),
+    ]
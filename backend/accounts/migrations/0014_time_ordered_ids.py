@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:32
+
+from django.db import migrations, models
+
+import accounts.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_generation_quotas"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="generationjob",
+            name="id",
+            field=models.UUIDField(
+                default=accounts.ids.uuid7, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="outfit",
+            name="id",
+            field=models.UUIDField(
+                default=accounts.ids.uuid7, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="wardrobeitem",
+            name="id",
+            field=models.UUIDField(
+                default=accounts.ids.uuid7, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0014_time_ordered_ids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="session_epoch",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0015_session_epoch"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="storagepurgejob",
+            name="prefix",
+            field=models.CharField(
+                db_index=True,
+                help_text="Storage prefix to purge (ending in '/'), or the path of a single object",
+                max_length=500,
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:55
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.utils import timezone
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    """
+    Keep the oldest unfinished job of each outfit; double submits queued the others.
+
+    Each failed duplicate is refunded like a failed render
+    (accounts.quotas.refund_generation): a -1 ledger event, and the counters
+    are decremented if they still count the day and month of the charge.
+    """
+    GenerationJob = apps.get_model("accounts", "GenerationJob")
+    GenerationQuota = apps.get_model("accounts", "GenerationQuota")
+    GenerationUsageEvent = apps.get_model("accounts", "GenerationUsageEvent")
+    active = GenerationJob.objects.filter(status__in=["pending", "running"])
+
+    duplicated = (
+        active.values("outfit_id").annotate(jobs=Count("id")).filter(jobs__gt=1)
+    ).values_list("outfit_id", flat=True)
+    for outfit_id in list(duplicated):
+        for job in active.filter(outfit_id=outfit_id).order_by("created_at")[1:]:
+            job.status = "failed"
+            job.last_error = "Duplicate of an earlier job for the same outfit"
+            job.save(update_fields=["status", "last_error", "updated_at"])
+
+            day = job.created_at.astimezone(dt_timezone.utc).date()
+            quotas = GenerationQuota.objects.filter(user_profile_id=job.user_profile_id)
+            quotas.filter(day_start=day, day_used__gt=0).update(day_used=F("day_used") - 1)
+            quotas.filter(month_start=day.replace(day=1), month_used__gt=0).update(
+                month_used=F("month_used") - 1
+            )
+            GenerationUsageEvent.objects.create(
+                user_profile_id=job.user_profile_id, job=job, amount=-1, created_at=timezone.now()
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0016_purge_job_prefix_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="generationjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["pending", "running"])),
+                fields=("outfit",),
+                name="unique_active_generation_job",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:57
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("accounts", "0017_unique_active_generation_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SessionUser",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("auth.user",),
+            managers=[
+                ("objects", django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
@@ -2,6 +2,9 @@ import uuid
 
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
+
+from .ids import uuid7
 
 
 class UserProfile(models.Model):
@@ -15,17 +18,19 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    # Mannequin image for virtual try-on
-    mannequin_image_path = models.CharField(
-        max_length=500, blank=True, null=True, help_text="Firebase Storage path for mannequin image"
-    )
-    mannequin_image_url = models.URLField(
-        max_length=2048, blank=True, null=True, help_text="Public download URL for mannequin image"
-    )
-    mannequin_uploaded_at = models.DateTimeField(
-        blank=True, null=True, help_text="When the mannequin image was last uploaded"
+    # Mannequin pose used for virtual try-on unless another one is picked
+    default_mannequin = models.ForeignKey(
+        "Mannequin",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+        help_text="Mannequin pose shown by default",
     )
 
+    # Session tokens carry the epoch they were issued in; bumping it revokes them
+    session_epoch = models.PositiveIntegerField(default=0)
+
     class Meta:
         db_table = "user_profiles"
         verbose_name = "User Profile"
@@ -35,6 +40,90 @@ class UserProfile(models.Model):
         return f"{self.user.email} ({self.firebase_uid})"
 
 
+class SessionUser(User):
+    """
+    A user built from session token claims with only its id loaded
+    (accounts.authentication.SessionTokenAuthentication).
+
+    The first access to any other field loads all of them with one query,
+    rather than one per field, and keeps the profile built from the claims.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            fields = deferred
+
+        # Refreshing clears cached relations, which would cost a query for the profile
+        profile_field = self._meta.get_field("profile")
+        profile = profile_field.get_cached_value(self, default=None)
+        super().refresh_from_db(using=using, fields=fields)
+        if profile is not None:
+            profile.user = self
+
+
+class Mannequin(models.Model):
+    """
+    One pose of a user's mannequin for virtual try-on.
+    Holds the current image version of the pose and the assets precomputed
+    from it (dimensions and a thumbnail), so switching poses needs no
+    processing. Uploading a new image for a pose replaces its version.
+    """
+
+    POSE_CHOICES = [
+        ("front", "Front"),
+        ("three_quarter", "Three-quarter"),
+        ("side", "Side"),
+        ("back", "Back"),
+    ]
+
+    # Stays the same when the pose's image is replaced
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # Relationships
+    user_profile = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="mannequins"
+    )
+
+    pose = models.CharField(max_length=20, choices=POSE_CHOICES)
+
+    # Current image version (the version is part of its path)
+    version = models.UUIDField(unique=True, help_text="Version of the current image")
+    image_path = models.CharField(max_length=500, help_text="Firebase Storage path for the image")
+    image_url = models.URLField(max_length=2048, help_text="Signed download URL for the image")
+
+    # Assets precomputed from the current version
+    thumbnail_path = models.CharField(
+        max_length=500, blank=True, null=True, help_text="Firebase Storage path for the thumbnail"
+    )
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    prepared_at = models.DateTimeField(
+        blank=True, null=True, help_text="When assets were computed for the current version"
+    )
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    uploaded_at = models.DateTimeField(help_text="When the current version was uploaded")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "mannequins"
+        verbose_name = "Mannequin"
+        verbose_name_plural = "Mannequins"
+        # Also the index the pose list of a user is read from
+        constraints = [
+            models.UniqueConstraint(fields=["user_profile", "pose"], name="unique_mannequin_pose"),
+        ]
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.user_profile.firebase_uid} - {self.pose} ({self.version})"
+
+
 class WardrobeItem(models.Model):
     """
     Individual clothing items in user's wardrobe.
@@ -46,8 +135,8 @@ class WardrobeItem(models.Model):
         ("bottom", "Bottom"),
     ]
 
-    # Auto-generated UUID for unique identification
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Time-ordered UUID, assigned when the upload URL is issued (see accounts.ids)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
 
     # Relationships
     user_profile = models.ForeignKey(
@@ -83,3 +172,302 @@ class WardrobeItem(models.Model):
 
     def __str__(self):
         return f"{self.user_profile.user.email} - {self.category} - {self.id}"
+
+
+class Outfit(models.Model):
+    """
+    A combination of wardrobe items on a mannequin version, in the user's
+    outfit history. Generated renders add an entry each, so history is read
+    page by page in (created_at, id) order rather than with offsets.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+
+    # Relationships
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="outfits")
+    mannequin = models.ForeignKey(
+        Mannequin, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    # Plain values so the entry keeps describing the outfit after the pose is
+    # replaced or items are deleted (and rows stay narrow)
+    mannequin_version = models.UUIDField(
+        blank=True, null=True, help_text="Mannequin image version the outfit was put on"
+    )
+    item_ids = models.JSONField(default=list, help_text="IDs of the wardrobe items worn")
+
+    # Rendered image, once generated (evicted renders are cleared and can be regenerated)
+    image_path = models.CharField(
+        max_length=500, blank=True, null=True, help_text="Firebase Storage path for the render"
+    )
+    image_size = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Size of the render in bytes"
+    )
+    # Written in batches by accounts.renders, at most once per debounce window
+    last_accessed_at = models.DateTimeField(
+        blank=True, null=True, help_text="When the render was last served (approximate)"
+    )
+    access_count = models.PositiveIntegerField(
+        default=0, help_text="Debounce windows in which the render was served"
+    )
+
+    is_favorite = models.BooleanField(default=False)
+
+    # Timestamps (created_at is the history order; id breaks ties)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "outfits"
+        verbose_name = "Outfit"
+        verbose_name_plural = "Outfits"
+        indexes = [
+            models.Index(fields=["user_profile", "-created_at", "-id"], name="outfits_history_idx"),
+            # Favorites are a small fraction of history; index only those rows
+            models.Index(
+                fields=["user_profile", "-created_at", "-id"],
+                condition=models.Q(is_favorite=True),
+                name="outfits_favorites_idx",
+            ),
+            # Eviction candidates in LRU order: stored renders that aren't favorites
+            models.Index(
+                fields=["last_accessed_at"],
+                condition=models.Q(image_path__isnull=False, is_favorite=False),
+                name="outfits_evictable_idx",
+            ),
+        ]
+        ordering = ["-created_at", "-id"]
+
+    def __str__(self):
+        return f"{self.user_profile.firebase_uid} - {self.created_at.isoformat()} ({self.id})"
+
+
+class PendingUpload(models.Model):
+    """
+    Reservation recorded when a wardrobe upload URL is issued.
+    Confirming the upload turns it into a WardrobeItem with the same id;
+    reservations that are never confirmed are garbage-collected.
+    """
+
+    # Becomes the WardrobeItem primary key on confirm
+    id = models.UUIDField(primary_key=True, editable=False)
+
+    user_profile = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="pending_uploads"
+    )
+    category = models.CharField(max_length=10, choices=WardrobeItem.CATEGORY_CHOICES)
+    image_path = models.CharField(
+        max_length=500, unique=True, help_text="Firebase Storage path the upload URL was signed for"
+    )
+    content_type = models.CharField(max_length=50)
+    expected_size = models.PositiveIntegerField(help_text="File size declared by the client")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(
+        db_index=True, help_text="When the signed upload URL stops being valid"
+    )
+
+    class Meta:
+        db_table = "pending_uploads"
+        verbose_name = "Pending Upload"
+        verbose_name_plural = "Pending Uploads"
+
+    def __str__(self):
+        return f"{self.image_path} (expires {self.expires_at.isoformat()})"
+
+
+class StoragePurgeJob(models.Model):
+    """
+    Background job that deletes every storage object under a prefix.
+    Created when an account is deleted (the page token makes it resumable)
+    and, for a single object, when a mannequin version is superseded.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    # Kept as plain values (not a foreign key) because the profile is already gone
+    firebase_uid = models.CharField(max_length=255, db_index=True)
+    # Looked up when scheduling and on every mannequin confirm
+    prefix = models.CharField(
+        max_length=500,
+        db_index=True,
+        help_text="Storage prefix to purge (ending in '/'), or the path of a single object",
+    )
+    not_before = models.DateTimeField(
+        blank=True, null=True, help_text="Don't run the job before this time"
+    )
+
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True
+    )
+    page_token = models.CharField(
+        max_length=1024,
+        blank=True,
+        null=True,
+        help_text="Listing cursor of the next page to purge (resume point)",
+    )
+    deleted_count = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "storage_purge_jobs"
+        verbose_name = "Storage Purge Job"
+        verbose_name_plural = "Storage Purge Jobs"
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.prefix} ({self.status})"
+
+
+class GenerationJob(models.Model):
+    """
+    Queued render of an outfit by the upstream generation API.
+    Claimed by generation workers (accounts.generation), which send the jobs
+    they are running concurrently to the API in batches.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+
+    # Relationships
+    user_profile = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="generation_jobs"
+    )
+    outfit = models.ForeignKey(Outfit, on_delete=models.CASCADE, related_name="generation_jobs")
+
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "generation_jobs"
+        verbose_name = "Generation Job"
+        verbose_name_plural = "Generation Jobs"
+        constraints = [
+            # At most one unfinished job per outfit, however requests race
+            models.UniqueConstraint(
+                fields=["outfit"],
+                condition=models.Q(status__in=["pending", "running"]),
+                name="unique_active_generation_job",
+            )
+        ]
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.outfit_id} ({self.status})"
+
+
+class GenerationQuota(models.Model):
+    """
+    A user's generation counters for the current day and month.
+    Checked and incremented by a single conditional UPDATE (accounts.quotas),
+    so enforcing a quota costs one row write however long the usage history is.
+    """
+
+    user_profile = models.OneToOneField(
+        UserProfile, on_delete=models.CASCADE, primary_key=True, related_name="generation_quota"
+    )
+
+    # Per-user overrides of GENERATION_QUOTA_DAILY and GENERATION_QUOTA_MONTHLY
+    daily_limit = models.PositiveIntegerField(blank=True, null=True)
+    monthly_limit = models.PositiveIntegerField(blank=True, null=True)
+
+    # Counters restart when the first generation of a new day or month moves the period
+    day_start = models.DateField(help_text="Day (UTC) day_used counts")
+    day_used = models.PositiveIntegerField(default=0)
+    month_start = models.DateField(help_text="First day of the month month_used counts")
+    month_used = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "generation_quotas"
+        verbose_name = "Generation Quota"
+        verbose_name_plural = "Generation Quotas"
+
+    def __str__(self):
+        return f"{self.user_profile.firebase_uid} ({self.day_used} today)"
+
+
+class GenerationUsageEvent(models.Model):
+    """
+    Ledger entry for a charged (+1) or refunded (-1) generation.
+    Completed days are rolled up into GenerationUsageRollup rows and deleted,
+    so the table only holds recent events.
+    """
+
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="+")
+    job = models.ForeignKey(
+        GenerationJob, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    amount = models.SmallIntegerField(help_text="1 for a charge, -1 for a refund")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "generation_usage_events"
+        verbose_name = "Generation Usage Event"
+        verbose_name_plural = "Generation Usage Events"
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.user_profile_id} {self.amount:+d} ({self.created_at.isoformat()})"
+
+
+class GenerationUsageRollup(models.Model):
+    """Generations charged and refunded per user and day, rolled up from the usage ledger."""
+
+    user_profile = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="generation_usage"
+    )
+    day = models.DateField()
+    charged = models.PositiveIntegerField(default=0)
+    refunded = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "generation_usage_rollups"
+        verbose_name = "Generation Usage Rollup"
+        verbose_name_plural = "Generation Usage Rollups"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_profile", "day"], name="unique_generation_usage_day"
+            )
+        ]
+        ordering = ["-day"]
+
+    def __str__(self):
+        return f"{self.user_profile_id} {self.day}: {self.charged - self.refunded}"
@@ -0,0 +1,364 @@
+"""Views for outfit history, favorites and renders."""
+
+import math
+import uuid
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .generation import enqueue_generation
+from .models import GenerationJob, Mannequin, Outfit, UserProfile, WardrobeItem
+from .outfits import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, history_page, items_for_outfits
+from .purge import schedule_object_cleanup
+from .quotas import QuotaExceededError, get_quota_usage, quota_resets
+from .ratelimit import rate_limit
+from .renders import get_render_access_tracker
+from .storage import sign_download_url
+
+# Most items one outfit can combine
+MAX_OUTFIT_ITEMS = 10
+
+
+def _serialize_outfit(outfit: Outfit, items: dict[str, dict]) -> dict:
+    """Serialize an outfit with the (already serialized) items it references."""
+    return {
+        "id": str(outfit.id),
+        "mannequinId": str(outfit.mannequin_id) if outfit.mannequin_id else None,
+        "mannequinVersion": str(outfit.mannequin_version) if outfit.mannequin_version else None,
+        "itemIds": outfit.item_ids,
+        # Items deleted from the wardrobe since are left out
+        "items": [items[item_id] for item_id in outfit.item_ids if item_id in items],
+        "imageUrl": sign_download_url(outfit.image_path) if outfit.image_path else None,
+        "isFavorite": outfit.is_favorite,
+        "createdAt": outfit.created_at.isoformat(),
+    }
+
+
+def _serialize_items(items: list[WardrobeItem]) -> dict[str, dict]:
+    """Serialize wardrobe items by id, signing each URL once however many outfits use it."""
+    return {
+        str(item.id): {
+            "id": str(item.id),
+            "category": item.category,
+            "url": sign_download_url(item.image_path),
+        }
+        for item in items
+    }
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def outfits(request: Request) -> Response:
+    """
+    List outfit history (GET) or save an outfit to it (POST).
+
+    GET query parameters:
+        cursor (optional): nextCursor of the previous page
+        limit (optional): Outfits per page (default 20, at most 100)
+        favorites (optional): "true" to list favorites only
+
+    GET returns:
+        {
+            "outfits": [
+                {
+                    "id": "550e8400-...",
+                    "mannequinId": "...",
+                    "mannequinVersion": "...",
+                    "itemIds": ["...", "..."],
+                    "items": [{"id": "...", "category": "top", "url": "https://..."}],
+                    "imageUrl": null,
+                    "isFavorite": false,
+                    "createdAt": "2024-01-06T12:00:00Z"
+                }
+            ],
+            "nextCursor": "MjAyNC0w..."  // null on the last page
+        }
+
+    POST request body:
+        {
+            "itemIds": ["550e8400-...", "..."],
+            "mannequinId": "..."  // optional, defaults to the default pose
+        }
+
+    POST returns the saved outfit, with status 201.
+    """
+    if request.method == "POST":
+        return _create_outfit(request)
+
+    user: User = request.user
+    profile: UserProfile = user.profile
+
+    try:
+        limit = int(request.query_params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return Response({"error": "Invalid limit value"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return Response(
+            {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    favorites = request.query_params.get("favorites", "").lower() in ("1", "true")
+
+    try:
+        page, next_cursor = history_page(
+            profile, request.query_params.get("cursor"), limit, favorites
+        )
+    except ValueError:
+        return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # One query for the items of the whole page, not one per outfit
+    items = _serialize_items(list(items_for_outfits(profile, page).values()))
+
+    # Buffered: written for many requests at once, not with an UPDATE per page
+    get_render_access_tracker().record(page)
+
+    return Response(
+        {
+            "outfits": [_serialize_outfit(outfit, items) for outfit in page],
+            "nextCursor": next_cursor,
+        }
+    )
+
+
+def _create_outfit(request: Request) -> Response:
+    user: User = request.user
+    profile: UserProfile = user.profile
+
+    item_ids = request.data.get("itemIds")
+    if not isinstance(item_ids, list) or not item_ids:
+        return Response(
+            {"error": "itemIds must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(item_ids) > MAX_OUTFIT_ITEMS:
+        return Response(
+            {"error": f"An outfit can have at most {MAX_OUTFIT_ITEMS} items"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        item_ids = list(dict.fromkeys(str(uuid.UUID(str(item_id))) for item_id in item_ids))
+    except ValueError:
+        return Response({"error": "Invalid item ID format"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # SECURITY: Every item must belong to the authenticated user
+    items = list(WardrobeItem.objects.filter(id__in=item_ids, user_profile=profile))
+    if len(items) != len(item_ids):
+        return Response(
+            {"error": "Item not found or does not belong to user"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    mannequin_id = request.data.get("mannequinId") or profile.default_mannequin_id
+    mannequin = None
+    if mannequin_id:
+        try:
+            mannequin = Mannequin.objects.filter(
+                id=uuid.UUID(str(mannequin_id)), user_profile=profile
+            ).first()
+        except ValueError:
+            return Response(
+                {"error": "Invalid mannequin ID format"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if mannequin is None:
+            return Response(
+                {"error": "Mannequin not found or does not belong to user"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+    outfit = Outfit.objects.create(
+        user_profile=profile,
+        mannequin=mannequin,
+        mannequin_version=mannequin.version if mannequin else None,
+        item_ids=item_ids,
+    )
+
+    return Response(
+        _serialize_outfit(outfit, _serialize_items(items)), status=status.HTTP_201_CREATED
+    )
+
+
+@api_view(["PATCH", "DELETE"])
+@permission_classes([IsAuthenticated])
+def outfit_detail(request: Request, outfit_id: str) -> Response:
+    """
+    Mark an outfit as a favorite or not (PATCH), or remove it from history (DELETE).
+
+    PATCH request body:
+        {
+            "isFavorite": true
+        }
+
+    Returns:
+        {
+            "success": true
+        }
+    """
+    user: User = request.user
+
+    # Validate UUID format
+    try:
+        outfit_uuid = uuid.UUID(outfit_id)
+    except ValueError:
+        return Response({"error": "Invalid outfit ID format"}, status=status.HTTP_400_BAD_REQUEST)
+
+    outfit = Outfit.objects.filter(id=outfit_uuid, user_profile=user.profile)
+
+    if request.method == "DELETE":
+        image_path = outfit.values_list("image_path", flat=True).first()
+        matched, _ = outfit.delete()
+        if matched and image_path:
+            schedule_object_cleanup(user.profile.firebase_uid, image_path)
+    else:
+        is_favorite = request.data.get("isFavorite")
+        if not isinstance(is_favorite, bool):
+            return Response(
+                {"error": "isFavorite must be true or false"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        # A single UPDATE, scoped to the owner
+        matched = outfit.update(is_favorite=is_favorite, updated_at=timezone.now())
+
+    if not matched:
+        return Response(
+            {"error": "Outfit not found or does not belong to user"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    return Response({"success": True})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@rate_limit("generation")
+def render_outfit(request: Request, outfit_id: str) -> Response:
+    """
+    Queue a render of an outfit.
+
+    Renders are generated by background workers; poll the returned job (or
+    the outfit's imageUrl in history) for the result. Requesting a render of
+    an outfit that already has one queued returns that job. Each new render
+    is charged to the user's daily and monthly generation quota; when either
+    is used up the response is 429 with the time it resets.
+
+    Returns (status 202):
+        {
+            "jobId": "550e8400-...",
+            "status": "pending"
+        }
+    """
+    user: User = request.user
+
+    # Validate UUID format
+    try:
+        outfit_uuid = uuid.UUID(outfit_id)
+    except ValueError:
+        return Response({"error": "Invalid outfit ID format"}, status=status.HTTP_400_BAD_REQUEST)
+
+    outfit = Outfit.objects.filter(id=outfit_uuid, user_profile=user.profile).first()
+    if outfit is None:
+        return Response(
+            {"error": "Outfit not found or does not belong to user"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    if outfit.mannequin_id is None:
+        return Response(
+            {"error": "Outfit has no mannequin to render on"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        job = enqueue_generation(outfit)
+    except QuotaExceededError as e:
+        retry_after = max(1, math.ceil((e.resets_at - timezone.now()).total_seconds()))
+        return Response(
+            {"error": str(e), "resetsAt": e.resets_at.isoformat()},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retry_after)},
+        )
+    return Response({"jobId": str(job.id), "status": job.status}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def generation_job(request: Request, job_id: str) -> Response:
+    """
+    Get the status of a render.
+
+    Returns:
+        {
+            "jobId": "550e8400-...",
+            "outfitId": "...",
+            "status": "completed",  // pending, running, completed or failed
+            "imageUrl": "https://...",  // once completed (null if since evicted)
+            "error": null  // why the render failed
+        }
+    """
+    user: User = request.user
+
+    # Validate UUID format
+    try:
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        return Response({"error": "Invalid job ID format"}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = (
+        GenerationJob.objects.select_related("outfit")
+        .filter(id=job_uuid, user_profile=user.profile)
+        .first()
+    )
+    if job is None:
+        return Response(
+            {"error": "Job not found or does not belong to user"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    completed = job.status == GenerationJob.STATUS_COMPLETED
+    return Response(
+        {
+            "jobId": str(job.id),
+            "outfitId": str(job.outfit_id),
+            "status": job.status,
+            "imageUrl": (
+                sign_download_url(job.outfit.image_path)
+                if completed and job.outfit.image_path
+                else None
+            ),
+            "error": job.last_error if job.status == GenerationJob.STATUS_FAILED else None,
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def generation_quota(request: Request) -> Response:
+    """
+    Get the user's generation quota usage.
+
+    Returns:
+        {
+            "daily": {"used": 3, "limit": 20, "resetsAt": "2024-01-07T00:00:00+00:00"},
+            "monthly": {"used": 41, "limit": 200, "resetsAt": "2024-02-01T00:00:00+00:00"}
+        }
+    """
+    user: User = request.user
+    usage = get_quota_usage(user.profile.pk)
+    day_reset, month_reset = quota_resets()
+
+    return Response(
+        {
+            "daily": {
+                "used": usage.day_used,
+                "limit": usage.daily_limit,
+                "resetsAt": day_reset.isoformat(),
+            },
+            "monthly": {
+                "used": usage.month_used,
+                "limit": usage.monthly_limit,
+                "resetsAt": month_reset.isoformat(),
+            },
+        }
+    )
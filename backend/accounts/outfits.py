@@ -0,0 +1,96 @@
+"""Outfit history: keyset pagination and batched loading of the items worn."""
+
+import base64
+from datetime import datetime
+from typing import Optional
+import uuid
+
+from django.db.models import Q
+
+from .models import Outfit, UserProfile, WardrobeItem
+
+# Outfits per history page
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(outfit: Outfit) -> str:
+    """Opaque cursor pointing just after an outfit in history order."""
+    raw = f"{outfit.created_at.isoformat()}|{outfit.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Decode a cursor from encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, outfit_id = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(outfit_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def history_page(
+    profile: UserProfile,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    favorites: bool = False,
+) -> tuple[list[Outfit], Optional[str]]:
+    """
+    Read one page of a user's outfit history, newest first.
+
+    Pages are addressed by the (created_at, id) of the last outfit seen, so
+    every page is a range scan of the history (or favorites) index that costs
+    the same however deep into the history it is.
+
+    Args:
+        profile: Owner of the history
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum outfits on the page
+        favorites: Only list favorites
+
+    Returns:
+        Tuple of (outfits, cursor of the next page or None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    outfits = Outfit.objects.filter(user_profile=profile)
+    if favorites:
+        outfits = outfits.filter(is_favorite=True)
+    if cursor:
+        created_at, outfit_id = decode_cursor(cursor)
+        # The OR alone gives the planner no bound on the index; the redundant
+        # created_at <= cursor makes the page a range scan from the cursor on
+        outfits = outfits.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=outfit_id),
+            created_at__lte=created_at,
+        )
+
+    # One extra row tells whether there is a next page
+    page = list(outfits.order_by("-created_at", "-id")[: limit + 1])
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    return page, encode_cursor(page[-1])
+
+
+def items_for_outfits(profile: UserProfile, outfits: list[Outfit]) -> dict[str, WardrobeItem]:
+    """
+    Load every wardrobe item worn in a page of outfits with one query.
+
+    Items that have since been deleted are missing from the result.
+
+    Returns:
+        Items by their id (as a string, like Outfit.item_ids)
+    """
+    item_ids = {item_id for outfit in outfits for item_id in outfit.item_ids}
+    if not item_ids:
+        return {}
+    items = WardrobeItem.objects.filter(user_profile=profile, id__in=item_ids)
+    return {str(item.id): item for item in items}
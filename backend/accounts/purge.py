@@ -0,0 +1,233 @@
+"""Background purge of user storage after account deletion, and of superseded objects."""
+
+from datetime import timedelta
+import logging
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import StoragePurgeJob, UserProfile
+from .storage import (
+    DELETE_WORKERS,
+    LIST_PAGE_SIZE,
+    delete_files,
+    generate_user_prefix,
+    list_files,
+)
+
+logger = logging.getLogger(__name__)
+
+# A running job that hasn't checkpointed for this long is assumed to belong to a dead worker
+STALE_JOB_TIMEOUT = timedelta(minutes=15)
+
+# Give up on a job after this many failed runs
+MAX_ATTEMPTS = 5
+
+# Superseded objects are kept this long, so requests and generations that
+# started with the previous version (and cached URLs) can still read it
+SUPERSEDED_OBJECT_GRACE = timedelta(hours=1)
+
+# Completed jobs are kept this long, as they also record which mannequin
+# versions were superseded; longer than storage notifications are redelivered
+COMPLETED_JOB_RETENTION = timedelta(days=30)
+
+
+def schedule_account_purge(firebase_uid: str) -> StoragePurgeJob:
+    """
+    Queue deletion of every storage object owned by a user.
+
+    Scheduling is idempotent: an unfinished job for the same prefix is reused.
+
+    Args:
+        firebase_uid: Firebase UID of the deleted user
+
+    Returns:
+        The pending or running purge job
+
+    Raises:
+        ValueError: If firebase_uid contains invalid characters
+    """
+    prefix = generate_user_prefix(firebase_uid)
+
+    existing = StoragePurgeJob.objects.filter(
+        prefix=prefix,
+        status__in=[StoragePurgeJob.STATUS_PENDING, StoragePurgeJob.STATUS_RUNNING],
+    ).first()
+    if existing:
+        return existing
+
+    return StoragePurgeJob.objects.create(firebase_uid=firebase_uid, prefix=prefix)
+
+
+def schedule_object_cleanup(
+    firebase_uid: str, file_path: str, delay: timedelta = SUPERSEDED_OBJECT_GRACE
+) -> StoragePurgeJob:
+    """
+    Queue deletion of a single object that is no longer referenced.
+
+    Args:
+        firebase_uid: Firebase UID of the object's owner
+        file_path: Storage path of the object (must not end in '/')
+        delay: How long to keep the object before deleting it
+
+    Returns:
+        The queued purge job
+    """
+    if file_path.endswith("/"):
+        raise ValueError(f"Not an object path: {file_path!r}")
+
+    return StoragePurgeJob.objects.create(
+        firebase_uid=firebase_uid, prefix=file_path, not_before=timezone.now() + delay
+    )
+
+
+def claim_next_job() -> Optional[StoragePurgeJob]:
+    """
+    Claim the oldest runnable job (pending and due, or running but stale).
+
+    Rows are locked with SKIP LOCKED so several workers can drain the
+    queue concurrently without picking up the same job.
+
+    Returns:
+        The claimed job, or None if the queue is empty
+    """
+    now = timezone.now()
+    stale_before = now - STALE_JOB_TIMEOUT
+
+    with transaction.atomic():
+        job = (
+            StoragePurgeJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=StoragePurgeJob.STATUS_PENDING)
+                & (Q(not_before__isnull=True) | Q(not_before__lte=now))
+                | Q(status=StoragePurgeJob.STATUS_RUNNING, updated_at__lt=stale_before)
+            )
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = StoragePurgeJob.STATUS_RUNNING
+        job.attempts += 1
+        job.save(update_fields=["status", "attempts", "updated_at"])
+
+    return job
+
+
+def run_job(
+    job: StoragePurgeJob, page_size: int = LIST_PAGE_SIZE, max_workers: int = DELETE_WORKERS
+) -> StoragePurgeJob:
+    """
+    Purge a job's prefix page by page, checkpointing after every page.
+
+    Jobs for a single object path delete just that object.
+
+    Each listed page is deleted concurrently before the next page token is
+    saved, so an interrupted job resumes at the first page that may still
+    contain objects.
+
+    A whole-account purge fails without deleting anything more while a
+    profile with the account's UID exists again (e.g. re-created by a
+    token issued before the deletion): its objects would be the new
+    account's.
+
+    Args:
+        job: A claimed (running) purge job
+        page_size: Number of objects listed and deleted per page
+        max_workers: Maximum concurrent delete requests per page
+
+    Returns:
+        The updated job
+    """
+    try:
+        while True:
+            if job.prefix.endswith("/"):
+                if UserProfile.objects.filter(firebase_uid=job.firebase_uid).exists():
+                    job.status = StoragePurgeJob.STATUS_FAILED
+                    job.last_error = "The account exists again; not purging its storage"
+                    job.save(update_fields=["status", "last_error", "updated_at"])
+                    logger.warning(f"Not purging {job.prefix}: {job.last_error}")
+                    break
+                names, next_page_token = list_files(job.prefix, job.page_token, page_size)
+            else:
+                # A single object; a prefix listing could match other objects
+                names, next_page_token = [job.prefix], None
+            job.deleted_count += delete_files(names, max_workers=max_workers)
+            job.page_token = next_page_token
+
+            if next_page_token is None:
+                job.status = StoragePurgeJob.STATUS_COMPLETED
+                job.completed_at = timezone.now()
+                job.last_error = ""
+
+            job.save(
+                update_fields=[
+                    "deleted_count",
+                    "page_token",
+                    "status",
+                    "completed_at",
+                    "last_error",
+                    "updated_at",
+                ]
+            )
+
+            if next_page_token is None:
+                break
+
+    except Exception as e:
+        logger.exception(f"Storage purge of {job.prefix} failed (attempt {job.attempts})")
+        job.last_error = str(e)
+        job.status = (
+            StoragePurgeJob.STATUS_FAILED
+            if job.attempts >= MAX_ATTEMPTS
+            else StoragePurgeJob.STATUS_PENDING
+        )
+        job.save(update_fields=["last_error", "status", "updated_at"])
+
+    return job
+
+
+def run_pending_jobs(
+    limit: Optional[int] = None,
+    page_size: int = LIST_PAGE_SIZE,
+    max_workers: int = DELETE_WORKERS,
+) -> int:
+    """
+    Drain the purge queue.
+
+    Args:
+        limit: Maximum number of jobs to run, or None to run until the queue is empty
+        page_size: Number of objects listed and deleted per page
+        max_workers: Maximum concurrent delete requests per page
+
+    Returns:
+        Number of jobs processed
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+
+        run_job(job, page_size=page_size, max_workers=max_workers)
+        logger.info(f"Purged {job.deleted_count} objects under {job.prefix} ({job.status})")
+        processed += 1
+
+    return processed
+
+
+def prune_completed_jobs(retention: timedelta = COMPLETED_JOB_RETENTION) -> int:
+    """
+    Delete jobs that completed more than retention ago (failed jobs are kept).
+
+    Returns:
+        Number of jobs deleted
+    """
+    deleted, _ = StoragePurgeJob.objects.filter(
+        status=StoragePurgeJob.STATUS_COMPLETED,
+        completed_at__lt=timezone.now() - retention,
+    ).delete()
+    return deleted
@@ -0,0 +1,245 @@
+"""
+Per-user generation quotas and the usage ledger.
+
+Every queued render is charged against a daily and a monthly quota
+(GENERATION_QUOTA_DAILY, GENERATION_QUOTA_MONTHLY, or the user's overrides).
+The check and the increment are one conditional UPDATE of the user's
+GenerationQuota row, so concurrent requests can't both take the last
+generation and no lock is held between reading and writing the counters.
+Counters move to a new day or month in the same statement.
+
+Each charge and refund is also appended to the GenerationUsageEvent ledger.
+rollup_usage_events periodically folds completed days into one
+GenerationUsageRollup row per user and day, keeping the ledger small.
+"""
+
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GenerationJob, GenerationQuota, GenerationUsageEvent, GenerationUsageRollup
+
+QUOTA_TABLE = GenerationQuota._meta.db_table
+
+# Counters of a new period start at 1 (this charge); within the period they
+# are only incremented while below the limit
+CHARGE_SQL = f"""
+    UPDATE {QUOTA_TABLE} SET
+        day_used = CASE WHEN day_start = %(day)s THEN day_used + 1 ELSE 1 END,
+        day_start = %(day)s,
+        month_used = CASE WHEN month_start = %(month)s THEN month_used + 1 ELSE 1 END,
+        month_start = %(month)s,
+        updated_at = %(now)s
+    WHERE user_profile_id = %(user_profile_id)s
+        AND (day_start <> %(day)s OR day_used < COALESCE(daily_limit, %(daily_limit)s))
+        AND (month_start <> %(month)s OR month_used < COALESCE(monthly_limit, %(monthly_limit)s))
+    RETURNING day_used, COALESCE(daily_limit, %(daily_limit)s),
+        month_used, COALESCE(monthly_limit, %(monthly_limit)s)
+"""
+
+# Only counters still in the period of the charge give it back
+REFUND_SQL = f"""
+    UPDATE {QUOTA_TABLE} SET
+        day_used = CASE WHEN day_start = %(day)s AND day_used > 0
+            THEN day_used - 1 ELSE day_used END,
+        month_used = CASE WHEN month_start = %(month)s AND month_used > 0
+            THEN month_used - 1 ELSE month_used END,
+        updated_at = %(now)s
+    WHERE user_profile_id = %(user_profile_id)s
+"""
+
+# Ledger events folded into rollups per transaction
+ROLLUP_BATCH_SIZE = 5000
+
+
+class QuotaUsage(NamedTuple):
+    """Generations used and allowed in the current day and month."""
+
+    day_used: int
+    daily_limit: int
+    month_used: int
+    monthly_limit: int
+
+
+class QuotaExceededError(Exception):
+    """The user has used up their daily or monthly generations."""
+
+    def __init__(self, period: str, limit: int, resets_at: datetime):
+        super().__init__(f"{period.capitalize()} generation quota of {limit} used up")
+        self.period = period
+        self.limit = limit
+        self.resets_at = resets_at
+
+
+def _periods(moment: datetime) -> tuple[date, date]:
+    """The (UTC) day and first day of the month a moment falls in."""
+    day = moment.astimezone(dt_timezone.utc).date()
+    return day, day.replace(day=1)
+
+
+def _next_day(day: date) -> datetime:
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+
+
+def _next_month(month: date) -> datetime:
+    following = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return datetime.combine(following, time.min, tzinfo=dt_timezone.utc)
+
+
+def charge_generation(
+    user_profile_id: int, job: Optional[GenerationJob] = None, now: Optional[datetime] = None
+) -> QuotaUsage:
+    """
+    Take one generation from a user's daily and monthly quotas.
+
+    Call inside the transaction that queues the generation, so the charge is
+    undone if queueing fails.
+
+    Args:
+        user_profile_id: User to charge
+        job: Job the charge is for, recorded in the ledger
+        now: Time of the charge (default now)
+
+    Returns:
+        Usage after the charge
+
+    Raises:
+        QuotaExceededError: If either quota is used up (nothing is charged)
+    """
+    now = now or timezone.now()
+    day, month = _periods(now)
+    params = {
+        "user_profile_id": user_profile_id,
+        "day": day,
+        "month": month,
+        "now": now,
+        "daily_limit": settings.GENERATION_QUOTA_DAILY,
+        "monthly_limit": settings.GENERATION_QUOTA_MONTHLY,
+    }
+
+    with connection.cursor() as cursor:
+        cursor.execute(CHARGE_SQL, params)
+        row = cursor.fetchone()
+        if row is None:
+            # No row yet (the user's first generation) or the quota is used up
+            GenerationQuota.objects.bulk_create(
+                [
+                    GenerationQuota(
+                        user_profile_id=user_profile_id, day_start=day, month_start=month
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+            cursor.execute(CHARGE_SQL, params)
+            row = cursor.fetchone()
+
+    if row is None:
+        usage = get_quota_usage(user_profile_id, now)
+        if usage.day_used >= usage.daily_limit:
+            raise QuotaExceededError("daily", usage.daily_limit, _next_day(day))
+        raise QuotaExceededError("monthly", usage.monthly_limit, _next_month(month))
+
+    GenerationUsageEvent.objects.create(
+        user_profile_id=user_profile_id, job=job, amount=1, created_at=now
+    )
+    return QuotaUsage(*row)
+
+
+def refund_generation(
+    user_profile_id: int, charged_at: datetime, job: Optional[GenerationJob] = None
+) -> None:
+    """
+    Give back a generation charged at charged_at (e.g. for a render that failed).
+
+    The refund only restores counters still in the day and month of the charge.
+    """
+    day, month = _periods(charged_at)
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            REFUND_SQL, {"user_profile_id": user_profile_id, "day": day, "month": month, "now": now}
+        )
+    GenerationUsageEvent.objects.create(
+        user_profile_id=user_profile_id, job=job, amount=-1, created_at=now
+    )
+
+
+def get_quota_usage(user_profile_id: int, now: Optional[datetime] = None) -> QuotaUsage:
+    """Read a user's usage in the current day and month (one primary key lookup)."""
+    day, month = _periods(now or timezone.now())
+    quota = GenerationQuota.objects.filter(user_profile_id=user_profile_id).first()
+    if quota is None:
+        return QuotaUsage(0, settings.GENERATION_QUOTA_DAILY, 0, settings.GENERATION_QUOTA_MONTHLY)
+
+    return QuotaUsage(
+        day_used=quota.day_used if quota.day_start == day else 0,
+        daily_limit=(
+            quota.daily_limit if quota.daily_limit is not None else settings.GENERATION_QUOTA_DAILY
+        ),
+        month_used=quota.month_used if quota.month_start == month else 0,
+        monthly_limit=(
+            quota.monthly_limit
+            if quota.monthly_limit is not None
+            else settings.GENERATION_QUOTA_MONTHLY
+        ),
+    )
+
+
+def quota_resets(now: Optional[datetime] = None) -> tuple[datetime, datetime]:
+    """When the current day's and month's counters restart."""
+    day, month = _periods(now or timezone.now())
+    return _next_day(day), _next_month(month)
+
+
+def rollup_usage_events(batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """
+    Fold ledger events of completed days into per-user, per-day rollups.
+
+    Events are added to the rollups and deleted in the same transaction, one
+    batch at a time, so an interrupted run can simply be started again.
+    Today's events are left alone until the day is over.
+
+    Returns:
+        Number of events rolled up
+    """
+    today = _periods(timezone.now())[0]
+    cutoff = datetime.combine(today, time.min, tzinfo=dt_timezone.utc)
+    rolled_up = 0
+
+    while True:
+        with transaction.atomic():
+            events = list(
+                GenerationUsageEvent.objects.select_for_update(skip_locked=True)
+                .filter(created_at__lt=cutoff)
+                .order_by("id")
+                .values_list("id", "user_profile_id", "created_at", "amount")[:batch_size]
+            )
+            if not events:
+                break
+
+            totals: dict[tuple[int, date], list[int]] = {}
+            for _, user_profile_id, created_at, amount in events:
+                counts = totals.setdefault((user_profile_id, _periods(created_at)[0]), [0, 0])
+                counts[0 if amount > 0 else 1] += abs(amount)
+
+            for (user_profile_id, day), (charged, refunded) in totals.items():
+                updated = GenerationUsageRollup.objects.filter(
+                    user_profile_id=user_profile_id, day=day
+                ).update(charged=F("charged") + charged, refunded=F("refunded") + refunded)
+                if not updated:
+                    GenerationUsageRollup.objects.create(
+                        user_profile_id=user_profile_id,
+                        day=day,
+                        charged=charged,
+                        refunded=refunded,
+                    )
+
+            GenerationUsageEvent.objects.filter(id__in=[event[0] for event in events]).delete()
+            rolled_up += len(events)
+
+    return rolled_up
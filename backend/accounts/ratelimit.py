@@ -0,0 +1,330 @@
+"""
+Token-bucket rate limiting with a shared counter store.
+
+A limit is a bucket of ``capacity`` tokens (the allowed burst) refilled at
+``rate`` tokens per second; each request takes one token and is rejected with
+429 and Retry-After when none is left. Buckets live in a store shared by all
+workers, and one call to the store checks and updates every bucket a request
+is subject to in a single round trip:
+
+- DatabaseRateLimitStore: one INSERT ... ON CONFLICT DO UPDATE statement on an
+  UNLOGGED PostgreSQL table (no WAL, so it's cheap; counters reset after a
+  crash, which is fine for rate limits)
+- RedisRateLimitStore: one Lua script
+- InMemoryRateLimitStore: per-process dict (tests and local development)
+
+The global limit is the exception: every request would take its token from
+the same bucket, so in a shared store all requests would queue on one row
+(or key). Each process instead enforces its share of it in memory
+(Bucket.for_process_share, RATE_LIMIT_PROCESSES), with no round trip.
+
+The global and per-IP limits are enforced by accounts.middleware.RateLimitMiddleware
+before authentication; per-user limits by the @rate_limit decorator, after
+authentication but before any storage work. Store errors fail open.
+"""
+
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from dataclasses import dataclass
+import functools
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .metrics import record_rate_limit_rejection
+
+logger = logging.getLogger(__name__)
+
+BUCKET_TABLE = "rate_limit_buckets"
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """One token bucket: a limit applied to a key (e.g. "ip:203.0.113.7")."""
+
+    name: str
+    key: str
+    capacity: float
+    rate: float
+
+    @classmethod
+    def for_limit(cls, name: str, subject: str) -> "Bucket":
+        """Bucket for a limit configured in settings.RATE_LIMITS."""
+        limit = settings.RATE_LIMITS[name]
+        return cls(name, f"{name}:{subject}", float(limit["capacity"]), float(limit["rate"]))
+
+    @classmethod
+    def for_process_share(cls, name: str, subject: str) -> "Bucket":
+        """
+        This process's share of a limit in settings.RATE_LIMITS.
+
+        The capacity and rate are split evenly between the RATE_LIMIT_PROCESSES
+        processes of a server, so together they allow the configured limit.
+        """
+        bucket = cls.for_limit(name, subject)
+        processes = max(settings.RATE_LIMIT_PROCESSES, 1)
+        # Keep a burst of at least one request, or the bucket could never allow any
+        return cls(
+            bucket.name,
+            bucket.key,
+            max(bucket.capacity / processes, 1.0),
+            bucket.rate / processes,
+        )
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    # Name of the first limit that rejected the request, and when it'll have a token again
+    limit: Optional[str] = None
+    retry_after: float = 0.0
+
+
+def _decide(buckets: list[Bucket], results: list[tuple[bool, float]]) -> Decision:
+    """Combine per-bucket (allowed, remaining tokens) results into one decision."""
+    for bucket, (allowed, tokens) in zip(buckets, results):
+        if not allowed:
+            return Decision(False, bucket.name, max(1.0 - tokens, 0.0) / bucket.rate)
+    return Decision(True)
+
+
+class RateLimitStore(ABC):
+    """Interface of rate limit stores."""
+
+    @abstractmethod
+    def consume(self, buckets: list[Bucket]) -> Decision:
+        """Take one token from every bucket that has one, atomically per bucket."""
+
+    @abstractmethod
+    def prune(self, idle_seconds: float) -> int:
+        """Delete buckets untouched for idle_seconds (they'd be full again). Returns count."""
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Buckets in a process-local dict; limits are per worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def consume(self, buckets: list[Bucket]) -> Decision:
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for bucket in buckets:
+                tokens, updated = self._buckets.get(bucket.key, (bucket.capacity, now))
+                tokens = min(bucket.capacity, tokens + (now - updated) * bucket.rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                self._buckets[bucket.key] = (tokens, now)
+                results.append((allowed, tokens))
+        return _decide(buckets, results)
+
+    def prune(self, idle_seconds: float) -> int:
+        cutoff = time.monotonic() - idle_seconds
+        with self._lock:
+            idle = [key for key, (_, updated) in self._buckets.items() if updated < cutoff]
+            for key in idle:
+                del self._buckets[key]
+        return len(idle)
+
+
+class DatabaseRateLimitStore(RateLimitStore):
+    """
+    Buckets in the rate_limit_buckets UNLOGGED table (PostgreSQL only).
+
+    The refill, the check and the decrement of every bucket happen in one
+    upsert, with the database clock as the time source, so workers on
+    different hosts neither race each other nor disagree about time.
+    """
+
+    # Tokens after refilling from the last update to now (EXCLUDED is the new row)
+    REFILLED = (
+        "LEAST(EXCLUDED.capacity, "
+        "b.tokens + GREATEST(EXCLUDED.updated_at - b.updated_at, 0) * EXCLUDED.rate)"
+    )
+    CONSUME_SQL = f"""
+        INSERT INTO {BUCKET_TABLE} AS b (key, tokens, capacity, rate, updated_at, allowed)
+        SELECT v.key, v.capacity - 1, v.capacity, v.rate,
+               EXTRACT(EPOCH FROM clock_timestamp()), TRUE
+        FROM (VALUES {{values}}) AS v (key, capacity, rate)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = {REFILLED} - CASE WHEN {REFILLED} >= 1 THEN 1 ELSE 0 END,
+            allowed = {REFILLED} >= 1,
+            capacity = EXCLUDED.capacity,
+            rate = EXCLUDED.rate,
+            updated_at = EXCLUDED.updated_at
+        RETURNING key, allowed, tokens
+    """
+    PRUNE_SQL = (
+        f"DELETE FROM {BUCKET_TABLE} "
+        "WHERE updated_at < EXTRACT(EPOCH FROM clock_timestamp()) - %s"
+    )
+
+    def consume(self, buckets: list[Bucket]) -> Decision:
+        # Lock rows in a fixed order so concurrent upserts can't deadlock
+        ordered = sorted(buckets, key=lambda bucket: bucket.key)
+        values = ", ".join(["(%s, %s::double precision, %s::double precision)"] * len(ordered))
+        params = []
+        for bucket in ordered:
+            params.extend([bucket.key, bucket.capacity, bucket.rate])
+
+        with connection.cursor() as cursor:
+            cursor.execute(self.CONSUME_SQL.format(values=values), params)
+            rows = {key: (allowed, tokens) for key, allowed, tokens in cursor.fetchall()}
+        return _decide(buckets, [rows[bucket.key] for bucket in buckets])
+
+    def prune(self, idle_seconds: float) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(self.PRUNE_SQL, [idle_seconds])
+            return cursor.rowcount
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets as Redis hashes, updated by one Lua script per request."""
+
+    # KEYS: bucket keys; ARGV: capacity and rate for each key, in order.
+    # Uses the Redis server clock; buckets expire once they would be full again.
+    CONSUME_SCRIPT = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local results = {}
+        for i, key in ipairs(KEYS) do
+            local capacity = tonumber(ARGV[2 * i - 1])
+            local rate = tonumber(ARGV[2 * i])
+            local state = redis.call('HMGET', key, 'tokens', 'ts')
+            local tokens = tonumber(state[1]) or capacity
+            local ts = tonumber(state[2]) or now
+            tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+            local allowed = 0
+            if tokens >= 1 then
+                tokens = tokens - 1
+                allowed = 1
+            end
+            redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+            redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+            results[i] = {allowed, tostring(tokens)}
+        end
+        return results
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.RATE_LIMIT_REDIS_URL)
+        self._consume = self.client.register_script(self.CONSUME_SCRIPT)
+
+    def consume(self, buckets: list[Bucket]) -> Decision:
+        args = []
+        for bucket in buckets:
+            args.extend([bucket.capacity, bucket.rate])
+        results = self._consume(keys=[f"ratelimit:{bucket.key}" for bucket in buckets], args=args)
+        return _decide(buckets, [(bool(allowed), float(tokens)) for allowed, tokens in results])
+
+    def prune(self, idle_seconds: float) -> int:
+        # Keys expire on their own
+        return 0
+
+
+@functools.cache
+def get_rate_limit_store() -> RateLimitStore:
+    """Return the configured rate limit store (one instance per process)."""
+    return import_string(settings.RATE_LIMIT_STORE)()
+
+
+@functools.cache
+def get_process_rate_limit_store() -> InMemoryRateLimitStore:
+    """Return this process's store for its share of process-split limits."""
+    return InMemoryRateLimitStore()
+
+
+@receiver(setting_changed)
+def _reset_rate_limit_store(setting: str, **kwargs) -> None:
+    if setting == "RATE_LIMIT_STORE":
+        get_rate_limit_store.cache_clear()
+    if setting in ("RATE_LIMITS", "RATE_LIMIT_PROCESSES"):
+        get_process_rate_limit_store.cache_clear()
+
+
+def check_limits(buckets: list[Bucket]) -> Decision:
+    """Consume a token from each bucket; allows the request if the store is unavailable."""
+    try:
+        decision = get_rate_limit_store().consume(buckets)
+    except Exception as e:
+        logger.warning(f"Rate limit store unavailable, allowing request: {e}")
+        return Decision(True)
+
+    if not decision.allowed:
+        record_rate_limit_rejection(decision.limit)
+    return decision
+
+
+def check_process_limits(buckets: list[Bucket]) -> Decision:
+    """Consume a token from each bucket in this process's own memory (see for_process_share)."""
+    decision = get_process_rate_limit_store().consume(buckets)
+    if not decision.allowed:
+        record_rate_limit_rejection(decision.limit)
+    return decision
+
+
+def rejection_body(decision: Decision) -> tuple[dict, str]:
+    retry_after = max(1, math.ceil(decision.retry_after))
+    return (
+        {"error": "Rate limit exceeded. Try again later.", "retryAfter": retry_after},
+        str(retry_after),
+    )
+
+
+def client_ip(request: HttpRequest) -> str:
+    """
+    Client address, taking RATE_LIMIT_TRUSTED_PROXIES hops of X-Forwarded-For into account.
+
+    Only addresses appended by our own proxies are trusted; anything further
+    left in the header is client-controlled.
+    """
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(proxies, len(hops))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def rate_limit(limit: str) -> Callable:
+    """
+    Per-user rate limit for a DRF view (apply below @api_view/@permission_classes).
+
+    Unauthenticated requests are left to the view's permission checks.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(request: Request, *args, **kwargs):
+            if settings.RATE_LIMIT_ENABLED and request.user.is_authenticated:
+                decision = check_limits([Bucket.for_limit(limit, str(request.user.pk))])
+                if not decision.allowed:
+                    body, retry_after = rejection_body(decision)
+                    return Response(
+                        body,
+                        status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={"Retry-After": retry_after},
+                    )
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,267 @@
+"""
+Generated outfit renders: access tracking and eviction under storage budgets.
+
+Renders are cached in the bucket so history pages can show them again, but
+every generation adds one. evict_renders keeps them within
+RENDER_BUDGET_BYTES_PER_USER per user and RENDER_BUDGET_BYTES_TOTAL overall
+by deleting the least recently (lru) or least frequently (lfu) accessed
+renders first. Favorites are never evicted. An evicted render only loses its
+image; the outfit stays in history and can be generated again.
+
+Accesses are tracked without a write per view: each worker process collects
+the renders it served in a RenderAccessTracker and marks them accessed with
+one UPDATE at most every RENDER_ACCESS_FLUSH_SECONDS. Renders already marked
+within RENDER_ACCESS_DEBOUNCE_SECONDS are skipped, so access_count counts
+debounce windows with an access, which is the frequency LFU needs.
+"""
+
+import atexit
+from collections.abc import Iterable, Iterator
+from datetime import timedelta
+import functools
+import logging
+import threading
+import time
+from typing import Optional
+import uuid
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F, Sum
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Outfit
+from .purge import schedule_object_cleanup
+from .storage import DELETE_WORKERS, delete_files
+
+logger = logging.getLogger(__name__)
+
+TRACKER_SETTINGS = {"RENDER_ACCESS_FLUSH_SECONDS", "RENDER_ACCESS_DEBOUNCE_SECONDS"}
+
+# Eviction order per policy; created_at breaks ties between renders never served
+EVICTION_ORDER = {
+    "lru": ("last_accessed_at", "created_at"),
+    "lfu": ("access_count", "last_accessed_at", "created_at"),
+}
+
+# Renders evicted per transaction (and per batch of parallel deletes)
+EVICTION_BATCH_SIZE = 500
+
+
+class RenderAccessTracker:
+    """Per-process buffer of render accesses, flushed to the database in batches."""
+
+    def __init__(self, flush_seconds: float, debounce_seconds: float):
+        self.flush_seconds = flush_seconds
+        self.debounce = timedelta(seconds=debounce_seconds)
+        self._pending: set[uuid.UUID] = set()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, outfits: Iterable[Outfit]) -> None:
+        """Note that the renders of these outfits were served."""
+        recent = timezone.now() - self.debounce
+        accessed = {
+            outfit.id
+            for outfit in outfits
+            if outfit.image_path
+            and (outfit.last_accessed_at is None or outfit.last_accessed_at < recent)
+        }
+
+        with self._lock:
+            self._pending |= accessed
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write the buffered accesses with one UPDATE.
+
+        Returns:
+            Number of outfits marked as accessed
+        """
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            return Outfit.objects.filter(id__in=pending).update(
+                last_accessed_at=timezone.now(), access_count=F("access_count") + 1
+            )
+        except Exception as e:
+            # Access times only order evictions; losing a batch is harmless
+            logger.warning(f"Could not record {len(pending)} render accesses: {e}")
+            return 0
+
+
+@functools.cache
+def get_render_access_tracker() -> RenderAccessTracker:
+    """Return this process's render access tracker, configured from settings."""
+    tracker = RenderAccessTracker(
+        flush_seconds=settings.RENDER_ACCESS_FLUSH_SECONDS,
+        debounce_seconds=settings.RENDER_ACCESS_DEBOUNCE_SECONDS,
+    )
+    atexit.register(tracker.flush)
+    return tracker
+
+
+@receiver(setting_changed)
+def _reset_render_access_tracker(setting: str, **kwargs) -> None:
+    if setting in TRACKER_SETTINGS:
+        get_render_access_tracker.cache_clear()
+
+
+def attach_render(outfit: Outfit, image_path: str, size: int) -> bool:
+    """
+    Store a generated render on an outfit.
+
+    A render the outfit already had is deleted after the usual grace period.
+
+    Args:
+        outfit: Outfit the render was generated for
+        image_path: Storage path of the render (from generate_render_path)
+        size: Size of the render in bytes
+
+    Returns:
+        True if stored, False if the outfit no longer exists
+    """
+    previous_path = outfit.image_path
+    now = timezone.now()
+    updated = Outfit.objects.filter(id=outfit.id).update(
+        image_path=image_path,
+        image_size=size,
+        last_accessed_at=now,
+        access_count=0,
+        updated_at=now,
+    )
+    if not updated:
+        return False
+
+    outfit.image_path = image_path
+    outfit.image_size = size
+    outfit.last_accessed_at = now
+    outfit.access_count = 0
+    if previous_path and previous_path != image_path:
+        schedule_object_cleanup(outfit.user_profile.firebase_uid, previous_path)
+    return True
+
+
+def _candidates(
+    policy: str, user_profile_id: Optional[int] = None
+) -> Iterator[tuple[uuid.UUID, int]]:
+    """Stream (id, size) of evictable renders in eviction order."""
+    renders = Outfit.objects.filter(image_path__isnull=False, is_favorite=False)
+    if user_profile_id is not None:
+        renders = renders.filter(user_profile_id=user_profile_id)
+    return (
+        renders.order_by(*EVICTION_ORDER[policy])
+        .values_list("id", "image_size")
+        .iterator(chunk_size=EVICTION_BATCH_SIZE)
+    )
+
+
+def _select(
+    candidates: Iterator[tuple[uuid.UUID, int]], excess: int, skip: set[uuid.UUID]
+) -> list[uuid.UUID]:
+    """Take candidates in order (except those in skip) until their sizes add up to excess."""
+    selected, freed = [], 0
+    for outfit_id, size in candidates:
+        if freed >= excess:
+            break
+        if outfit_id in skip:
+            continue
+        selected.append(outfit_id)
+        freed += size or 0
+    return selected
+
+
+def _evict(outfit_ids: list[uuid.UUID], max_workers: int, stats: dict) -> None:
+    """Clear the renders of these outfits, then delete their objects in parallel."""
+    for start in range(0, len(outfit_ids), EVICTION_BATCH_SIZE):
+        batch = outfit_ids[start : start + EVICTION_BATCH_SIZE]
+
+        # Re-check under row locks: an outfit favorited since it was selected
+        # keeps its render
+        with transaction.atomic():
+            rows = list(
+                Outfit.objects.select_for_update(skip_locked=True)
+                .filter(id__in=batch, image_path__isnull=False, is_favorite=False)
+                .values_list("id", "image_path", "image_size")
+            )
+            Outfit.objects.filter(id__in=[row[0] for row in rows]).update(
+                image_path=None, image_size=None, updated_at=timezone.now()
+            )
+
+        # Rows are cleared first, so a failed delete leaves an orphaned object for
+        # gc_orphaned_uploads --scan-bucket rather than a row pointing at nothing
+        stats["deleted"] += delete_files([row[1] for row in rows], max_workers=max_workers)
+        stats["evicted"] += len(rows)
+        stats["evicted_bytes"] += sum(row[2] or 0 for row in rows)
+
+
+def evict_renders(
+    user_budget: Optional[int] = None,
+    total_budget: Optional[int] = None,
+    policy: Optional[str] = None,
+    max_workers: int = DELETE_WORKERS,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Evict renders until every user and the bucket as a whole are within budget.
+
+    Users over their own budget are trimmed first, then renders are evicted
+    across all users until the total fits.
+
+    Args:
+        user_budget: Bytes of renders kept per user (default RENDER_BUDGET_BYTES_PER_USER)
+        total_budget: Bytes of renders kept overall (default RENDER_BUDGET_BYTES_TOTAL)
+        policy: "lru" or "lfu" (default RENDER_EVICTION_POLICY)
+        max_workers: Concurrent delete requests
+        dry_run: Only count what would be evicted
+
+    Returns:
+        Counts of users over budget, evicted renders, their bytes and deleted objects
+    """
+    user_budget = settings.RENDER_BUDGET_BYTES_PER_USER if user_budget is None else user_budget
+    total_budget = settings.RENDER_BUDGET_BYTES_TOTAL if total_budget is None else total_budget
+    policy = policy or settings.RENDER_EVICTION_POLICY
+    if policy not in EVICTION_ORDER:
+        raise ValueError(f"Unknown eviction policy: {policy!r}")
+
+    stats = {"users_over_budget": 0, "evicted": 0, "evicted_bytes": 0, "deleted": 0}
+    stored = Outfit.objects.filter(image_path__isnull=False)
+    # With dry_run nothing is cleared, so the total pass must skip what the per-user pass took
+    selected = set()
+
+    def evict(outfit_ids):
+        selected.update(outfit_ids)
+        if dry_run:
+            stats["evicted"] += len(outfit_ids)
+            stats["evicted_bytes"] += (
+                stored.filter(id__in=outfit_ids).aggregate(total=Sum("image_size"))["total"] or 0
+            )
+        else:
+            _evict(outfit_ids, max_workers, stats)
+
+    usage = (
+        stored.values("user_profile_id")
+        .annotate(total=Sum("image_size"))
+        .filter(total__gt=user_budget)
+        .values_list("user_profile_id", "total")
+    )
+    for user_profile_id, total in usage:
+        stats["users_over_budget"] += 1
+        evict(_select(_candidates(policy, user_profile_id), total - user_budget, selected))
+
+    total = stored.aggregate(total=Sum("image_size"))["total"] or 0
+    if dry_run:
+        total -= stats["evicted_bytes"]
+    if total > total_budget:
+        evict(_select(_candidates(policy), total - total_budget, selected))
+
+    return stats
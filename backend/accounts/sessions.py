@@ -0,0 +1,221 @@
+"""
+App session tokens exchanged for a verified Firebase ID token.
+
+Verifying a Firebase ID token is the most expensive step of most requests.
+Clients can exchange one for a session token once (POST /api/auth/session/)
+and send that instead until it expires. A session token is compact and
+HMAC-signed:
+
+    st1.<base64url payload>.<base64url signature>
+
+The payload holds the user and profile ids, the Firebase UID, the user's
+session epoch and the expiry. Checking it is one HMAC and, while the epoch
+is cached, no database query (SessionTokenAuthentication).
+
+Bumping UserProfile.session_epoch (revoke_sessions) revokes every token
+issued before. Workers keep the epochs they have seen for
+SESSION_EPOCH_CHECK_INTERVAL seconds, so a revocation takes effect
+everywhere within that interval.
+"""
+
+import base64
+from collections import OrderedDict
+import functools
+import hashlib
+import hmac
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import F
+from django.dispatch import receiver
+
+from .metrics import record_cache_lookup
+from .models import UserProfile
+
+TOKEN_PREFIX = "st1"
+
+KEY_SETTINGS = {"SECRET_KEY", "SESSION_TOKEN_SECRET"}
+KEY_SALT = "accounts.sessions.SessionToken"
+
+# Profiles whose epoch is remembered per process
+EPOCH_CACHE_SIZE = 10_000
+
+
+class InvalidSessionTokenError(Exception):
+    """The session token is malformed or its signature doesn't match."""
+
+
+class ExpiredSessionTokenError(Exception):
+    """The session token has expired."""
+
+
+class RevokedSessionTokenError(Exception):
+    """The user's sessions were revoked after the token was issued."""
+
+
+class SessionClaims(NamedTuple):
+    """What a session token asserts."""
+
+    user_id: int
+    user_profile_id: int
+    firebase_uid: str
+    epoch: int
+    expires_at: int
+
+
+@functools.cache
+def _signing_key() -> bytes:
+    """Key for session token signatures, derived once from SESSION_TOKEN_SECRET."""
+    secret = settings.SESSION_TOKEN_SECRET or settings.SECRET_KEY
+    return hashlib.sha256((KEY_SALT + secret).encode()).digest()
+
+
+@receiver(setting_changed)
+def _reset_signing_key(setting: str, **kwargs) -> None:
+    if setting in KEY_SETTINGS:
+        _signing_key.cache_clear()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_signing_key(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_session_token(profile: UserProfile, now: Optional[float] = None) -> tuple[str, int]:
+    """
+    Issue a session token for a user.
+
+    Args:
+        profile: Profile of the user, with its current session epoch
+        now: Issue time as a Unix timestamp (default now)
+
+    Returns:
+        The token and its expiry as a Unix timestamp
+    """
+    expires_at = int(now if now is not None else time.time()) + settings.SESSION_TOKEN_TTL
+    # The UID goes last, so it may contain the separator
+    claims = f"{profile.user_id}:{profile.id}:{profile.session_epoch}:{expires_at}:"
+    payload = _b64encode((claims + profile.firebase_uid).encode())
+    return f"{TOKEN_PREFIX}.{payload}.{_sign(payload)}", expires_at
+
+
+def is_session_token(token: str) -> bool:
+    """Whether a bearer token is a session token (rather than a Firebase ID token)."""
+    return token.startswith(TOKEN_PREFIX + ".")
+
+
+def verify_session_token(token: str, now: Optional[float] = None) -> SessionClaims:
+    """
+    Check a session token's signature and expiry (not its epoch).
+
+    Raises:
+        InvalidSessionTokenError: If the token is malformed or forged
+        ExpiredSessionTokenError: If the token has expired
+    """
+    try:
+        prefix, payload, signature = token.split(".")
+    except ValueError:
+        raise InvalidSessionTokenError("Malformed session token")
+    if prefix != TOKEN_PREFIX or not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidSessionTokenError("Invalid session token signature")
+
+    try:
+        user_id, profile_id, epoch, expires_at, firebase_uid = (
+            _b64decode(payload).decode().split(":", 4)
+        )
+        claims = SessionClaims(
+            int(user_id), int(profile_id), firebase_uid, int(epoch), int(expires_at)
+        )
+    except ValueError:
+        raise InvalidSessionTokenError("Malformed session token")
+
+    if claims.expires_at <= (now if now is not None else time.time()):
+        raise ExpiredSessionTokenError("Session token has expired")
+    return claims
+
+
+class EpochCache:
+    """
+    Session epochs of recently seen profiles, each trusted for a fixed interval.
+
+    A profile that no longer exists is remembered as epoch None, so tokens of
+    deleted accounts are rejected without a query too.
+    """
+
+    def __init__(self, max_age: float, max_size: int = EPOCH_CACHE_SIZE):
+        self.max_age = max_age
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[Optional[int], float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_profile_id: int) -> Optional[int]:
+        """Current session epoch of a profile (None if it was deleted)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_profile_id)
+            if entry is not None and now - entry[1] < self.max_age:
+                self._entries.move_to_end(user_profile_id)
+                record_cache_lookup("session_epoch", True)
+                return entry[0]
+
+        record_cache_lookup("session_epoch", False)
+        epoch = (
+            UserProfile.objects.filter(id=user_profile_id)
+            .values_list("session_epoch", flat=True)
+            .first()
+        )
+        with self._lock:
+            self._entries[user_profile_id] = (epoch, now)
+            self._entries.move_to_end(user_profile_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return epoch
+
+    def forget(self, user_profile_id: int) -> None:
+        """Drop a profile's epoch, so this process reads it again on next use."""
+        with self._lock:
+            self._entries.pop(user_profile_id, None)
+
+
+@functools.cache
+def get_epoch_cache() -> EpochCache:
+    """Return this process's epoch cache, configured from settings."""
+    return EpochCache(settings.SESSION_EPOCH_CHECK_INTERVAL)
+
+
+@receiver(setting_changed)
+def _reset_epoch_cache(setting: str, **kwargs) -> None:
+    if setting == "SESSION_EPOCH_CHECK_INTERVAL":
+        get_epoch_cache.cache_clear()
+
+
+def check_session_epoch(claims: SessionClaims) -> None:
+    """
+    Check that a token was issued in the user's current session epoch.
+
+    Raises:
+        RevokedSessionTokenError: If the token's epoch is no longer current
+    """
+    if get_epoch_cache().get(claims.user_profile_id) != claims.epoch:
+        raise RevokedSessionTokenError("Session has been revoked")
+
+
+def revoke_sessions(profile: UserProfile) -> None:
+    """
+    Revoke every session token issued to a user so far.
+
+    Other workers notice within SESSION_EPOCH_CHECK_INTERVAL seconds.
+    """
+    UserProfile.objects.filter(id=profile.id).update(session_epoch=F("session_epoch") + 1)
+    profile.refresh_from_db(fields=["session_epoch"])
+    get_epoch_cache().forget(profile.id)
@@ -0,0 +1,21 @@
+"""Model signal handlers for the accounts app."""
+
+import logging
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import UserProfile
+from .purge import schedule_account_purge
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_delete, sender=UserProfile)
+def purge_storage_on_profile_delete(sender, instance: UserProfile, **kwargs) -> None:
+    """Queue removal of the user's storage objects once their profile is deleted."""
+    try:
+        schedule_account_purge(instance.firebase_uid)
+    except ValueError as e:
+        # Never widen the purge prefix for a malformed UID - log and leave the objects
+        logger.error(f"Not purging storage for profile {instance.pk}: {e}")
@@ -1,11 +1,16 @@
 """Firebase Storage utilities for handling file uploads."""
 
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 import re
+import time
 from typing import Optional
 import uuid
 
-from firebase_admin import storage
+from .instrumentation import instrument_storage_call
+from .storage_backends import StorageBackend, StoredFile, get_storage_backend
+from .tracing import traced
 
 # Allowed image file extensions
 ALLOWED_IMAGE_EXTENSIONS = {
@@ -21,10 +26,51 @@ ALLOWED_IMAGE_EXTENSIONS = {
 MAX_FILE_SIZE_MB = 10
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
+# Signed upload URLs are valid for this long
+UPLOAD_URL_EXPIRATION = timedelta(minutes=15)
 
-def get_storage_bucket():
-    """Get Firebase Storage bucket instance."""
-    return storage.bucket()
+# Signed download URLs are valid for this long
+DOWNLOAD_URL_EXPIRATION = timedelta(days=7)
+
+# Download URLs for immutable objects are signed once per rotation period: every
+# request in the same period gets the identical URL (so browsers and CDNs can cache
+# the image under it), and a URL is always valid for at least
+# DOWNLOAD_URL_EXPIRATION - DOWNLOAD_URL_ROTATION after it is issued
+DOWNLOAD_URL_ROTATION = timedelta(days=1)
+
+# Pose of mannequin images whose path has none (uploaded before poses existed)
+DEFAULT_MANNEQUIN_POSE = "front"
+
+# users/{firebase_uid}/mannequin/{pose}/{version}.{ext}, or without the pose segment
+MANNEQUIN_PATH_PATTERN = re.compile(
+    r"^users/(?P<firebase_uid>[a-zA-Z0-9_-]+)/mannequin/(?:(?P<pose>[a-z_]+)/)?"
+    r"(?P<version>[0-9a-f-]{32,36})\.(?P<extension>[a-z]+)$"
+)
+
+# Pose names are path segments
+POSE_PATTERN = re.compile(r"^[a-z_]+$")
+
+# Objects that are never overwritten: wardrobe images are named by their item's
+# UUID, mannequin images by their version and renders by a UUID of their own (the
+# pre-versioning path users/{uid}/mannequin was overwritten on every upload and
+# doesn't match)
+IMMUTABLE_PATH_PATTERN = re.compile(r"^users/[^/]+/(wardrobe|mannequin|renders)/")
+
+# Cache-Control stored with immutable objects and sent when they are downloaded
+IMMUTABLE_CACHE_CONTROL = (
+    f"private, max-age={int(DOWNLOAD_URL_EXPIRATION.total_seconds())}, immutable"
+)
+
+# Listing page size used for prefix scans (GCS caps a single page at 1000 objects)
+LIST_PAGE_SIZE = 1000
+
+# Number of concurrent delete requests used by bulk deletions
+DELETE_WORKERS = 16
+
+
+def get_backend() -> StorageBackend:
+    """Get the configured storage backend (see the STORAGE_BACKEND setting)."""
+    return get_storage_backend()
 
 
 def validate_firebase_uid(firebase_uid: str) -> bool:
@@ -51,20 +97,46 @@ def validate_firebase_uid(firebase_uid: str) -> bool:
     return bool(re.match(pattern, firebase_uid)) and len(firebase_uid) > 0
 
 
-def generate_mannequin_path(firebase_uid: str) -> str:
+def generate_user_prefix(firebase_uid: str) -> str:
     """
-    Generate storage path for mannequin image.
-    Always uses the same path - new uploads overwrite the old one.
+    Generate the storage prefix that holds every object owned by a user.
 
     Args:
         firebase_uid: User's Firebase UID
 
     Returns:
-        Storage path like 'users/{firebase_uid}/mannequin'
+        Storage prefix like 'users/{firebase_uid}/'
 
     Raises:
         ValueError: If firebase_uid contains invalid characters (potential path traversal)
     """
+    # SECURITY: An empty or malformed UID would widen the prefix to other users' objects
+    if not validate_firebase_uid(firebase_uid):
+        raise ValueError(f"Invalid firebase_uid format: {firebase_uid!r}")
+
+    return f"users/{firebase_uid}/"
+
+
+def generate_mannequin_path(firebase_uid: str, pose: str, version: str, extension: str) -> str:
+    """
+    Generate storage path for one version of a mannequin pose image.
+
+    Every upload gets a new version, so an object is never overwritten and
+    anything keyed on the path (browser and CDN caches, generations reading
+    the image) never sees it change.
+
+    Args:
+        firebase_uid: User's Firebase UID
+        pose: Pose name (front, side, etc.)
+        version: UUID string identifying this upload
+        extension: File extension (jpg, png, etc.)
+
+    Returns:
+        Storage path like 'users/{firebase_uid}/mannequin/{pose}/{version}.{ext}'
+
+    Raises:
+        ValueError: If any parameter contains invalid characters (potential path traversal)
+    """
     # SECURITY: Validate firebase_uid to prevent path traversal attacks
     if not validate_firebase_uid(firebase_uid):
         raise ValueError(
@@ -72,7 +144,71 @@ def generate_mannequin_path(firebase_uid: str) -> str:
             f"path traversal characters. Received: {firebase_uid!r}"
         )
 
-    return f"users/{firebase_uid}/mannequin"
+    if not POSE_PATTERN.match(pose):
+        raise ValueError(f"Invalid pose: {pose!r}")
+
+    try:
+        uuid.UUID(version)
+    except ValueError:
+        raise ValueError(f"Invalid UUID format: {version!r}")
+
+    if extension not in ALLOWED_IMAGE_EXTENSIONS:
+        raise ValueError(f"Invalid extension: {extension!r}")
+
+    return f"users/{firebase_uid}/mannequin/{pose}/{version}.{extension}"
+
+
+def parse_mannequin_path(file_path: str) -> Optional[tuple[str, str, uuid.UUID]]:
+    """
+    Split a versioned mannequin path into its owner, pose and version.
+
+    Args:
+        file_path: Storage path, e.g. from a confirm request or upload notification
+
+    Returns:
+        Tuple of (firebase_uid, pose, version), or None if it isn't a versioned
+        mannequin path. Paths without a pose segment belong to the default pose.
+    """
+    match = MANNEQUIN_PATH_PATTERN.match(file_path)
+    if not match or match.group("extension") not in ALLOWED_IMAGE_EXTENSIONS:
+        return None
+    try:
+        version = uuid.UUID(match.group("version"))
+    except ValueError:
+        return None
+    return match.group("firebase_uid"), match.group("pose") or DEFAULT_MANNEQUIN_POSE, version
+
+
+def generate_thumbnail_path(image_path: str) -> str:
+    """
+    Storage path of the thumbnail precomputed from an image.
+
+    The thumbnail sits next to its image and is named after it, so it is as
+    immutable as the image and is deleted with it.
+
+    Args:
+        image_path: Storage path of the original image
+
+    Returns:
+        Storage path like '{image path without extension}.thumb.jpg'
+    """
+    return f"{image_path.rsplit('.', 1)[0]}.thumb.jpg"
+
+
+def generate_prepared_input_path(image_path: str) -> str:
+    """
+    Storage path of the generation input prepared from an image.
+
+    Like a thumbnail, the input sits next to its image and is named after it,
+    so there is one input per image version.
+
+    Args:
+        image_path: Storage path of the original image
+
+    Returns:
+        Storage path like '{image path without extension}.input.jpg'
+    """
+    return f"{image_path.rsplit('.', 1)[0]}.input.jpg"
 
 
 def generate_wardrobe_item_path(
@@ -117,6 +253,31 @@ def generate_wardrobe_item_path(
     return f"users/{firebase_uid}/wardrobe/{category_plural}/{item_id}.{extension}"
 
 
+def generate_render_path(firebase_uid: str, render_id: str) -> str:
+    """
+    Generate storage path for a generated outfit render.
+
+    Args:
+        firebase_uid: User's Firebase UID
+        render_id: UUID string identifying this render
+
+    Returns:
+        Storage path like 'users/{firebase_uid}/renders/{render_id}.jpg'
+
+    Raises:
+        ValueError: If any parameter contains invalid characters (potential path traversal)
+    """
+    if not validate_firebase_uid(firebase_uid):
+        raise ValueError(f"Invalid firebase_uid format: {firebase_uid!r}")
+
+    try:
+        uuid.UUID(render_id)
+    except ValueError:
+        raise ValueError(f"Invalid UUID format: {render_id!r}")
+
+    return f"users/{firebase_uid}/renders/{render_id}.jpg"
+
+
 def validate_file_extension(filename: str) -> tuple[bool, Optional[str]]:
     """
     Validate file extension.
@@ -137,10 +298,44 @@ def validate_file_extension(filename: str) -> tuple[bool, Optional[str]]:
     return True, extension
 
 
+def is_immutable_path(file_path: str) -> bool:
+    """Whether the object at file_path is never overwritten (so its URL can be cached)."""
+    return bool(IMMUTABLE_PATH_PATTERN.match(file_path))
+
+
+def download_url_expiry(file_path: str, now: Optional[float] = None) -> int:
+    """
+    Unix time at which a download URL signed now for file_path should expire.
+
+    Immutable objects get an expiry aligned to the rotation period, so signing
+    is deterministic within the period; anything else expires
+    DOWNLOAD_URL_EXPIRATION from now.
+    """
+    now = time.time() if now is None else now
+    expiration = int(DOWNLOAD_URL_EXPIRATION.total_seconds())
+    if not is_immutable_path(file_path):
+        return int(now) + expiration
+    rotation = int(DOWNLOAD_URL_ROTATION.total_seconds())
+    return int(now) // rotation * rotation + expiration
+
+
+def upload_headers(file_path: str, content_type: str) -> dict[str, str]:
+    """Headers the client must send with the signed upload request for file_path."""
+    headers = {"Content-Type": content_type}
+    if is_immutable_path(file_path):
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        # Precondition: only create the object, so a reused upload URL can't replace it
+        headers["x-goog-if-generation-match"] = "0"
+    return headers
+
+
+@instrument_storage_call("sign_upload")
 def get_signed_upload_url(file_path: str, content_type: str) -> str:
     """
     Generate a signed URL for direct client upload to Firebase Storage.
 
+    The client must send the headers from upload_headers() with the upload.
+
     Args:
         file_path: Storage path for the file
         content_type: MIME type (e.g., 'image/jpeg')
@@ -148,23 +343,15 @@ def get_signed_upload_url(file_path: str, content_type: str) -> str:
     Returns:
         Signed URL that client can PUT to
     """
-    bucket = get_storage_bucket()
-    blob = bucket.blob(file_path)
-
-    # Set content type as metadata
-    blob.content_type = content_type
-
     # Generate signed URL valid for 15 minutes
-    url = blob.generate_signed_url(
-        version="v4",
-        expiration=timedelta(minutes=15),
-        method="PUT",
-        content_type=content_type,
+    headers = upload_headers(file_path, content_type)
+    del headers["Content-Type"]
+    return get_backend().sign_upload_url(
+        file_path, content_type, int(UPLOAD_URL_EXPIRATION.total_seconds()), headers
     )
 
-    return url
-
 
+@traced("storage.get_download_url")
 def get_download_url(file_path: str) -> Optional[str]:
     """
     Get public download URL for a file.
@@ -175,22 +362,50 @@ def get_download_url(file_path: str) -> Optional[str]:
     Returns:
         Public download URL or None if file doesn't exist
     """
-    bucket = get_storage_bucket()
-    blob = bucket.blob(file_path)
-
-    if not blob.exists():
+    if not file_exists(file_path):
         return None
 
-    # Generate signed URL valid for 7 days
-    url = blob.generate_signed_url(
-        version="v4",
-        expiration=timedelta(days=7),
-        method="GET",
-    )
+    return sign_download_url(file_path)
+
+
+@instrument_storage_call("sign_download")
+def sign_download_url(file_path: str) -> str:
+    """
+    Sign a download URL without checking that the file exists.
 
-    return url
+    Signing happens locally with the service account key, so this makes no
+    storage API call. Use it when the object is known to exist (e.g. from a
+    finalize notification, a database row or a preceding existence check).
 
+    URLs for immutable objects are stable for DOWNLOAD_URL_ROTATION (see
+    download_url_expiry).
 
+    Args:
+        file_path: Storage path for the file
+
+    Returns:
+        Signed download URL valid for at least 6 days
+    """
+    return get_backend().sign_download_url(file_path, download_url_expiry(file_path))
+
+
+@instrument_storage_call("save", guarded=True)
+def save_file(file_path: str, data: bytes, content_type: str) -> StoredFile:
+    """
+    Write a file generated on the server (e.g. a thumbnail).
+
+    Args:
+        file_path: Storage path for the file
+        data: File contents
+        content_type: MIME type (e.g., 'image/jpeg')
+
+    Returns:
+        StoredFile metadata of the written file
+    """
+    return get_backend().save(file_path, data, content_type)
+
+
+@instrument_storage_call("delete", guarded=True)
 def delete_file(file_path: str) -> bool:
     """
     Delete a file from Firebase Storage.
@@ -201,16 +416,10 @@ def delete_file(file_path: str) -> bool:
     Returns:
         True if deleted, False if file didn't exist
     """
-    bucket = get_storage_bucket()
-    blob = bucket.blob(file_path)
-
-    if not blob.exists():
-        return False
-
-    blob.delete()
-    return True
+    return get_backend().delete(file_path)
 
 
+@instrument_storage_call("exists", guarded=True)
 def file_exists(file_path: str) -> bool:
     """
     Check if a file exists in Firebase Storage.
@@ -221,6 +430,102 @@ def file_exists(file_path: str) -> bool:
     Returns:
         True if file exists, False otherwise
     """
-    bucket = get_storage_bucket()
-    blob = bucket.blob(file_path)
-    return blob.exists()
+    return get_backend().exists(file_path)
+
+
+@instrument_storage_call("stat", guarded=True)
+def stat_file(file_path: str) -> Optional[StoredFile]:
+    """
+    Get a file's size, update time and content type.
+
+    Args:
+        file_path: Storage path for the file
+
+    Returns:
+        StoredFile metadata, or None if the file doesn't exist
+    """
+    return get_backend().stat(file_path)
+
+
+@instrument_storage_call("read", guarded=True)
+def read_file_range(file_path: str, start: int = 0, end: Optional[int] = None) -> bytes:
+    """
+    Read part of a file.
+
+    Args:
+        file_path: Storage path for the file
+        start: First byte offset to read
+        end: Offset to stop before, or None to read to the end of the file
+
+    Returns:
+        The requested bytes
+    """
+    return get_backend().read_range(file_path, start, end)
+
+
+@instrument_storage_call("list", guarded=True)
+def list_files(
+    prefix: str, page_token: Optional[str] = None, page_size: int = LIST_PAGE_SIZE
+) -> tuple[list[str], Optional[str]]:
+    """
+    List one page of object names under a prefix.
+
+    Args:
+        prefix: Storage prefix to list (e.g. 'users/abc123/')
+        page_token: Token returned by a previous call, or None for the first page
+        page_size: Maximum number of names to return
+
+    Returns:
+        Tuple of (object names, next page token or None when listing is complete)
+    """
+    files, next_page_token = get_backend().list(prefix, page_token, page_size)
+    return [stored.path for stored in files], next_page_token
+
+
+def iter_files(
+    prefix: str, match_glob: Optional[str] = None, page_size: int = LIST_PAGE_SIZE
+) -> Iterator[StoredFile]:
+    """
+    Stream every object under a prefix, fetching one page at a time.
+
+    Args:
+        prefix: Storage prefix to list (e.g. 'users/')
+        match_glob: Optional server-side glob filter (e.g. 'users/*/wardrobe/**')
+        page_size: Number of objects fetched per listing request
+
+    Yields:
+        StoredFile entries in lexicographic path order
+    """
+    backend = get_backend()
+    page_token = None
+
+    while True:
+        files, page_token = backend.list(prefix, page_token, page_size, match_glob)
+        yield from files
+        if page_token is None:
+            break
+
+
+@instrument_storage_call("delete_many")
+def delete_files(file_paths: list[str], max_workers: int = DELETE_WORKERS) -> int:
+    """
+    Delete many files from Firebase Storage concurrently.
+
+    Objects that no longer exist are skipped, so retrying a partially
+    completed batch is safe. Keep max_workers within the storage client's
+    connection pool size.
+
+    Args:
+        file_paths: Storage paths to delete
+        max_workers: Maximum number of concurrent delete requests
+
+    Returns:
+        Number of files actually deleted
+    """
+    if not file_paths:
+        return 0
+
+    backend = get_backend()
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+        return sum(executor.map(backend.delete, file_paths))
@@ -0,0 +1,540 @@
+"""
+Storage backends used by accounts.storage.
+
+The backend is selected with the STORAGE_BACKEND setting (a dotted path) and
+constructed with STORAGE_BACKEND_OPTIONS:
+
+- FirebaseStorageBackend: Firebase / Google Cloud Storage (production)
+- LocalFileSystemStorageBackend: files under MEDIA_ROOT, served by a Django
+  view that checks HMAC-signed URLs (local development, and load tests that
+  need objects shared between server processes)
+- InMemoryStorageBackend: a dict with injectable latency (tests and load tests)
+"""
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from fnmatch import fnmatchcase
+from functools import cache
+from itertools import islice
+import mimetypes
+import os
+from pathlib import Path
+import random
+import tempfile
+import threading
+import time
+from typing import NamedTuple, Optional, Union
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+from .storage_client import storage_client
+
+# Files being written by save(), renamed into place when complete
+UPLOAD_TEMP_PREFIX = ".upload-"
+
+
+class StoredFile(NamedTuple):
+    """Metadata for an object in storage."""
+
+    path: str
+    size: int
+    updated: Optional[datetime]
+    content_type: Optional[str] = None
+
+
+class StorageBackend(ABC):
+    """
+    Interface every storage backend implements.
+
+    Paths are object names relative to the bucket root, e.g.
+    'users/{uid}/wardrobe/tops/{uuid}.jpg'. Upload URLs expire expires_in
+    seconds from now; download URLs at the Unix time expires_at.
+    """
+
+    @abstractmethod
+    def sign_upload_url(
+        self, path: str, content_type: str, expires_in: int, headers: Optional[dict] = None
+    ) -> str:
+        """
+        Return a URL the client can PUT the object to.
+
+        headers are extra request headers covered by the signature, which the
+        client must send with the upload (e.g. Cache-Control, stored with the
+        object, and x-goog-if-generation-match: 0, which only allows creating it).
+        """
+
+    @abstractmethod
+    def sign_download_url(self, path: str, expires_at: int) -> str:
+        """
+        Return a URL the client can GET the object from (no existence check).
+
+        Signing the same path with the same expires_at must give the same URL,
+        so that the URL can serve as a cache key.
+        """
+
+    @abstractmethod
+    def stat(self, path: str) -> Optional[StoredFile]:
+        """Return object metadata, or None if it doesn't exist."""
+
+    def exists(self, path: str) -> bool:
+        """Return whether the object exists."""
+        return self.stat(path) is not None
+
+    def probe(self, path: str, timeout: float) -> bool:
+        """
+        Check that storage answers, giving up after timeout seconds (health checks).
+
+        Unlike exists(), a failure is not retried.
+        """
+        return self.exists(path)
+
+    @abstractmethod
+    def delete(self, path: str) -> bool:
+        """Delete the object; returns False if it didn't exist."""
+
+    @abstractmethod
+    def list(
+        self,
+        prefix: str,
+        page_token: Optional[str] = None,
+        page_size: int = 1000,
+        match_glob: Optional[str] = None,
+    ) -> tuple[list[StoredFile], Optional[str]]:
+        """Return one page of objects under prefix and the next page token (None at the end)."""
+
+    @abstractmethod
+    def read_range(self, path: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Read bytes [start, end) of the object (to the end of the object if end is None)."""
+
+    @abstractmethod
+    def save(self, path: str, data: bytes, content_type: str) -> StoredFile:
+        """Write an object from the server side."""
+
+
+class FirebaseStorageBackend(StorageBackend):
+    """Firebase Storage (Google Cloud Storage) through the shared pooled client."""
+
+    def _blob(self, path: str):
+        return storage_client.get_bucket().blob(path)
+
+    def sign_upload_url(
+        self, path: str, content_type: str, expires_in: int, headers: Optional[dict] = None
+    ) -> str:
+        blob = self._blob(path)
+        blob.content_type = content_type
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=expires_in,
+            method="PUT",
+            content_type=content_type,
+            headers=headers or None,
+        )
+
+    def sign_download_url(self, path: str, expires_at: int) -> str:
+        # V4 signatures cover the signing time, so every call would give a new URL.
+        # A V2 signature covers only the absolute expiry and is deterministic.
+        return self._blob(path).generate_signed_url(
+            version="v2",
+            expiration=datetime.fromtimestamp(expires_at, tz=dt_timezone.utc),
+            method="GET",
+        )
+
+    def stat(self, path: str) -> Optional[StoredFile]:
+        with storage_client.track():
+            blob = storage_client.get_bucket().get_blob(path, **storage_client.call_options())
+        if blob is None:
+            return None
+        return StoredFile(blob.name, blob.size or 0, blob.updated, blob.content_type)
+
+    def exists(self, path: str) -> bool:
+        with storage_client.track():
+            return self._blob(path).exists(**storage_client.call_options())
+
+    def probe(self, path: str, timeout: float) -> bool:
+        with storage_client.track():
+            return self._blob(path).exists(timeout=timeout, retry=None)
+
+    def delete(self, path: str) -> bool:
+        from google.api_core.exceptions import NotFound
+
+        # A single DELETE; a missing object is reported as NotFound instead of a prior exists()
+        try:
+            with storage_client.track():
+                self._blob(path).delete(**storage_client.call_options())
+        except NotFound:
+            return False
+        return True
+
+    def list(
+        self,
+        prefix: str,
+        page_token: Optional[str] = None,
+        page_size: int = 1000,
+        match_glob: Optional[str] = None,
+    ) -> tuple[list[StoredFile], Optional[str]]:
+        iterator = storage_client.get_bucket().list_blobs(
+            prefix=prefix,
+            page_token=page_token,
+            page_size=page_size,
+            match_glob=match_glob,
+            fields="items(name,size,updated,contentType),nextPageToken",
+            **storage_client.call_options(),
+        )
+        with storage_client.track():
+            page = next(iterator.pages, None)
+
+        files = [
+            StoredFile(blob.name, blob.size or 0, blob.updated, blob.content_type)
+            for blob in (page or [])
+        ]
+        return files, iterator.next_page_token
+
+    def read_range(self, path: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        # download_as_bytes takes an inclusive end offset
+        with storage_client.track():
+            return self._blob(path).download_as_bytes(
+                start=start,
+                end=end - 1 if end is not None else None,
+                **storage_client.call_options(),
+            )
+
+    def save(self, path: str, data: bytes, content_type: str) -> StoredFile:
+        blob = self._blob(path)
+        with storage_client.track():
+            blob.upload_from_string(
+                data, content_type=content_type, **storage_client.call_options()
+            )
+        return StoredFile(path, len(data), blob.updated, content_type)
+
+
+class LatencySimulator:
+    """
+    Sleeps for a configured per-operation latency plus seeded random jitter.
+
+    Args:
+        latency: Seconds added to every operation, or a dict of per-operation
+            latencies keyed by method name (e.g. {"exists": 0.08, "delete": 0.05})
+        jitter: Maximum extra random seconds added to each operation
+        seed: Seed for the jitter generator
+    """
+
+    def __init__(
+        self,
+        latency: Union[float, dict[str, float]] = 0.0,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, operation: str) -> None:
+        if isinstance(self.latency, dict):
+            delay = self.latency.get(operation, 0.0)
+        else:
+            delay = self.latency
+
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(0, self.jitter)
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class LocalFileSystemStorageBackend(StorageBackend):
+    """
+    Objects stored as files under a root directory (MEDIA_ROOT by default).
+
+    Signed URLs point at the local storage view and carry an expiry and an
+    HMAC over (method, path, expiry, content type) keyed by SECRET_KEY.
+    Accepts the same latency/jitter/seed options as InMemoryStorageBackend.
+    """
+
+    SIGNATURE_SALT = "accounts.storage_backends.LocalFileSystemStorageBackend"
+
+    def __init__(
+        self,
+        root: Optional[Union[str, Path]] = None,
+        base_url: str = "",
+        latency: Union[float, dict[str, float]] = 0.0,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.root = Path(root or settings.MEDIA_ROOT).resolve()
+        # Absolute origin for signed URLs (e.g. http://localhost:8000); relative if empty
+        self.base_url = base_url.rstrip("/")
+        self._simulate = LatencySimulator(latency, jitter, seed)
+
+    def local_path(self, path: str) -> Path:
+        """Absolute filesystem path of an object."""
+        full_path = (self.root / path).resolve()
+        # SECURITY: Never resolve outside the storage root
+        if self.root not in full_path.parents:
+            raise ValueError(f"Invalid storage path: {path!r}")
+        return full_path
+
+    @classmethod
+    def signature(cls, method: str, path: str, expires: int, content_type: str = "") -> str:
+        """HMAC signature for a local storage URL."""
+        value = f"{method}\n{path}\n{expires}\n{content_type}"
+        return salted_hmac(cls.SIGNATURE_SALT, value, algorithm="sha256").hexdigest()
+
+    @classmethod
+    def verify_signature(
+        cls, method: str, path: str, expires: str, signature: str, content_type: str = ""
+    ) -> bool:
+        """Check a local storage URL's signature and expiry."""
+        try:
+            expires_at = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires_at < time.time():
+            return False
+        expected = cls.signature(method, path, expires_at, content_type)
+        return constant_time_compare(expected, signature or "")
+
+    def _signed_url(self, method: str, path: str, expires: int, content_type: str = "") -> str:
+        query = urlencode(
+            {"expires": expires, "signature": self.signature(method, path, expires, content_type)}
+        )
+        url = reverse("local_storage_file", kwargs={"file_path": path})
+        return f"{self.base_url}{url}?{query}"
+
+    def sign_upload_url(
+        self, path: str, content_type: str, expires_in: int, headers: Optional[dict] = None
+    ) -> str:
+        # The storage view applies Cache-Control and create-only uploads by path instead
+        self._simulate("sign_upload_url")
+        return self._signed_url("PUT", path, int(time.time()) + int(expires_in), content_type)
+
+    def sign_download_url(self, path: str, expires_at: int) -> str:
+        self._simulate("sign_download_url")
+        return self._signed_url("GET", path, int(expires_at))
+
+    def _stored_file(self, path: str, file_path: Path) -> StoredFile:
+        stat = file_path.stat()
+        return StoredFile(
+            path,
+            stat.st_size,
+            datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc),
+            mimetypes.guess_type(path)[0],
+        )
+
+    def stat(self, path: str) -> Optional[StoredFile]:
+        self._simulate("stat")
+        file_path = self.local_path(path)
+        if not file_path.is_file():
+            return None
+        return self._stored_file(path, file_path)
+
+    def exists(self, path: str) -> bool:
+        self._simulate("exists")
+        return self.local_path(path).is_file()
+
+    def delete(self, path: str) -> bool:
+        self._simulate("delete")
+        try:
+            self.local_path(path).unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def list(
+        self,
+        prefix: str,
+        page_token: Optional[str] = None,
+        page_size: int = 1000,
+        match_glob: Optional[str] = None,
+    ) -> tuple[list[StoredFile], Optional[str]]:
+        self._simulate("list")
+        # Like GCS, pages are ordered by name and the token is the last name returned.
+        # The tree is walked in name order from the token on, and only one page is read.
+        directory = prefix.rpartition("/")[0]
+        # SECURITY: local_path refuses prefixes outside the storage root
+        if directory:
+            self.local_path(directory)
+        names = (
+            name
+            for name in self._walk(directory, prefix, page_token)
+            if match_glob is None or fnmatchcase(name, match_glob)
+        )
+        page = list(islice(names, page_size + 1))
+
+        files = [self._stored_file(name, self.root / name) for name in page[:page_size]]
+        next_page_token = page[page_size - 1] if len(page) > page_size else None
+        return files, next_page_token
+
+    def _walk(self, directory: str, prefix: str, after: Optional[str]) -> Iterator[str]:
+        """
+        Yield object names under directory in name order, starting after the name after.
+
+        Sorting entries with a '/' appended to directory names gives the order
+        of full names, so subtrees that sort entirely before after (or outside
+        prefix) are skipped without being read.
+        """
+        try:
+            entries = list(os.scandir(self.root / directory))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        keys = []
+        for entry in entries:
+            name = f"{directory}/{entry.name}" if directory else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                keys.append((name + "/", True))
+            elif not entry.name.startswith(UPLOAD_TEMP_PREFIX):
+                keys.append((name, False))
+
+        for key, is_dir in sorted(keys):
+            if not (key.startswith(prefix) or (is_dir and prefix.startswith(key))):
+                continue
+            if is_dir:
+                # Every name in the subtree starts with key
+                if after is None or after < key or after.startswith(key):
+                    yield from self._walk(key[:-1], prefix, after)
+            elif after is None or key > after:
+                yield key
+
+    def read_range(self, path: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        self._simulate("read_range")
+        with open(self.local_path(path), "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(max(end - start, 0))
+
+    def save(self, path: str, data: bytes, content_type: str) -> StoredFile:
+        self._simulate("save")
+        file_path = self.local_path(path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file and rename so readers never see a partial object
+        fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, prefix=UPLOAD_TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return self._stored_file(path, file_path)
+
+
+class InMemoryStorageBackend(StorageBackend):
+    """
+    Objects kept in a process-local dict, with injectable latency.
+
+    Every operation sleeps for its configured latency plus a random jitter
+    drawn from a seeded generator, so slow-storage scenarios are reproducible.
+
+    Options:
+        latency: Seconds added to every operation, or a dict of per-operation
+            latencies keyed by method name (e.g. {"exists": 0.08, "delete": 0.05})
+        jitter: Maximum extra random seconds added to each operation
+        seed: Seed for the jitter generator
+    """
+
+    def __init__(
+        self,
+        latency: Union[float, dict[str, float]] = 0.0,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self._simulate = LatencySimulator(latency, jitter, seed)
+        self._lock = threading.Lock()
+        self._objects: dict[str, tuple[bytes, str, datetime]] = {}
+
+    def _signed_url(self, method: str, path: str, expires: int) -> str:
+        return f"memory://{path}?{urlencode({'method': method, 'expires': expires})}"
+
+    def sign_upload_url(
+        self, path: str, content_type: str, expires_in: int, headers: Optional[dict] = None
+    ) -> str:
+        self._simulate("sign_upload_url")
+        return self._signed_url("PUT", path, int(time.time()) + int(expires_in))
+
+    def sign_download_url(self, path: str, expires_at: int) -> str:
+        self._simulate("sign_download_url")
+        return self._signed_url("GET", path, int(expires_at))
+
+    def stat(self, path: str) -> Optional[StoredFile]:
+        self._simulate("stat")
+        with self._lock:
+            stored = self._objects.get(path)
+        if stored is None:
+            return None
+        data, content_type, updated = stored
+        return StoredFile(path, len(data), updated, content_type)
+
+    def exists(self, path: str) -> bool:
+        self._simulate("exists")
+        with self._lock:
+            return path in self._objects
+
+    def delete(self, path: str) -> bool:
+        self._simulate("delete")
+        with self._lock:
+            return self._objects.pop(path, None) is not None
+
+    def list(
+        self,
+        prefix: str,
+        page_token: Optional[str] = None,
+        page_size: int = 1000,
+        match_glob: Optional[str] = None,
+    ) -> tuple[list[StoredFile], Optional[str]]:
+        self._simulate("list")
+        with self._lock:
+            names = sorted(
+                name
+                for name in self._objects
+                if name.startswith(prefix)
+                and (page_token is None or name > page_token)
+                and (match_glob is None or fnmatchcase(name, match_glob))
+            )
+            page = names[:page_size]
+            files = [
+                StoredFile(name, len(self._objects[name][0]), self._objects[name][2])
+                for name in page
+            ]
+        next_page_token = page[-1] if len(names) > page_size else None
+        return files, next_page_token
+
+    def read_range(self, path: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        self._simulate("read_range")
+        with self._lock:
+            stored = self._objects.get(path)
+        if stored is None:
+            raise FileNotFoundError(path)
+        return stored[0][start:end]
+
+    def save(self, path: str, data: bytes, content_type: str) -> StoredFile:
+        self._simulate("save")
+        updated = datetime.now(tz=dt_timezone.utc)
+        with self._lock:
+            self._objects[path] = (bytes(data), content_type, updated)
+        return StoredFile(path, len(data), updated, content_type)
+
+
+@cache
+def get_storage_backend() -> StorageBackend:
+    """Return the configured storage backend (one instance per process)."""
+    backend_class = import_string(settings.STORAGE_BACKEND)
+    return backend_class(**settings.STORAGE_BACKEND_OPTIONS)
+
+
+@receiver(setting_changed)
+def _reset_storage_backend(setting: str, **kwargs) -> None:
+    """Rebuild the backend when tests override the storage settings."""
+    if setting in ("STORAGE_BACKEND", "STORAGE_BACKEND_OPTIONS", "MEDIA_ROOT"):
+        get_storage_backend.cache_clear()
@@ -0,0 +1,149 @@
+"""Process-wide, thread-safe Cloud Storage client with a sized HTTP connection pool."""
+
+from contextlib import contextmanager
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from django.conf import settings
+
+from .firebase import get_app
+from .metrics import set_storage_pool_size, storage_pool_call_finished, storage_pool_call_started
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+    from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class StorageClientManager:
+    """
+    Owns one storage client and bucket handle per process.
+
+    The client's requests session is mounted with a connection pool sized for
+    the number of threads that call storage concurrently, so connections are
+    kept alive and reused instead of being opened and discarded under load.
+    Handles are recreated after a fork (e.g. gunicorn preload) because sockets
+    must not be shared between processes. The Google client libraries are only
+    imported when the first handle is created.
+    """
+
+    def __init__(
+        self,
+        pool_size: int,
+        connect_timeout: float,
+        read_timeout: float,
+        call_deadline: float,
+    ):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.call_deadline = call_deadline
+        self._retry = None
+
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._bucket: Optional[storage.Bucket] = None
+        self._adapter: Optional[HTTPAdapter] = None
+
+        # Pool saturation counters (guarded by _lock)
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._calls = 0
+        self._saturated_calls = 0
+
+    def get_bucket(self) -> "storage.Bucket":
+        """Return this process's bucket handle, creating it on first use."""
+        pid = os.getpid()
+        if self._bucket is None or self._pid != pid:
+            with self._lock:
+                if self._bucket is None or self._pid != pid:
+                    self._bucket = self._create_bucket()
+                    self._pid = pid
+                    self._in_flight = 0
+        return self._bucket
+
+    def _create_bucket(self) -> "storage.Bucket":
+        from google.auth.transport.requests import AuthorizedSession
+        from google.cloud import storage
+        from requests.adapters import HTTPAdapter
+
+        app = get_app()
+        credential = app.credential.get_credential()
+
+        # pool_block makes extra threads wait for a pooled connection rather than
+        # opening throwaway connections that can't be returned to a full pool
+        session = AuthorizedSession(credential)
+        self._adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size, pool_block=True
+        )
+        session.mount("https://", self._adapter)
+
+        client = storage.Client(project=app.project_id, credentials=credential, _http=session)
+        bucket_name = app.options.get("storageBucket") or settings.FIREBASE_STORAGE_BUCKET
+        set_storage_pool_size(self.pool_size)
+        logger.info(f"Created storage client for {bucket_name} (pool size {self.pool_size})")
+        return client.bucket(bucket_name)
+
+    def call_options(self) -> dict:
+        """Timeout and retry policy to pass to every storage API call."""
+        if self._retry is None:
+            from google.cloud.storage.retry import DEFAULT_RETRY
+
+            self._retry = DEFAULT_RETRY.with_timeout(self.call_deadline)
+        return {"timeout": self.timeout, "retry": self._retry}
+
+    @contextmanager
+    def track(self):
+        """Count a storage API call for the pool saturation metrics (see accounts.metrics)."""
+        with self._lock:
+            self._in_flight += 1
+            self._calls += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            saturated = self._in_flight > self.pool_size
+            if saturated:
+                self._saturated_calls += 1
+        storage_pool_call_started(saturated)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            storage_pool_call_finished()
+
+    def stats(self) -> dict:
+        """
+        Snapshot of connection pool usage.
+
+        Returns:
+            Dict with the pool size, calls currently in flight, the peak number
+            of concurrent calls, total calls, calls that had to wait for a free
+            connection (saturated) and the number of idle pooled connections
+        """
+        with self._lock:
+            stats = {
+                "pool_size": self.pool_size,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "calls": self._calls,
+                "saturated_calls": self._saturated_calls,
+                "idle_connections": 0,
+            }
+
+        if self._adapter is not None:
+            pools = self._adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None and pool.pool is not None:
+                    stats["idle_connections"] += pool.pool.qsize()
+
+        return stats
+
+
+storage_client = StorageClientManager(
+    pool_size=settings.STORAGE_HTTP_POOL_SIZE,
+    connect_timeout=settings.STORAGE_CONNECT_TIMEOUT,
+    read_timeout=settings.STORAGE_READ_TIMEOUT,
+    call_deadline=settings.STORAGE_CALL_DEADLINE,
+)
@@ -0,0 +1,61 @@
+"""Webhook for Cloud Storage upload notifications (Pub/Sub push)."""
+
+import hmac
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .storage_events import confirm_finalized_uploads, parse_push_message
+
+
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def ingest_storage_events(request: Request) -> Response:
+    """
+    Confirm uploads from object-finalize notifications.
+
+    The Pub/Sub push subscription must be created with
+    ``?token=<STORAGE_EVENTS_TOKEN>`` on its endpoint URL.
+
+    Request body (Pub/Sub push format):
+        {
+            "message": {"attributes": {...}, "data": "...", "messageId": "..."},
+            "subscription": "projects/.../subscriptions/..."
+        }
+
+        Or several messages at once:
+        {
+            "messages": [{"message": {...}}, ...]
+        }
+
+    Returns:
+        {
+            "confirmed": 1,
+            "mannequins": 0,
+            "ignored": 0
+        }
+    """
+    # SECURITY: Reject deliveries that don't carry the shared subscription token
+    expected_token = settings.STORAGE_EVENTS_TOKEN
+    token = request.query_params.get("token", "")
+    if not expected_token or not hmac.compare_digest(token, expected_token):
+        return Response({"error": "Invalid event token"}, status=status.HTTP_403_FORBIDDEN)
+
+    if not isinstance(request.data, dict):
+        return Response({"error": "Invalid push payload"}, status=status.HTTP_400_BAD_REQUEST)
+
+    envelopes = request.data.get("messages", [request.data])
+    if not isinstance(envelopes, list):
+        return Response({"error": "messages must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+
+    events = [event for event in map(parse_push_message, envelopes) if event is not None]
+    result = confirm_finalized_uploads(events)
+    result["ignored"] += len(envelopes) - len(events)
+
+    # Any 2xx response acknowledges the messages; unrelated events are dropped, not retried
+    return Response(result)
@@ -0,0 +1,229 @@
+"""Ingestion of Cloud Storage object-finalize notifications."""
+
+import base64
+import json
+import logging
+from typing import Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .mannequins import activate_mannequin_version
+from .models import PendingUpload, WardrobeItem
+from .storage import MAX_FILE_SIZE_BYTES, parse_mannequin_path, sign_download_url
+
+logger = logging.getLogger(__name__)
+
+# Event type set by Cloud Storage Pub/Sub notifications when an upload completes
+OBJECT_FINALIZE = "OBJECT_FINALIZE"
+
+
+class ObjectFinalizedEvent(NamedTuple):
+    """An object that finished uploading."""
+
+    path: str
+    size: int
+    content_type: Optional[str]
+    bucket: Optional[str]
+
+
+def parse_push_message(envelope: dict) -> Optional[ObjectFinalizedEvent]:
+    """
+    Parse a Pub/Sub push envelope carrying a Cloud Storage notification.
+
+    Args:
+        envelope: Push request body, e.g.
+            {
+                "message": {
+                    "attributes": {"eventType": "OBJECT_FINALIZE", "objectId": "...", ...},
+                    "data": "<base64 JSON object resource>",
+                    "messageId": "..."
+                },
+                "subscription": "projects/.../subscriptions/..."
+            }
+
+    Returns:
+        The finalized object, or None for other event types and malformed messages
+    """
+    message = envelope.get("message") if isinstance(envelope, dict) else None
+    if not isinstance(message, dict):
+        return None
+
+    attributes = message.get("attributes") or {}
+    if attributes.get("eventType") != OBJECT_FINALIZE:
+        return None
+
+    try:
+        resource = json.loads(base64.b64decode(message.get("data") or ""))
+    except (ValueError, TypeError):
+        resource = {}
+
+    path = resource.get("name") or attributes.get("objectId")
+    if not path:
+        return None
+
+    try:
+        size = int(resource.get("size", 0))
+    except (ValueError, TypeError):
+        size = 0
+
+    return ObjectFinalizedEvent(
+        path=path,
+        size=size,
+        content_type=resource.get("contentType"),
+        bucket=resource.get("bucket") or attributes.get("bucketId"),
+    )
+
+
+def confirm_finalized_uploads(events: list[ObjectFinalizedEvent]) -> dict:
+    """
+    Confirm uploads server-side from finalize notifications.
+
+    Wardrobe uploads are matched to their reservations with one query and
+    inserted with one bulk insert, so the cost does not grow with the number
+    of storage calls a client-side confirm would make. Items that were
+    already confirmed are skipped and counted as ignored.
+
+    Args:
+        events: Finalized objects, in any order
+
+    Returns:
+        Counts of confirmed wardrobe items, updated mannequins and ignored events
+    """
+    result = {"confirmed": 0, "mannequins": 0, "ignored": 0}
+
+    expected_bucket = settings.FIREBASE_STORAGE_BUCKET
+    wardrobe_events: dict[str, ObjectFinalizedEvent] = {}
+    mannequin_events: dict[str, tuple[str, ObjectFinalizedEvent]] = {}
+
+    for event in events:
+        if expected_bucket and event.bucket and event.bucket != expected_bucket:
+            result["ignored"] += 1
+            continue
+        if event.size > MAX_FILE_SIZE_BYTES:
+            # Leave oversized uploads unconfirmed; the orphan GC removes them
+            logger.warning(f"Ignoring oversized upload {event.path} ({event.size} bytes)")
+            result["ignored"] += 1
+            continue
+
+        mannequin = parse_mannequin_path(event.path)
+        if mannequin:
+            mannequin_events[event.path] = (mannequin[0], event)
+        else:
+            wardrobe_events[event.path] = event
+
+    if wardrobe_events:
+        reservations = list(PendingUpload.objects.filter(image_path__in=list(wardrobe_events)))
+        result["ignored"] += len(wardrobe_events) - len(reservations)
+
+        items = [
+            WardrobeItem(
+                id=reservation.id,
+                user_profile_id=reservation.user_profile_id,
+                category=reservation.category,
+                image_path=reservation.image_path,
+                image_url=sign_download_url(reservation.image_path),
+            )
+            for reservation in reservations
+        ]
+
+        with transaction.atomic():
+            # Uploads the client already confirmed itself are counted as ignored
+            existing = set(
+                WardrobeItem.objects.filter(id__in=[item.id for item in items]).values_list(
+                    "id", flat=True
+                )
+            )
+            new_items = [item for item in items if item.id not in existing]
+            WardrobeItem.objects.bulk_create(new_items, ignore_conflicts=True)
+            PendingUpload.objects.filter(id__in=[item.id for item in items]).delete()
+
+        result["confirmed"] += len(new_items)
+        result["ignored"] += len(items) - len(new_items)
+
+    # Versions are activated in notification order; one that was already
+    # replaced (a late or redelivered notification) is ignored
+    for firebase_uid, event in mannequin_events.values():
+        updated = activate_mannequin_version(firebase_uid, event.path)
+        result["mannequins" if updated else "ignored"] += 1
+
+    return result
+
+
+def build_push_envelope(
+    path: str,
+    size: int,
+    content_type: str = "image/jpeg",
+    bucket: Optional[str] = None,
+    message_id: str = "local",
+) -> dict:
+    """
+    Build a Pub/Sub push envelope like the one Cloud Storage notifications deliver.
+
+    Args:
+        path: Object name
+        size: Object size in bytes
+        content_type: Object MIME type
+        bucket: Bucket name (defaults to FIREBASE_STORAGE_BUCKET)
+        message_id: Pub/Sub message id
+
+    Returns:
+        Push request body accepted by parse_push_message
+    """
+    bucket = bucket or settings.FIREBASE_STORAGE_BUCKET
+    resource = {"name": path, "bucket": bucket, "size": str(size), "contentType": content_type}
+
+    return {
+        "message": {
+            "attributes": {
+                "eventType": OBJECT_FINALIZE,
+                "objectId": path,
+                "bucketId": bucket,
+                "payloadFormat": "JSON_API_V1",
+            },
+            "data": base64.b64encode(json.dumps(resource).encode()).decode(),
+            "messageId": message_id,
+        },
+        "subscription": "projects/local/subscriptions/storage-events",
+    }
+
+
+class LocalEventPublisher:
+    """
+    Stand-in for the Pub/Sub push subscription, for tests and local development.
+
+    Delivers finalize notifications to the ingestion endpoint over the Django
+    test client (or any compatible ``post`` callable), exactly as a push
+    subscription would.
+    """
+
+    def __init__(self, post: Optional[Callable] = None, token: Optional[str] = None):
+        if post is None:
+            from django.test import Client
+
+            post = Client().post
+
+        self.post = post
+        self.token = token if token is not None else settings.STORAGE_EVENTS_TOKEN
+        self.published = 0
+
+    def _url(self) -> str:
+        from django.urls import reverse
+
+        return f"{reverse('storage_events')}?token={self.token}"
+
+    def publish(self, path: str, size: int, content_type: str = "image/jpeg"):
+        """Deliver one push message; returns the endpoint response."""
+        self.published += 1
+        envelope = build_push_envelope(path, size, content_type, message_id=str(self.published))
+        return self.post(self._url(), data=envelope, content_type="application/json")
+
+    def publish_batch(self, objects: list[tuple[str, int, str]]):
+        """Deliver several messages in one batched request; returns the endpoint response."""
+        messages = []
+        for path, size, content_type in objects:
+            self.published += 1
+            messages.append(
+                build_push_envelope(path, size, content_type, message_id=str(self.published))
+            )
+        return self.post(self._url(), data={"messages": messages}, content_type="application/json")
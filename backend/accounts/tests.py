@@ -1 +1,1967 @@
-# Create your tests here.
+"""
+Query and storage call budgets for the API views, and their overload behaviour.
+
+Each endpoint has a fixed budget of database queries that must not grow with
+the size of the user's data, so N+1 access patterns fail here instead of in
+production. Firebase token verification is patched out and storage uses the
+in-memory backend.
+"""
+
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from config import health
+
+from . import firebase, tracing
+from .benchmark import FakeGenerationUpstream
+from .generation import MAX_ATTEMPTS as GENERATION_MAX_ATTEMPTS
+from .generation import STALE_JOB_TIMEOUT as GENERATION_STALE_JOB_TIMEOUT
+from .generation import (
+    GenerationClient,
+    GenerationError,
+    GenerationRequest,
+    MicroBatcher,
+    claim_next_generation_job,
+    enqueue_generation,
+    fail_exhausted_generation_jobs,
+    run_generation_job,
+)
+from .generation_inputs import LocalInputCache, get_prepared_input, load_generation_inputs
+from .ids import uuid7, uuid7_time
+from .load_shedding import AIMDLimiter, get_storage_guard
+from .models import (
+    GenerationJob,
+    GenerationUsageEvent,
+    GenerationUsageRollup,
+    Mannequin,
+    Outfit,
+    PendingUpload,
+    StoragePurgeJob,
+    UserProfile,
+    WardrobeItem,
+)
+from .purge import (
+    COMPLETED_JOB_RETENTION,
+    STALE_JOB_TIMEOUT,
+    claim_next_job,
+    prune_completed_jobs,
+    run_job,
+    schedule_account_purge,
+)
+from .quotas import (
+    QuotaExceededError,
+    QuotaUsage,
+    charge_generation,
+    get_quota_usage,
+    rollup_usage_events,
+)
+from .ratelimit import (
+    Bucket,
+    DatabaseRateLimitStore,
+    client_ip,
+    get_process_rate_limit_store,
+    get_rate_limit_store,
+)
+from .renders import evict_renders, get_render_access_tracker
+from .sessions import get_epoch_cache, issue_session_token
+from .storage import (
+    IMMUTABLE_CACHE_CONTROL,
+    delete_files,
+    generate_mannequin_path,
+    generate_prepared_input_path,
+    generate_render_path,
+    generate_thumbnail_path,
+    generate_wardrobe_item_path,
+    get_backend,
+    sign_download_url,
+)
+from .storage_client import StorageClientManager
+from .storage_events import LocalEventPublisher, build_push_envelope
+
+FIREBASE_UID = "budget-user"
+
+# Maximum queries per request, including authentication. Savepoints are not
+# counted: TestCase wraps every test in a transaction, so each atomic block
+# issues savepoint statements that would be a plain BEGIN/COMMIT in production.
+QUERY_BUDGETS = {
+    "current_user": 1,
+    "wardrobe_list": 2,
+    "mannequin_get": 2,
+    "mannequin_poses": 2,
+    "outfits": 3,
+    "wardrobe_upload_url": 2,
+    "wardrobe_confirm": 5,
+    "wardrobe_confirm_retry": 3,
+}
+
+
+def count_queries(captured: CaptureQueriesContext) -> int:
+    return sum(
+        1
+        for query in captured.captured_queries
+        if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+    )
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    EXPOSE_REQUEST_METRICS=True,
+    RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def request(self, method, url_name, data=None):
+        """Send an authenticated request and return (response, query count)."""
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                reverse(url_name),
+                data=data,
+                content_type="application/json",
+                HTTP_AUTHORIZATION="Bearer test-token",
+            )
+        return response, count_queries(queries)
+
+    def seed_items(self, count):
+        items = []
+        for index in range(count):
+            item_id = str(uuid.uuid4())
+            category = "top" if index % 2 == 0 else "bottom"
+            image_path = generate_wardrobe_item_path(FIREBASE_UID, category, item_id, "jpg")
+            get_backend().save(image_path, b"image", "image/jpeg")
+            items.append(
+                WardrobeItem(
+                    id=item_id,
+                    user_profile=self.profile,
+                    category=category,
+                    image_path=image_path,
+                    image_url=sign_download_url(image_path),
+                )
+            )
+        WardrobeItem.objects.bulk_create(items)
+
+    def reserve_upload(self):
+        item_id = uuid.uuid4()
+        image_path = generate_wardrobe_item_path(FIREBASE_UID, "top", str(item_id), "jpg")
+        get_backend().save(image_path, b"image", "image/jpeg")
+        PendingUpload.objects.create(
+            id=item_id,
+            user_profile=self.profile,
+            category="top",
+            image_path=image_path,
+            content_type="image/jpeg",
+            expected_size=5,
+            expires_at=timezone.now() + timedelta(minutes=15),
+        )
+        return {"itemId": str(item_id), "filePath": image_path}
+
+    def test_current_user(self):
+        response, queries = self.request("get", "current_user")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(queries, QUERY_BUDGETS["current_user"])
+
+    def test_wardrobe_list_is_constant_in_item_count(self):
+        self.seed_items(1)
+        response, few_queries = self.request("get", "wardrobe_list")
+        self.assertEqual(response.data["count"], 1)
+
+        self.seed_items(40)
+        response, many_queries = self.request("get", "wardrobe_list")
+        self.assertEqual(response.data["count"], 41)
+
+        self.assertEqual(few_queries, many_queries)
+        self.assertLessEqual(many_queries, QUERY_BUDGETS["wardrobe_list"])
+
+    def test_wardrobe_list_urls_are_stable(self):
+        self.seed_items(3)
+
+        first, _ = self.request("get", "wardrobe_list")
+        second, _ = self.request("get", "wardrobe_list")
+
+        # The same URLs within a rotation period (the browser cache key), and no
+        # existence checks against storage
+        urls = [item["url"] for item in first.data["items"]]
+        self.assertEqual(urls, [item["url"] for item in second.data["items"]])
+        self.assertEqual(
+            sorted(urls), sorted(WardrobeItem.objects.values_list("image_url", flat=True))
+        )
+        self.assertEqual(second["X-Storage-Calls"], "3")
+
+    def seed_mannequins(self, poses):
+        mannequins = []
+        for pose in poses:
+            version = uuid.uuid4()
+            image_path = generate_mannequin_path(FIREBASE_UID, pose, str(version), "jpg")
+            get_backend().save(image_path, b"image", "image/jpeg")
+            mannequins.append(
+                Mannequin.objects.create(
+                    user_profile=self.profile,
+                    pose=pose,
+                    version=version,
+                    image_path=image_path,
+                    image_url=sign_download_url(image_path),
+                    thumbnail_path=generate_thumbnail_path(image_path),
+                    uploaded_at=timezone.now(),
+                )
+            )
+        if self.profile.default_mannequin_id is None:
+            self.profile.default_mannequin = mannequins[0]
+            self.profile.save()
+        return mannequins
+
+    def test_mannequin_get(self):
+        # Pre-versioning path: its existence is still checked
+        mannequin_path = f"users/{FIREBASE_UID}/mannequin"
+        get_backend().save(mannequin_path, b"image", "image/jpeg")
+        self.profile.default_mannequin = Mannequin.objects.create(
+            user_profile=self.profile,
+            pose="front",
+            version=uuid.uuid4(),
+            image_path=mannequin_path,
+            image_url=sign_download_url(mannequin_path),
+            uploaded_at=timezone.now(),
+        )
+        self.profile.save()
+
+        response, queries = self.request("get", "mannequin_get")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["pose"], "front")
+        self.assertLessEqual(queries, QUERY_BUDGETS["mannequin_get"])
+
+    def test_mannequin_poses_are_one_query_without_storage_calls(self):
+        self.seed_mannequins(["front"])
+        response, few_queries = self.request("get", "mannequin_poses")
+        self.assertEqual(len(response.data["poses"]), 1)
+
+        self.seed_mannequins(["side", "back", "three_quarter"])
+        response, many_queries = self.request("get", "mannequin_poses")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["poses"]), 4)
+        self.assertEqual(
+            [pose["isDefault"] for pose in response.data["poses"]], [True, False, False, False]
+        )
+        self.assertTrue(all(pose["thumbnailUrl"] for pose in response.data["poses"]))
+        self.assertEqual(few_queries, many_queries)
+        self.assertLessEqual(many_queries, QUERY_BUDGETS["mannequin_poses"])
+        # Only local signatures (image and thumbnail per pose), no storage round trips
+        self.assertEqual(response["X-Storage-Calls"], "8")
+
+    def seed_outfits(self, count, **fields):
+        items = list(WardrobeItem.objects.filter(user_profile=self.profile))
+        now = timezone.now()
+        Outfit.objects.bulk_create(
+            Outfit(
+                user_profile=self.profile,
+                item_ids=[str(items[index % len(items)].id)],
+                # Pairs share a timestamp, so ties are broken by id
+                created_at=now - timedelta(seconds=index // 2),
+                **fields,
+            )
+            for index in range(count)
+        )
+
+    def test_outfit_history_is_constant_in_page_size(self):
+        self.seed_items(30)
+        self.seed_outfits(60)
+
+        url = reverse("outfits")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"limit": 2}, HTTP_AUTHORIZATION="Bearer test-token")
+        few_queries = count_queries(queries)
+        self.assertEqual(len(response.data["outfits"]), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"limit": 50}, HTTP_AUTHORIZATION="Bearer test-token")
+        many_queries = count_queries(queries)
+
+        self.assertEqual(len(response.data["outfits"]), 50)
+        self.assertTrue(all(outfit["items"] for outfit in response.data["outfits"]))
+        self.assertEqual(few_queries, many_queries)
+        self.assertLessEqual(many_queries, QUERY_BUDGETS["outfits"])
+
+    def test_outfit_history_pages_cover_every_outfit_once(self):
+        self.seed_items(2)
+        self.seed_outfits(25)
+        self.seed_outfits(4, is_favorite=True)
+
+        def walk(**params):
+            seen, cursor = [], None
+            while True:
+                query = {"limit": 7, **params, **({"cursor": cursor} if cursor else {})}
+                response = self.client.get(
+                    reverse("outfits"), query, HTTP_AUTHORIZATION="Bearer test-token"
+                )
+                self.assertEqual(response.status_code, 200)
+                seen += [outfit["id"] for outfit in response.data["outfits"]]
+                cursor = response.data["nextCursor"]
+                if cursor is None:
+                    return seen
+
+        history = walk()
+        expected = [str(outfit_id) for outfit_id in Outfit.objects.values_list("id", flat=True)]
+        self.assertEqual(history, expected)
+        self.assertEqual(len(walk(favorites="true")), 4)
+
+    def test_outfit_rejects_other_users_items(self):
+        other = User.objects.create_user(username="other@example.com", email="other@example.com")
+        other_item = WardrobeItem.objects.create(
+            user_profile=UserProfile.objects.create(user=other, firebase_uid="other-user"),
+            category="top",
+            image_path="users/other-user/wardrobe/tops/item.jpg",
+            image_url="https://example.com/item.jpg",
+        )
+
+        response, _ = self.request("post", "outfits", {"itemIds": [str(other_item.id)]})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Outfit.objects.exists())
+
+    def test_wardrobe_upload_url(self):
+        response, queries = self.request(
+            "post",
+            "wardrobe_upload_url",
+            {
+                "category": "top",
+                "filename": "shirt.jpg",
+                "contentType": "image/jpeg",
+                "fileSize": 1024,
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(queries, QUERY_BUDGETS["wardrobe_upload_url"])
+
+        item_id = uuid.UUID(response.data["itemId"])
+        self.assertEqual(item_id.version, 7)
+        self.assertEqual(
+            response.data["filePath"], f"users/{FIREBASE_UID}/wardrobe/tops/{item_id}.jpg"
+        )
+
+    def test_wardrobe_confirm_and_retry(self):
+        body = self.reserve_upload()
+
+        response, queries = self.request("post", "wardrobe_confirm", body)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(queries, QUERY_BUDGETS["wardrobe_confirm"])
+
+        # A retried confirm returns the same item without touching storage
+        response, queries = self.request("post", "wardrobe_confirm", body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["item"]["id"], body["itemId"])
+        self.assertEqual(response["X-Storage-Calls"], "0")
+        self.assertLessEqual(queries, QUERY_BUDGETS["wardrobe_confirm_retry"])
+
+    def test_metrics_headers(self):
+        response, queries = self.request("get", "current_user")
+
+        self.assertEqual(response["X-DB-Queries"], str(queries))
+        self.assertIn("X-DB-Time-Ms", response)
+        self.assertEqual(response["X-Storage-Calls"], "0")
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    RATE_LIMIT_ENABLED=True,
+    RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+    RATE_LIMITS={
+        "global": {"capacity": 1000, "rate": 1},
+        "ip": {"capacity": 3, "rate": 0.01},
+        "upload_url": {"capacity": 1, "rate": 0.01},
+    },
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        get_rate_limit_store.cache_clear()
+        get_process_rate_limit_store.cache_clear()
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        self.verify_id_token = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def upload_url(self, remote_addr="192.0.2.1"):
+        return self.client.post(
+            reverse("wardrobe_upload_url"),
+            data={
+                "category": "top",
+                "filename": "shirt.jpg",
+                "contentType": "image/jpeg",
+                "fileSize": 1024,
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer test-token",
+            REMOTE_ADDR=remote_addr,
+        )
+
+    def test_upload_url_is_limited_per_user(self):
+        self.assertEqual(self.upload_url().status_code, 200)
+
+        # A different address doesn't help: the limit follows the user
+        response = self.upload_url(remote_addr="192.0.2.2")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+    def test_ip_limit_rejects_before_authentication(self):
+        for _ in range(3):
+            self.client.get(reverse("current_user"), HTTP_AUTHORIZATION="Bearer test-token")
+        self.verify_id_token.reset_mock()
+
+        response = self.client.get(reverse("current_user"), HTTP_AUTHORIZATION="Bearer test-token")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.verify_id_token.assert_not_called()
+
+    def test_health_checks_are_exempt(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get("/api/health/live/").status_code, 200)
+
+    def forwarded_request(self, forwarded_for):
+        return RequestFactory().get(
+            "/api/auth/me/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR=forwarded_for
+        )
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_client_ip_is_the_hop_appended_by_our_proxy(self):
+        # The client may put anything in the header; only our proxy's hop is trusted
+        self.assertEqual(client_ip(self.forwarded_request("203.0.113.7")), "203.0.113.7")
+        self.assertEqual(
+            client_ip(self.forwarded_request("198.51.100.1, 203.0.113.7")), "203.0.113.7"
+        )
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=2)
+    def test_client_ip_skips_each_trusted_proxy(self):
+        request = self.forwarded_request("198.51.100.1, 203.0.113.7, 10.0.0.2")
+
+        self.assertEqual(client_ip(request), "203.0.113.7")
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=0)
+    def test_client_ip_ignores_forwarded_for_without_trusted_proxies(self):
+        self.assertEqual(client_ip(self.forwarded_request("203.0.113.7")), "10.0.0.1")
+
+    @override_settings(
+        RATE_LIMITS={
+            "global": {"capacity": 4, "rate": 0.01},
+            "ip": {"capacity": 100, "rate": 1},
+        },
+        RATE_LIMIT_PROCESSES=2,
+    )
+    def test_global_limit_is_split_between_processes(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse("current_user")).status_code, 403)
+
+        response = self.client.get(reverse("current_user"))
+
+        self.assertEqual(response.status_code, 429)
+        # Only the per-IP bucket went to the shared store
+        self.assertEqual(list(get_rate_limit_store()._buckets), ["ip:127.0.0.1"])
+
+
+@skipUnless(connection.vendor == "postgresql", "rate_limit_buckets is PostgreSQL only")
+class DatabaseRateLimitStoreTests(TestCase):
+    def test_consume_refuses_once_a_bucket_is_empty(self):
+        store = DatabaseRateLimitStore()
+        buckets = [Bucket("ip", "ip:192.0.2.1", 2.0, 0.001), Bucket("user", "user:1", 5.0, 1.0)]
+
+        self.assertTrue(store.consume(buckets).allowed)
+        self.assertTrue(store.consume(buckets).allowed)
+        decision = store.consume(buckets)
+
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.limit, "ip")
+        self.assertGreater(decision.retry_after, 100)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT key, tokens FROM rate_limit_buckets ORDER BY key")
+            rows = dict(cursor.fetchall())
+        self.assertLess(rows["ip:192.0.2.1"], 1)
+        self.assertGreater(rows["user:1"], 1)
+
+    def test_prune_deletes_idle_buckets(self):
+        store = DatabaseRateLimitStore()
+        store.consume([Bucket("ip", "ip:192.0.2.1", 2.0, 1.0)])
+
+        self.assertEqual(store.prune(3600), 0)
+        self.assertEqual(store.prune(0), 1)
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+    STORAGE_BREAKER_FAILURES=1,
+    STORAGE_BREAKER_OPEN_SECONDS=30.0,
+)
+class LoadSheddingTests(TestCase):
+    def setUp(self):
+        get_storage_guard.cache_clear()
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def open_circuit(self):
+        # One failed storage call trips the breaker (STORAGE_BREAKER_FAILURES=1)
+        with self.assertRaises(RuntimeError), get_storage_guard().admit():
+            raise RuntimeError("storage timeout")
+
+    def get(self, url_name):
+        return self.client.get(reverse(url_name), HTTP_AUTHORIZATION="Bearer test-token")
+
+    def test_wardrobe_list_does_not_wait_for_storage_while_open(self):
+        image_path = generate_wardrobe_item_path(FIREBASE_UID, "top", str(uuid.uuid4()), "jpg")
+        WardrobeItem.objects.create(
+            user_profile=self.profile,
+            category="top",
+            image_path=image_path,
+            image_url="https://example.com/stored",
+        )
+        self.open_circuit()
+
+        response = self.get("wardrobe_list")
+
+        # Listing only signs URLs locally, so it is unaffected by the open circuit
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["items"][0]["url"], sign_download_url(image_path))
+
+    def test_mannequin_serves_stored_url_while_open(self):
+        self.profile.default_mannequin = Mannequin.objects.create(
+            user_profile=self.profile,
+            pose="front",
+            version=uuid.uuid4(),
+            image_path=f"users/{FIREBASE_UID}/mannequin",
+            image_url="https://example.com/stored",
+            uploaded_at=timezone.now(),
+        )
+        self.profile.save()
+        self.open_circuit()
+
+        response = self.get("mannequin_get")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["url"], "https://example.com/stored")
+
+    def test_upload_url_is_shed_while_open(self):
+        self.open_circuit()
+
+        response = self.client.post(
+            reverse("wardrobe_upload_url"),
+            data={
+                "category": "top",
+                "filename": "shirt.jpg",
+                "contentType": "image/jpeg",
+                "fileSize": 1024,
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer test-token",
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertFalse(PendingUpload.objects.exists())
+
+    def test_concurrency_limit_backs_off_and_recovers(self):
+        limiter = AIMDLimiter(min_limit=1, max_limit=4)
+        for _ in range(20):
+            self.assertTrue(limiter.try_acquire())
+            limiter.release(ok=False)
+        self.assertEqual(limiter.limit, 1)
+
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        limiter.release(ok=True)
+        for _ in range(20):
+            limiter.try_acquire()
+            limiter.release(ok=True)
+        self.assertEqual(limiter.limit, 4)
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+)
+class MannequinVersionTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def post(self, url_name, data, **kwargs):
+        return self.client.post(
+            reverse(url_name, kwargs=kwargs or None),
+            data=data,
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer test-token",
+        )
+
+    def upload(self, pose="front", data=b"image"):
+        """Get an upload URL, store the object as the client would, and return its path."""
+        response = self.post(
+            "mannequin_upload_url",
+            {"filename": "me.jpg", "contentType": "image/jpeg", "fileSize": 5, "pose": pose},
+        )
+        self.assertEqual(response.status_code, 200)
+        file_path = response.data["filePath"]
+        get_backend().save(file_path, data, "image/jpeg")
+        return file_path
+
+    def test_confirm_switches_version_and_retires_previous(self):
+        first = self.upload()
+        self.assertEqual(self.post("mannequin_confirm", {"filePath": first}).status_code, 200)
+        second = self.upload()
+        self.assertNotEqual(first, second)
+
+        response = self.post("mannequin_confirm", {"filePath": second})
+
+        self.assertEqual(response.status_code, 200)
+        mannequin = Mannequin.objects.get(user_profile=self.profile)
+        self.assertEqual(mannequin.image_path, second)
+        self.assertEqual(str(mannequin.version), second.rsplit("/", 1)[1][:-4])
+        job = StoragePurgeJob.objects.get(prefix=first)
+        self.assertGreater(job.not_before, timezone.now())
+
+        # A replaced version can't be confirmed again
+        response = self.post("mannequin_confirm", {"filePath": first})
+        self.assertEqual(response.status_code, 409)
+
+    def test_cleanup_waits_for_grace_period_and_deletes_only_that_version(self):
+        first = self.upload()
+        self.post("mannequin_confirm", {"filePath": first})
+        second = self.upload()
+        self.post("mannequin_confirm", {"filePath": second})
+
+        self.assertIsNone(claim_next_job())
+
+        StoragePurgeJob.objects.filter(prefix=first).update(not_before=timezone.now())
+        job = run_job(claim_next_job())
+
+        self.assertEqual(job.status, StoragePurgeJob.STATUS_COMPLETED)
+        self.assertFalse(get_backend().exists(first))
+        self.assertTrue(get_backend().exists(second))
+
+    def test_confirm_rejects_other_users_versions(self):
+        other_path = f"users/someone-else/mannequin/front/{uuid.uuid4()}.jpg"
+        get_backend().save(other_path, b"image", "image/jpeg")
+
+        response = self.post("mannequin_confirm", {"filePath": other_path})
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_poses_are_independent_and_first_is_default(self):
+        front = self.upload("front")
+        self.post("mannequin_confirm", {"filePath": front})
+        side = self.upload("side")
+        response = self.post("mannequin_confirm", {"filePath": side})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["mannequin"]["isDefault"])
+        self.assertEqual(Mannequin.objects.filter(user_profile=self.profile).count(), 2)
+        self.assertFalse(StoragePurgeJob.objects.exists())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.default_mannequin.image_path, front)
+
+        side_id = response.data["mannequin"]["id"]
+        response = self.post("mannequin_pose_default", {}, mannequin_id=side_id)
+        self.assertEqual(response.status_code, 200)
+        self.profile.refresh_from_db()
+        self.assertEqual(str(self.profile.default_mannequin_id), side_id)
+
+    def test_deleting_default_pose_promotes_the_next(self):
+        front = self.upload("front")
+        front_id = self.post("mannequin_confirm", {"filePath": front}).data["mannequin"]["id"]
+        side = self.upload("side")
+        side_id = self.post("mannequin_confirm", {"filePath": side}).data["mannequin"]["id"]
+
+        response = self.client.delete(
+            reverse("mannequin_pose_delete", kwargs={"mannequin_id": front_id}),
+            HTTP_AUTHORIZATION="Bearer test-token",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["defaultId"], side_id)
+        self.assertFalse(get_backend().exists(front))
+        self.assertTrue(get_backend().exists(side))
+
+    def test_upload_url_rejects_unknown_pose(self):
+        response = self.post(
+            "mannequin_upload_url",
+            {"filename": "me.jpg", "contentType": "image/jpeg", "fileSize": 5, "pose": "../x"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(importlib.util.find_spec("PIL"), "Pillow is not installed")
+    def test_confirm_prepares_thumbnail(self):
+        from PIL import Image
+
+        image = io.BytesIO()
+        Image.new("RGB", (600, 900)).save(image, "JPEG")
+        file_path = self.upload("front", image.getvalue())
+
+        response = self.post("mannequin_confirm", {"filePath": file_path})
+
+        mannequin = response.data["mannequin"]
+        self.assertEqual((mannequin["width"], mannequin["height"]), (600, 900))
+        thumbnail = Image.open(
+            io.BytesIO(get_backend().read_range(generate_thumbnail_path(file_path)))
+        )
+        self.assertEqual(thumbnail.size, (171, 256))
+
+    @skipUnless(importlib.util.find_spec("PIL"), "Pillow is not installed")
+    def test_undecodable_version_is_not_prepared_again(self):
+        file_path = self.upload("front", b"not an image")
+
+        response = self.post("mannequin_confirm", {"filePath": file_path})
+
+        self.assertEqual(response.status_code, 200)
+        mannequin = Mannequin.objects.get(image_path=file_path)
+        self.assertIsNotNone(mannequin.prepared_at)
+        self.assertIsNone(mannequin.thumbnail_path)
+        out = io.StringIO()
+        call_command("prepare_mannequins", stdout=out)
+        self.assertIn("prepared: 0, replaced: 0, undecodable: 0, failed: 0", out.getvalue())
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+)
+class StoragePurgeTests(TestCase):
+    firebase_uid = "purged-user"
+
+    def seed_objects(self, firebase_uid, count):
+        paths = [
+            generate_wardrobe_item_path(firebase_uid, "top", str(uuid.uuid4()), "jpg")
+            for _ in range(count)
+        ]
+        for path in paths:
+            get_backend().save(path, b"image", "image/jpeg")
+        return paths
+
+    def test_scheduling_reuses_the_unfinished_job(self):
+        job = schedule_account_purge(self.firebase_uid)
+
+        self.assertEqual(job.prefix, f"users/{self.firebase_uid}/")
+        self.assertEqual(schedule_account_purge(self.firebase_uid), job)
+
+        StoragePurgeJob.objects.filter(id=job.id).update(status=StoragePurgeJob.STATUS_COMPLETED)
+        self.assertNotEqual(schedule_account_purge(self.firebase_uid), job)
+
+    def test_interrupted_purge_resumes_from_its_page_token(self):
+        paths = self.seed_objects(self.firebase_uid, 7)
+        others = self.seed_objects("other-user", 2)
+        schedule_account_purge(self.firebase_uid)
+
+        # The third page fails after two pages were deleted and checkpointed
+        pages = []
+
+        def flaky_delete_files(names, max_workers):
+            pages.append(names)
+            if len(pages) == 3:
+                raise ConnectionError("storage unavailable")
+            return delete_files(names, max_workers=max_workers)
+
+        job = claim_next_job()
+        self.assertEqual((job.status, job.attempts), (StoragePurgeJob.STATUS_RUNNING, 1))
+        self.assertIsNone(claim_next_job())
+        with mock.patch("accounts.purge.delete_files", flaky_delete_files):
+            job = run_job(job, page_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, StoragePurgeJob.STATUS_PENDING)
+        self.assertEqual(job.deleted_count, 4)
+        self.assertIsNotNone(job.page_token)
+        self.assertEqual(job.last_error, "storage unavailable")
+        self.assertEqual(sum(get_backend().exists(path) for path in paths), 3)
+
+        job = claim_next_job()
+        self.assertEqual(job.attempts, 2)
+        job = run_job(job, page_size=2)
+
+        self.assertEqual(job.status, StoragePurgeJob.STATUS_COMPLETED)
+        self.assertEqual(job.deleted_count, 7)
+        self.assertFalse(any(get_backend().exists(path) for path in paths))
+        self.assertTrue(all(get_backend().exists(path) for path in others))
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = schedule_account_purge(self.firebase_uid)
+        self.assertEqual(claim_next_job(), job)
+        self.assertIsNone(claim_next_job())
+
+        StoragePurgeJob.objects.filter(id=job.id).update(
+            updated_at=timezone.now() - STALE_JOB_TIMEOUT - timedelta(seconds=1)
+        )
+        reclaimed = claim_next_job()
+
+        self.assertEqual((reclaimed, reclaimed.attempts), (job, 2))
+
+    def test_account_purge_fails_while_the_account_exists_again(self):
+        paths = self.seed_objects(self.firebase_uid, 2)
+        self.addCleanup(delete_files, paths)
+        schedule_account_purge(self.firebase_uid)
+        # Re-created by a token issued before the deletion
+        user = User.objects.create_user(username="back@example.com", email="back@example.com")
+        UserProfile.objects.create(user=user, firebase_uid=self.firebase_uid)
+
+        job = run_job(claim_next_job())
+
+        self.assertEqual(job.status, StoragePurgeJob.STATUS_FAILED)
+        self.assertEqual(job.deleted_count, 0)
+        self.assertTrue(all(get_backend().exists(path) for path in paths))
+
+    def test_prune_deletes_only_old_completed_jobs(self):
+        long_ago = timezone.now() - COMPLETED_JOB_RETENTION - timedelta(days=1)
+        old = StoragePurgeJob.objects.create(
+            firebase_uid=self.firebase_uid,
+            prefix="users/purged-user/",
+            status=StoragePurgeJob.STATUS_COMPLETED,
+            completed_at=long_ago,
+        )
+        recent = StoragePurgeJob.objects.create(
+            firebase_uid=self.firebase_uid,
+            prefix="users/purged-user/mannequin/front/1.jpg",
+            status=StoragePurgeJob.STATUS_COMPLETED,
+            completed_at=timezone.now(),
+        )
+        failed = StoragePurgeJob.objects.create(
+            firebase_uid=self.firebase_uid,
+            prefix="users/purged-user/mannequin/front/2.jpg",
+            status=StoragePurgeJob.STATUS_FAILED,
+        )
+
+        self.assertEqual(prune_completed_jobs(), 1)
+        self.assertQuerySetEqual(StoragePurgeJob.objects.all(), [recent, failed], ordered=False)
+        self.assertFalse(StoragePurgeJob.objects.filter(id=old.id).exists())
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.views.delete_firebase_user")
+        self.delete_firebase_user = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def delete_account(self):
+        return self.client.delete(reverse("delete_account"), HTTP_AUTHORIZATION="Bearer test-token")
+
+    def test_deletes_the_firebase_user_and_queues_the_purge(self):
+        response = self.delete_account()
+
+        self.assertEqual(response.status_code, 200)
+        self.delete_firebase_user.assert_called_once_with(FIREBASE_UID)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(UserProfile.objects.exists())
+        job = StoragePurgeJob.objects.get()
+        self.assertEqual(
+            (job.prefix, job.status), (f"users/{FIREBASE_UID}/", StoragePurgeJob.STATUS_PENDING)
+        )
+
+    def test_keeps_the_account_if_firebase_fails(self):
+        self.delete_firebase_user.side_effect = ConnectionError("firebase unavailable")
+
+        response = self.delete_account()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(UserProfile.objects.filter(id=self.profile.id).exists())
+        self.assertFalse(StoragePurgeJob.objects.exists())
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+)
+class OrphanScanTests(TestCase):
+    def save(self, path):
+        get_backend().save(path, b"image", "image/jpeg")
+        return path
+
+    def seed_user(self, firebase_uid):
+        """Referenced objects of every kind, and one orphan of each."""
+        user = User.objects.create_user(username=firebase_uid, email=f"{firebase_uid}@example.com")
+        profile = UserProfile.objects.create(user=user, firebase_uid=firebase_uid)
+        known, orphans = [], []
+
+        for category in ("top", "bottom"):
+            item = WardrobeItem.objects.create(
+                user_profile=profile,
+                category=category,
+                image_path=generate_wardrobe_item_path(firebase_uid, category, str(uuid7()), "png"),
+            )
+            known += [
+                self.save(item.image_path),
+                self.save(generate_prepared_input_path(item.image_path)),
+            ]
+            orphans.append(
+                self.save(generate_wardrobe_item_path(firebase_uid, category, str(uuid7()), "jpg"))
+            )
+
+        version = uuid.uuid4()
+        image_path = generate_mannequin_path(firebase_uid, "front", str(version), "jpg")
+        mannequin = Mannequin.objects.create(
+            user_profile=profile,
+            pose="front",
+            version=version,
+            image_path=image_path,
+            thumbnail_path=generate_thumbnail_path(image_path),
+            uploaded_at=timezone.now(),
+        )
+        known += [
+            self.save(mannequin.image_path),
+            self.save(mannequin.thumbnail_path),
+            self.save(generate_prepared_input_path(mannequin.image_path)),
+        ]
+        orphans.append(
+            self.save(generate_mannequin_path(firebase_uid, "front", str(uuid.uuid4()), "jpg"))
+        )
+
+        render_path = generate_render_path(firebase_uid, str(uuid7()))
+        Outfit.objects.create(user_profile=profile, item_ids=[], image_path=render_path)
+        known.append(self.save(render_path))
+        orphans.append(self.save(generate_render_path(firebase_uid, str(uuid7()))))
+        return known, orphans
+
+    def test_bucket_scan_deletes_only_unreferenced_objects(self):
+        known, orphans = [], []
+        # UIDs of different lengths, where one is a prefix of the other
+        for firebase_uid in ("scan-user", "scan-user-2", "a"):
+            user_known, user_orphans = self.seed_user(firebase_uid)
+            known += user_known
+            orphans += user_orphans
+
+        out = io.StringIO()
+        call_command("gc_orphaned_uploads", "--scan-bucket", "--grace-hours", "0", stdout=out)
+
+        self.assertIn(f"Deleted {len(orphans)} orphan(s)", out.getvalue())
+        self.assertFalse(any(get_backend().exists(path) for path in orphans))
+        self.assertTrue(all(get_backend().exists(path) for path in known))
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    STORAGE_EVENTS_TOKEN="events-token",
+    FIREBASE_STORAGE_BUCKET="test-bucket",
+)
+class StorageEventTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+        self.publisher = LocalEventPublisher(post=self.client.post)
+
+    def reserve(self):
+        item_id = uuid7()
+        image_path = generate_wardrobe_item_path(FIREBASE_UID, "top", str(item_id), "jpg")
+        PendingUpload.objects.create(
+            id=item_id,
+            user_profile=self.profile,
+            category="top",
+            image_path=image_path,
+            content_type="image/jpeg",
+            expected_size=5,
+            expires_at=timezone.now() + timedelta(minutes=15),
+        )
+        return image_path
+
+    def test_batch_confirms_reserved_uploads_once(self):
+        paths = [self.reserve(), self.reserve()]
+        unknown = generate_wardrobe_item_path(FIREBASE_UID, "top", str(uuid7()), "jpg")
+        objects = [(path, 5, "image/jpeg") for path in [*paths, unknown]]
+
+        response = self.publisher.publish_batch(objects)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"confirmed": 2, "mannequins": 0, "ignored": 1})
+        self.assertEqual(set(WardrobeItem.objects.values_list("image_path", flat=True)), set(paths))
+        self.assertFalse(PendingUpload.objects.exists())
+
+        # Pub/Sub delivers at least once
+        response = self.publisher.publish_batch(objects)
+        self.assertEqual(response.data, {"confirmed": 0, "mannequins": 0, "ignored": 3})
+
+    def test_upload_confirmed_by_the_client_is_not_counted(self):
+        path = self.reserve()
+        reservation = PendingUpload.objects.get(image_path=path)
+        WardrobeItem.objects.create(
+            id=reservation.id, user_profile=self.profile, category="top", image_path=path
+        )
+
+        response = self.publisher.publish(path, 5)
+
+        self.assertEqual(response.data, {"confirmed": 0, "mannequins": 0, "ignored": 1})
+        self.assertFalse(PendingUpload.objects.exists())
+
+    @override_settings(
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+        RATE_LIMITS={
+            "global": {"capacity": 2, "rate": 0.01},
+            "ip": {"capacity": 2, "rate": 0.01},
+        },
+    )
+    def test_delivery_bursts_are_not_rate_limited(self):
+        get_rate_limit_store.cache_clear()
+        get_process_rate_limit_store.cache_clear()
+        paths = [self.reserve() for _ in range(5)]
+
+        responses = [self.publisher.publish(path, 5) for path in paths]
+
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(WardrobeItem.objects.count(), 5)
+
+    def test_rejects_deliveries_without_the_token(self):
+        path = self.reserve()
+
+        response = LocalEventPublisher(post=self.client.post, token="wrong").publish(path, 5)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(WardrobeItem.objects.exists())
+
+    def test_ignores_other_buckets_and_event_types(self):
+        path = self.reserve()
+        envelope = build_push_envelope(path, 5, bucket="other-bucket")
+        deleted = build_push_envelope(path, 5)
+        deleted["message"]["attributes"]["eventType"] = "OBJECT_DELETE"
+
+        response = self.client.post(
+            f"{reverse('storage_events')}?token=events-token",
+            data={"messages": [envelope, deleted]},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.data, {"confirmed": 0, "mannequins": 0, "ignored": 2})
+        self.assertTrue(PendingUpload.objects.exists())
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+    RENDER_ACCESS_FLUSH_SECONDS=3600,
+)
+class RenderEvictionTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def seed_renders(self, profile, count, size=100, **fields):
+        """Create outfits with stored renders, the first one least recently accessed."""
+        now = timezone.now()
+        outfits = []
+        for index in range(count):
+            image_path = generate_render_path(profile.firebase_uid, str(uuid.uuid4()))
+            get_backend().save(image_path, b"x" * size, "image/jpeg")
+            outfits.append(
+                Outfit.objects.create(
+                    user_profile=profile,
+                    image_path=image_path,
+                    image_size=size,
+                    last_accessed_at=now - timedelta(days=count - index),
+                    **fields,
+                )
+            )
+        return outfits
+
+    def test_accesses_are_buffered_and_debounced(self):
+        outfits = self.seed_renders(self.profile, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(2):
+                self.client.get(reverse("outfits"), HTTP_AUTHORIZATION="Bearer test-token")
+        self.assertFalse(any(query["sql"].startswith("UPDATE") for query in queries))
+
+        self.assertEqual(get_render_access_tracker().flush(), 3)
+        self.assertEqual(sorted(Outfit.objects.values_list("access_count", flat=True)), [1, 1, 1])
+
+        # Served again within the debounce window: nothing to write
+        get_render_access_tracker().record(Outfit.objects.all())
+        self.assertEqual(get_render_access_tracker().flush(), 0)
+        self.assertTrue(all(get_backend().exists(outfit.image_path) for outfit in outfits))
+
+    def test_user_budget_evicts_least_recently_used_but_never_favorites(self):
+        favorite = self.seed_renders(self.profile, 1, is_favorite=True)[0]
+        oldest, older, newer, newest = self.seed_renders(self.profile, 4)
+
+        stats = evict_renders(user_budget=300, total_budget=10**9)
+
+        self.assertEqual(stats["evicted"], 2)
+        self.assertEqual(stats["deleted"], 2)
+        self.assertEqual(
+            set(Outfit.objects.exclude(image_path=None).values_list("id", flat=True)),
+            {favorite.id, newer.id, newest.id},
+        )
+        self.assertFalse(get_backend().exists(oldest.image_path))
+        self.assertTrue(get_backend().exists(favorite.image_path))
+
+    def test_total_budget_evicts_across_users(self):
+        other = User.objects.create_user(username="other@example.com", email="other@example.com")
+        other_profile = UserProfile.objects.create(user=other, firebase_uid="other-user")
+        self.seed_renders(self.profile, 2)
+        self.seed_renders(other_profile, 2)
+
+        dry_run = evict_renders(user_budget=10**9, total_budget=200, dry_run=True)
+        self.assertEqual(dry_run["evicted"], 2)
+        self.assertEqual(Outfit.objects.exclude(image_path=None).count(), 4)
+
+        stats = evict_renders(user_budget=10**9, total_budget=200, policy="lfu")
+
+        self.assertEqual(stats["evicted_bytes"], 200)
+        self.assertEqual(Outfit.objects.exclude(image_path=None).count(), 2)
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+)
+class GenerationInputTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        overrides = override_settings(GENERATION_INPUT_CACHE_DIR=cache_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_local_cache_evicts_least_recently_used(self):
+        cache = LocalInputCache(settings.GENERATION_INPUT_CACHE_DIR, max_bytes=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        cache.get("a")
+        cache.put("c", b"cccc")
+
+        self.assertEqual(cache.get("a"), b"aaaa")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"cccc")
+
+        # A new process sharing the directory starts from what is on disk
+        reopened = LocalInputCache(settings.GENERATION_INPUT_CACHE_DIR, max_bytes=4)
+        self.assertIsNone(reopened.get("a"))
+        self.assertEqual(reopened.get("c"), b"cccc")
+
+    def test_stored_input_is_reused_and_cached_locally(self):
+        image_path = generate_wardrobe_item_path(FIREBASE_UID, "top", str(uuid.uuid4()), "jpg")
+        get_backend().save(generate_prepared_input_path(image_path), b"prepared", "image/jpeg")
+
+        self.assertEqual(
+            load_generation_inputs([image_path, image_path]), {image_path: b"prepared"}
+        )
+
+        # Served from the worker's disk without going back to storage
+        get_backend().delete(generate_prepared_input_path(image_path))
+        self.assertEqual(get_prepared_input(image_path), b"prepared")
+
+    @skipUnless(importlib.util.find_spec("PIL"), "Pillow is not installed")
+    def test_cutout_is_downscaled_and_flattened(self):
+        from PIL import Image
+
+        image = io.BytesIO()
+        Image.new("RGBA", (3000, 1500), (0, 0, 0, 0)).save(image, "PNG")
+        image_path = generate_wardrobe_item_path(FIREBASE_UID, "top", str(uuid.uuid4()), "png")
+        get_backend().save(image_path, image.getvalue(), "image/png")
+
+        prepared = Image.open(io.BytesIO(get_prepared_input(image_path)))
+
+        self.assertEqual(prepared.format, "JPEG")
+        self.assertEqual(prepared.size, (1024, 512))
+        self.assertEqual(prepared.getpixel((0, 0)), (255, 255, 255))
+        self.assertTrue(get_backend().exists(generate_prepared_input_path(image_path)))
+
+    @skipUnless(importlib.util.find_spec("pillow_heif"), "pillow-heif is not installed")
+    def test_heic_upload_is_prepared(self):
+        from PIL import Image
+
+        from .image_prep import make_thumbnail
+
+        image = io.BytesIO()
+        Image.new("RGB", (2048, 1024), (200, 30, 30)).save(image, "HEIF")
+        image_path = generate_wardrobe_item_path(FIREBASE_UID, "top", str(uuid.uuid4()), "heic")
+        get_backend().save(image_path, image.getvalue(), "image/heic")
+
+        prepared = Image.open(io.BytesIO(get_prepared_input(image_path)))
+
+        self.assertEqual((prepared.format, prepared.size), ("JPEG", (1024, 512)))
+        thumbnail = make_thumbnail(image.getvalue())
+        self.assertEqual((thumbnail.width, thumbnail.height), (2048, 1024))
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+)
+class GenerationTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "render@example.com"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        overrides = override_settings(GENERATION_INPUT_CACHE_DIR=cache_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        # Each test starts with full rate limit buckets
+        get_rate_limit_store.cache_clear()
+
+        user = User.objects.create_user(username="render@example.com", email="render@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def seed_outfit(self, with_mannequin=True):
+        """An outfit of two items, with prepared inputs already in storage."""
+        paths = []
+        items = []
+        for category in ("top", "bottom"):
+            item_id = uuid.uuid4()
+            image_path = generate_wardrobe_item_path(FIREBASE_UID, category, str(item_id), "jpg")
+            items.append(
+                WardrobeItem.objects.create(
+                    id=item_id, user_profile=self.profile, category=category, image_path=image_path
+                )
+            )
+            paths.append(image_path)
+
+        mannequin = None
+        if with_mannequin:
+            mannequin = Mannequin.objects.filter(user_profile=self.profile).first()
+        if with_mannequin and mannequin is None:
+            version = uuid.uuid4()
+            image_path = generate_mannequin_path(FIREBASE_UID, "front", str(version), "jpg")
+            mannequin = Mannequin.objects.create(
+                user_profile=self.profile,
+                pose="front",
+                version=version,
+                image_path=image_path,
+                uploaded_at=timezone.now(),
+            )
+            paths.append(image_path)
+
+        for path in paths:
+            get_backend().save(generate_prepared_input_path(path), path.encode(), "image/jpeg")
+        return Outfit.objects.create(
+            user_profile=self.profile,
+            mannequin=mannequin,
+            item_ids=[str(item.id) for item in items],
+        )
+
+    def item_paths(self, outfit):
+        paths = dict(
+            WardrobeItem.objects.filter(id__in=outfit.item_ids).values_list("id", "image_path")
+        )
+        return [paths[uuid.UUID(item_id)] for item_id in outfit.item_ids]
+
+    def test_batcher_groups_items_up_to_batch_size(self):
+        batches = []
+
+        def handler(batch):
+            batches.append(batch)
+            return [ValueError(item) if item == "bad" else item.upper() for item in batch]
+
+        batcher = MicroBatcher(handler, max_batch_size=3, max_wait=0.05)
+        futures = [batcher.submit(item) for item in ("a", "b", "c", "d", "bad")]
+
+        self.assertEqual([future.result(timeout=5) for future in futures[:4]], ["A", "B", "C", "D"])
+        with self.assertRaises(ValueError):
+            futures[4].result(timeout=5)
+        self.assertEqual([len(batch) for batch in batches], [3, 2])
+
+    def test_client_batches_over_one_kept_alive_connection(self):
+        upstream = FakeGenerationUpstream(call_latency=0, item_latency=0, connect_latency=0)
+        upstream.start()
+        self.addCleanup(upstream.stop)
+        client = GenerationClient(upstream.url)
+        request = GenerationRequest(mannequin=b"m", garments=[b"top", b"bottom"])
+
+        self.assertEqual(len(client.generate_batch([request] * 3)), 3)
+        client.generate(request)
+
+        self.assertEqual((upstream.calls, upstream.renders, upstream.connections), (2, 4, 1))
+
+    def test_render_is_queued_once_and_stored_on_the_outfit(self):
+        outfit = self.seed_outfit()
+        url = reverse("outfit_render", args=[outfit.id])
+
+        response = self.client.post(url, HTTP_AUTHORIZATION="Bearer test-token")
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data["jobId"]
+        response = self.client.post(url, HTTP_AUTHORIZATION="Bearer test-token")
+        self.assertEqual(response.data["jobId"], job_id)
+
+        requests = []
+
+        def handler(batch):
+            requests.extend(batch)
+            return [b"render"] * len(batch)
+
+        job = claim_next_generation_job()
+        run_generation_job(job, MicroBatcher(handler, max_batch_size=1, max_wait=0))
+
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(requests[0].garments, [item.encode() for item in self.item_paths(outfit)])
+        outfit.refresh_from_db()
+        self.assertEqual(get_backend().read_range(outfit.image_path), b"render")
+        self.assertEqual(outfit.image_size, len(b"render"))
+
+        response = self.client.get(
+            reverse("generation_job", args=[job_id]), HTTP_AUTHORIZATION="Bearer test-token"
+        )
+        self.assertEqual(response.data["status"], "completed")
+        self.assertIsNotNone(response.data["imageUrl"])
+
+    def test_outfit_without_items_fails_without_retrying(self):
+        outfit = self.seed_outfit()
+        job = enqueue_generation(outfit)
+        WardrobeItem.objects.filter(user_profile=self.profile).delete()
+
+        run_generation_job(
+            claim_next_generation_job(), MicroBatcher(mock.Mock(), max_batch_size=1, max_wait=0)
+        )
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 1)
+
+    def test_stale_job_without_attempts_left_is_failed_and_refunded(self):
+        stalled = enqueue_generation(self.seed_outfit())
+        retried = enqueue_generation(self.seed_outfit())
+        long_ago = timezone.now() - GENERATION_STALE_JOB_TIMEOUT - timedelta(seconds=1)
+        GenerationJob.objects.filter(id=stalled.id).update(
+            status=GenerationJob.STATUS_RUNNING, attempts=GENERATION_MAX_ATTEMPTS
+        )
+        GenerationJob.objects.filter(id=retried.id).update(
+            status=GenerationJob.STATUS_RUNNING, attempts=1
+        )
+        GenerationJob.objects.update(updated_at=long_ago)
+
+        self.assertEqual(claim_next_generation_job(), retried)
+        self.assertIsNone(claim_next_generation_job())
+        self.assertEqual(fail_exhausted_generation_jobs(), 1)
+
+        stalled.refresh_from_db()
+        self.assertEqual(stalled.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(get_quota_usage(self.profile.pk).day_used, 1)
+
+    @skipUnless(importlib.util.find_spec("PIL"), "Pillow is not installed")
+    def test_undecodable_input_fails_without_retrying(self):
+        outfit = self.seed_outfit()
+        job = enqueue_generation(outfit)
+        image_path = self.item_paths(outfit)[0]
+        get_backend().delete(generate_prepared_input_path(image_path))
+        get_backend().save(image_path, b"not an image", "image/heic")
+
+        run_generation_job(
+            claim_next_generation_job(), MicroBatcher(mock.Mock(), max_batch_size=1, max_wait=0)
+        )
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (GenerationJob.STATUS_FAILED, 1))
+        self.assertIn(image_path, job.last_error)
+        self.assertEqual(get_quota_usage(self.profile.pk).day_used, 0)
+
+    def test_upstream_failure_is_retried(self):
+        job = enqueue_generation(self.seed_outfit())
+
+        def handler(batch):
+            raise GenerationError("upstream unavailable")
+
+        run_generation_job(
+            claim_next_generation_job(), MicroBatcher(handler, max_batch_size=1, max_wait=0)
+        )
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_PENDING)
+        self.assertEqual(job.last_error, "upstream unavailable")
+
+    def test_outfit_without_mannequin_is_rejected(self):
+        outfit = self.seed_outfit(with_mannequin=False)
+
+        response = self.client.post(
+            reverse("outfit_render", args=[outfit.id]), HTTP_AUTHORIZATION="Bearer test-token"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GenerationJob.objects.exists())
+
+    @override_settings(GENERATION_QUOTA_DAILY=2)
+    def test_daily_quota_rejects_renders_until_it_resets(self):
+        outfits = [self.seed_outfit() for _ in range(3)]
+        for outfit in outfits[:2]:
+            response = self.client.post(
+                reverse("outfit_render", args=[outfit.id]), HTTP_AUTHORIZATION="Bearer test-token"
+            )
+            self.assertEqual(response.status_code, 202)
+
+        response = self.client.post(
+            reverse("outfit_render", args=[outfits[2].id]), HTTP_AUTHORIZATION="Bearer test-token"
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(GenerationJob.objects.count(), 2)
+
+        response = self.client.get(
+            reverse("generation_quota"), HTTP_AUTHORIZATION="Bearer test-token"
+        )
+        self.assertEqual((response.data["daily"]["used"], response.data["daily"]["limit"]), (2, 2))
+
+    @override_settings(GENERATION_QUOTA_DAILY=2)
+    def test_counters_move_to_a_new_day_in_the_same_update(self):
+        evening = datetime(2026, 3, 1, 23, tzinfo=dt_timezone.utc)
+        charge_generation(self.profile.pk, now=evening)
+        with CaptureQueriesContext(connection) as queries:
+            charge_generation(self.profile.pk, now=evening)
+        # The check and the increment are one UPDATE, not a read followed by a write
+        quota_queries = [query["sql"] for query in queries if "generation_quotas" in query["sql"]]
+        self.assertEqual(len(quota_queries), 1)
+        self.assertTrue(quota_queries[0].lstrip().startswith("UPDATE"))
+        with self.assertRaises(QuotaExceededError):
+            charge_generation(self.profile.pk, now=evening)
+
+        usage = charge_generation(self.profile.pk, now=evening + timedelta(hours=2))
+
+        self.assertEqual(usage, QuotaUsage(1, 2, 3, settings.GENERATION_QUOTA_MONTHLY))
+
+    def test_concurrent_enqueue_returns_the_first_job(self):
+        outfit = self.seed_outfit()
+        job = enqueue_generation(outfit)
+        first = QuerySet.first
+        lookups = []
+
+        def first_before_the_other_insert(queryset):
+            # The second request looked for an unfinished job before the first inserted it
+            lookups.append(queryset)
+            return None if len(lookups) == 1 else first(queryset)
+
+        with mock.patch.object(
+            QuerySet, "first", autospec=True, side_effect=first_before_the_other_insert
+        ):
+            self.assertEqual(enqueue_generation(outfit), job)
+
+        self.assertEqual(GenerationJob.objects.filter(outfit=outfit).count(), 1)
+        self.assertEqual(get_quota_usage(self.profile.pk).day_used, 1)
+
+    def test_failed_render_is_refunded(self):
+        job = enqueue_generation(self.seed_outfit())
+        self.assertEqual(get_quota_usage(self.profile.pk).day_used, 1)
+        WardrobeItem.objects.filter(user_profile=self.profile).delete()
+
+        run_generation_job(
+            claim_next_generation_job(), MicroBatcher(mock.Mock(), max_batch_size=1, max_wait=0)
+        )
+
+        self.assertEqual(get_quota_usage(self.profile.pk).day_used, 0)
+        self.assertEqual(
+            list(GenerationUsageEvent.objects.filter(job=job).values_list("amount", flat=True)),
+            [1, -1],
+        )
+
+    def test_rollup_folds_completed_days_of_the_ledger(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        for amount in (1, 1, -1):
+            GenerationUsageEvent.objects.create(
+                user_profile=self.profile, amount=amount, created_at=yesterday
+            )
+        GenerationUsageEvent.objects.create(user_profile=self.profile, amount=1)
+
+        self.assertEqual(rollup_usage_events(batch_size=2), 3)
+        self.assertEqual(rollup_usage_events(), 0)
+
+        rollup = GenerationUsageRollup.objects.get(user_profile=self.profile)
+        self.assertEqual((rollup.day, rollup.charged, rollup.refunded), (yesterday.date(), 2, 1))
+        self.assertEqual(GenerationUsageEvent.objects.count(), 1)
+
+
+class TimeOrderedIdTests(TestCase):
+    def test_ids_increase_within_a_millisecond(self):
+        ids = [uuid7() for _ in range(1000)]
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(value.version == 7 for value in ids))
+        self.assertEqual(str(ids[0]), str(uuid.UUID(str(ids[0]))))
+
+    def test_generation_time(self):
+        before = timezone.now() - timedelta(milliseconds=1)
+        created_at = uuid7_time(uuid7())
+
+        self.assertLessEqual(before, created_at)
+        self.assertLessEqual(created_at, timezone.now() + timedelta(milliseconds=1))
+        with self.assertRaises(ValueError):
+            uuid7_time(uuid.uuid4())
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    RATE_LIMIT_STORE="accounts.ratelimit.InMemoryRateLimitStore",
+)
+class SessionTokenTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        self.verify_id_token = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        get_rate_limit_store.cache_clear()
+        get_epoch_cache.cache_clear()
+
+        user = User.objects.create_user(username="budget@example.com", email="budget@example.com")
+        self.profile = UserProfile.objects.create(user=user, firebase_uid=FIREBASE_UID)
+
+    def request(self, method, url_name, token):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                reverse(url_name), HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+        return response, count_queries(queries)
+
+    def start_session(self):
+        response, _ = self.request("post", "session_create", "firebase-token")
+        self.assertEqual(response.status_code, 200)
+        return response.data["token"]
+
+    def test_session_token_skips_firebase_and_database(self):
+        token = self.start_session()
+        self.assertEqual(self.verify_id_token.call_count, 1)
+
+        _, firebase_queries = self.request("get", "wardrobe_list", "firebase-token")
+        self.request("get", "wardrobe_list", token)
+        response, session_queries = self.request("get", "wardrobe_list", token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.verify_id_token.call_count, 2)
+        self.assertEqual(session_queries, firebase_queries - 1)
+
+        # Fields not in the token are loaded on demand, all with one query
+        response, queries = self.request("get", "current_user", token)
+        self.assertEqual(response.data["email"], "budget@example.com")
+        self.assertEqual(response.data["date_joined"], self.profile.user.date_joined.isoformat())
+        self.assertEqual(queries, 1)
+
+    def test_revoked_expired_and_forged_tokens_are_rejected(self):
+        token = self.start_session()
+        expired, _ = issue_session_token(self.profile, now=time.time() - 2 * 3600)
+        prefix, payload, signature = token.split(".")
+        forged = f"{prefix}.{payload}.{signature[::-1]}"
+
+        for bad_token, error in [
+            (expired, "Session token has expired"),
+            (forged, "Invalid session token"),
+        ]:
+            response, _ = self.request("get", "wardrobe_list", bad_token)
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(str(response.data["detail"]), error)
+
+        self.assertEqual(self.request("post", "session_revoke", token)[0].status_code, 200)
+        response, _ = self.request("get", "wardrobe_list", token)
+        self.assertEqual(str(response.data["detail"]), "Session has been revoked")
+        self.assertEqual(
+            self.request("get", "wardrobe_list", self.start_session())[0].status_code, 200
+        )
+
+    def test_session_token_cannot_start_a_session(self):
+        response, _ = self.request("post", "session_create", self.start_session())
+
+        self.assertEqual(response.status_code, 403)
+
+
+class MetricsEndpointTests(TestCase):
+    def scrape(self, **headers):
+        return self.client.get(reverse("metrics"), **headers)
+
+    @override_settings(METRICS_TOKEN="metrics-token")
+    def test_scrape_reports_requests_by_url_pattern(self):
+        path = reverse("generation_job", args=[uuid7()])
+        self.client.get(path)
+
+        response = self.scrape(HTTP_AUTHORIZATION="Bearer metrics-token")
+
+        self.assertEqual(response.status_code, 200)
+        # Labelled with the pattern, not the path with the job id
+        self.assertIn(
+            'ctrlchic_http_request_duration_seconds_count{method="GET",'
+            'route="api/auth/generation-jobs/<str:job_id>/",status="403"}',
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_TOKEN="metrics-token")
+    def test_scrape_requires_the_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_scrape_without_a_token_is_refused_outside_development(self):
+        self.assertEqual(self.scrape().status_code, 403)
+
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.scrape().status_code, 200)
+
+
+class StoragePoolMetricsTests(TestCase):
+    def sample(self, name):
+        return REGISTRY.get_sample_value(name) or 0.0
+
+    def test_calls_beyond_the_pool_size_count_as_saturated(self):
+        manager = StorageClientManager(
+            pool_size=2, connect_timeout=1, read_timeout=1, call_deadline=1
+        )
+        calls = self.sample("ctrlchic_storage_pool_calls_total")
+        saturated = self.sample("ctrlchic_storage_pool_saturated_calls_total")
+        in_flight = self.sample("ctrlchic_storage_pool_calls_in_flight")
+
+        with manager.track(), manager.track():
+            with manager.track():
+                self.assertEqual(
+                    self.sample("ctrlchic_storage_pool_calls_in_flight"), in_flight + 3
+                )
+
+        self.assertEqual(self.sample("ctrlchic_storage_pool_calls_total"), calls + 3)
+        self.assertEqual(self.sample("ctrlchic_storage_pool_saturated_calls_total"), saturated + 1)
+        self.assertEqual(self.sample("ctrlchic_storage_pool_calls_in_flight"), in_flight)
+        self.assertEqual(manager.stats()["peak_in_flight"], 3)
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "firebase_admin.auth.verify_id_token",
+            return_value={"uid": FIREBASE_UID, "email": "budget@example.com"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("accounts.authentication.get_firebase_app")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(tracing.shutdown_tracing)
+
+    def traced_queries(self, sample_ratio):
+        tracing.configure_tracing(enabled=True, sample_ratio=sample_ratio, exporter="memory")
+        with mock.patch("accounts.tracing.trace_query", wraps=tracing.trace_query) as wrapper:
+            response = self.client.get(
+                reverse("current_user"), HTTP_AUTHORIZATION="Bearer test-token"
+            )
+        self.assertEqual(response.status_code, 200)
+        return wrapper.call_count
+
+    def test_queries_are_only_wrapped_in_sampled_traces(self):
+        self.assertGreater(self.traced_queries(1.0), 0)
+        self.assertEqual(self.traced_queries(0.0), 0)
+
+    def test_loading_the_app_does_not_configure_tracing(self):
+        # A fresh interpreter, standing in for the preloading gunicorn master
+        code = (
+            "import threading, django; django.setup(); import config.urls; "
+            "from accounts import tracing; "
+            "print(tracing._provider is None, threading.active_count()); "
+            "print(tracing.is_enabled(), tracing._provider is not None)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": "config.settings",
+                "TRACING_ENABLED": "True",
+                "TRACING_EXPORTER": "memory",
+            },
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.split("\n")[:2], ["True 1", "True True"])
+
+
+@override_settings(
+    STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+    STORAGE_BACKEND_OPTIONS={},
+    HEALTH_PROBE_TIMEOUT=0.2,
+    HEALTH_CACHE_SECONDS=0,
+)
+class HealthCheckTests(TestCase):
+    def setUp(self):
+        health._cached_results.clear()
+        health._running.clear()
+        self.addCleanup(health._running.clear)
+
+    def test_readiness_probes_only_the_database(self):
+        response = self.client.get(reverse("health_ready"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()["checks"]), ["database"])
+        self.assertEqual(response.json()["checks"]["database"]["status"], "ok")
+
+    def test_dependencies_probe_storage_and_firebase(self):
+        with mock.patch("accounts.firebase.is_configured", return_value=False):
+            response = self.client.get(reverse("health_dependencies"))
+
+        checks = response.json()["checks"]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {name: check["status"] for name, check in checks.items()},
+            {"database": "ok", "storage": "ok", "firebase": "skipped"},
+        )
+
+    def test_stalled_probe_times_out_without_piling_up(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        stalled = mock.Mock(side_effect=lambda: release.wait(5) and {})
+
+        with (
+            mock.patch.dict(health.PROBES, {"storage": stalled}),
+            mock.patch("accounts.firebase.is_configured", return_value=False),
+        ):
+            for _ in range(3):
+                response = self.client.get(reverse("health_dependencies"))
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.json()["checks"]["storage"]["status"], "timeout")
+
+            # The database is still reported, and readiness doesn't depend on storage
+            self.assertEqual(response.json()["checks"]["database"]["status"], "ok")
+            self.assertEqual(self.client.get(reverse("health_ready")).status_code, 200)
+
+        self.assertEqual(stalled.call_count, 1)
+
+    def test_cached_results_are_reused(self):
+        with override_settings(HEALTH_CACHE_SECONDS=60):
+            self.assertFalse(self.client.get(reverse("health_ready")).json()["cached"])
+            self.assertTrue(self.client.get(reverse("health_ready")).json()["cached"])
+
+
+class LazyFirebaseTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, firebase, "_app", None)
+        firebase._app = None
+
+    @override_settings(FIREBASE_CREDENTIALS_JSON="", FIREBASE_CREDENTIALS_PATH="")
+    def test_unconfigured_app_is_not_initialized(self):
+        self.assertFalse(firebase.warmup())
+        with self.assertRaises(ImproperlyConfigured):
+            firebase.get_app()
+
+    @override_settings(
+        FIREBASE_CREDENTIALS_JSON='{"type": "service_account"}',
+        STORAGE_BACKEND="accounts.storage_backends.InMemoryStorageBackend",
+        STORAGE_BACKEND_OPTIONS={},
+    )
+    def test_app_is_initialized_once_on_first_use(self):
+        app = mock.Mock(project_id="test-project")
+        with (
+            mock.patch("firebase_admin.get_app", side_effect=ValueError),
+            mock.patch("firebase_admin.credentials.Certificate") as certificate,
+            mock.patch("firebase_admin.initialize_app", return_value=app) as initialize_app,
+        ):
+            threads = [threading.Thread(target=firebase.get_app) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertTrue(firebase.warmup())
+            self.assertIs(firebase.get_app(), app)
+
+        certificate.assert_called_once_with({"type": "service_account"})
+        initialize_app.assert_called_once()
+
+    def test_loading_the_api_does_not_import_the_sdk(self):
+        # A fresh interpreter, as this one has imported the SDK already
+        code = (
+            "import sys, django; django.setup(); "
+            "from rest_framework.settings import api_settings; import config.urls; "
+            "api_settings.DEFAULT_AUTHENTICATION_CLASSES; "
+            "print(sorted(name for name in sys.modules if name.startswith('firebase_admin')))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings"},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    @override_settings(FIREBASE_CREDENTIALS_JSON="not json")
+    def test_invalid_credentials_fail_warmup_without_raising(self):
+        with mock.patch("firebase_admin.get_app", side_effect=ValueError):
+            self.assertFalse(firebase.warmup())
+            with self.assertRaises(ImproperlyConfigured):
+                firebase.get_app()
+
+
+class LocalStorageCachingTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        overrides = override_settings(
+            STORAGE_BACKEND="accounts.storage_backends.LocalFileSystemStorageBackend",
+            STORAGE_BACKEND_OPTIONS={"root": root.name},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_listing_pages_follow_name_order_and_skip_partial_uploads(self):
+        backend = get_backend()
+        names = [
+            "users/a-b/x.jpg",
+            "users/a.jpg",
+            "users/a/b/c.jpg",
+            "users/a/b.jpg",
+            "users/a/z.jpg",
+            "users/ab/x.jpg",
+            "other/x.jpg",
+        ]
+        for name in names:
+            backend.save(name, b"image", "image/jpeg")
+        (backend.root / "users/a/.upload-partial").write_bytes(b"ima")
+
+        listed, page_token = [], None
+        while True:
+            files, page_token = backend.list("users/a", page_token, page_size=2)
+            listed += [stored.path for stored in files]
+            if page_token is None:
+                break
+
+        self.assertEqual(listed, sorted(name for name in names if name.startswith("users/a")))
+        files, _ = backend.list("users/", match_glob="users/*/b/*")
+        self.assertEqual([stored.path for stored in files], ["users/a/b/c.jpg"])
+        with self.assertRaises(ValueError):
+            backend.list("../")
+
+    def test_immutable_object_is_cacheable_and_revalidates(self):
+        image_path = generate_wardrobe_item_path(FIREBASE_UID, "top", str(uuid.uuid4()), "jpg")
+        get_backend().save(image_path, b"image", "image/jpeg")
+        url = sign_download_url(image_path)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+
+class AdminQueryBudgetTests(TestCase):
+    def setUp(self):
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(admin_user)
+
+    def seed_items(self, count):
+        start = UserProfile.objects.count()
+        for index in range(start, start + count):
+            user = User.objects.create_user(
+                username=f"user{index}@example.com", email=f"user{index}@example.com"
+            )
+            profile = UserProfile.objects.create(user=user, firebase_uid=f"uid-{index}")
+            WardrobeItem.objects.create(
+                user_profile=profile,
+                category="top",
+                image_path=f"users/uid-{index}/wardrobe/tops/item.jpg",
+                image_url="https://example.com/item.jpg",
+            )
+
+    def changelist_queries(self):
+        url = reverse("admin:accounts_wardrobeitem_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return count_queries(queries)
+
+    def test_wardrobe_changelist_is_constant_in_row_count(self):
+        self.seed_items(1)
+        few_queries = self.changelist_queries()
+
+        self.seed_items(20)
+        self.assertEqual(self.changelist_queries(), few_queries)
@@ -0,0 +1,191 @@
+"""
+Opt-in OpenTelemetry tracing.
+
+With TRACING_ENABLED, each request gets a server span (continuing a W3C
+``traceparent`` from the caller when present) with child spans for
+authentication, every storage call and every database query. Spans go to an
+OTLP/HTTP collector or, offline, to a JSON-lines file. Only the exporter and
+SDK are imported lazily, when tracing is configured.
+
+Tracing is configured on first use in each process rather than at app load:
+with gunicorn's preload the app is loaded in the master, and the exporter's
+connection (or file) and the span processor's thread must belong to the
+worker that uses them. Workers configure it after boot (gunicorn.conf.py).
+
+TRACING_SAMPLE_RATIO bounds the overhead: a trace is sampled by trace ID
+(ParentBased(TraceIdRatioBased)) and inside an unsampled trace no child spans
+are created at all, so unsampled requests pay for one no-op span. Measure the
+overhead at a given ratio with ``python manage.py benchmark_tracing``.
+
+Once configured, when tracing is disabled every helper here reduces to a None check.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+import functools
+import os
+import threading
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.http import HttpRequest
+from opentelemetry import trace
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+_tracer = None
+_provider = None
+_configured = False
+_configure_lock = threading.Lock()
+_propagator = TraceContextTextMapPropagator()
+
+
+def _build_exporter(exporter: str):
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+
+    if exporter == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        # One JSON document per line, appended by every worker process
+        return ConsoleSpanExporter(
+            out=open(settings.TRACING_FILE_PATH, "a", buffering=1),
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+
+    if exporter == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+        return InMemorySpanExporter()
+
+    raise ValueError(f"Unknown TRACING_EXPORTER: {exporter}")
+
+
+def configure_tracing(
+    enabled: Optional[bool] = None,
+    sample_ratio: Optional[float] = None,
+    exporter: Optional[str] = None,
+) -> None:
+    """
+    (Re)configure tracing for this process from settings.
+
+    Arguments override the corresponding TRACING_* settings (used by
+    benchmark_tracing to compare configurations in one process).
+    """
+    global _tracer, _provider, _configured
+
+    shutdown_tracing()
+    _configured = True
+
+    if not (settings.TRACING_ENABLED if enabled is None else enabled):
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    ratio = settings.TRACING_SAMPLE_RATIO if sample_ratio is None else sample_ratio
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(ratio)),
+    )
+    # Spans are exported from a background thread in batches, off the request path
+    provider.add_span_processor(
+        BatchSpanProcessor(_build_exporter(exporter or settings.TRACING_EXPORTER))
+    )
+
+    _provider = provider
+    _tracer = provider.get_tracer("ctrlchic")
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans and disable tracing (until configure_tracing is called)."""
+    global _tracer, _provider, _configured
+
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = None
+    _provider = None
+    _configured = True
+
+
+def ensure_configured() -> None:
+    """Configure tracing from settings unless this process has done so already."""
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                configure_tracing()
+
+
+def is_enabled() -> bool:
+    ensure_configured()
+    return _tracer is not None
+
+
+def _should_trace() -> bool:
+    """Whether a new span may be sampled: tracing is on and this isn't an unsampled trace."""
+    if not is_enabled():
+        return False
+    span = trace.get_current_span()
+    return span.is_recording() or not span.get_span_context().is_valid
+
+
+def start_span(name: str, attributes: Optional[dict] = None):
+    """Context manager for a child span of the current span (no-op when not traced)."""
+    if not _should_trace():
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def traced(name: str) -> Callable:
+    """Decorator that runs the function inside a span."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _should_trace():
+                return func(*args, **kwargs)
+            with _tracer.start_as_current_span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def request_span(request: HttpRequest) -> Iterator:
+    """
+    Server span for one request, continuing the caller's trace if it sent one.
+
+    Yields the span so the caller can name it and record the response status
+    once the view has run.
+    """
+    carrier = {}
+    if "HTTP_TRACEPARENT" in request.META:
+        carrier["traceparent"] = request.META["HTTP_TRACEPARENT"]
+        carrier["tracestate"] = request.META.get("HTTP_TRACESTATE", "")
+    parent_context = _propagator.extract(carrier)
+
+    with _tracer.start_as_current_span(
+        f"{request.method} {request.path}",
+        context=parent_context,
+        kind=trace.SpanKind.SERVER,
+        attributes={"http.request.method": request.method, "url.path": request.path},
+    ) as span:
+        yield span
+
+
+def trace_query(execute, sql, params, many, context):
+    """Database execute wrapper that adds a span per query (install in sampled traces only)."""
+    with _tracer.start_as_current_span(
+        "db.query",
+        kind=trace.SpanKind.CLIENT,
+        attributes={
+            "db.system": context["connection"].vendor,
+            "db.statement": sql,
+        },
+    ):
+        return execute(sql, params, many, context)
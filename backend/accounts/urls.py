@@ -1,18 +1,53 @@
 from django.urls import path
 
-from . import mannequin_views, views, wardrobe_views
+from . import (
+    local_storage_views,
+    mannequin_views,
+    outfit_views,
+    storage_event_views,
+    views,
+    wardrobe_views,
+)
 
 urlpatterns = [
     path("me/", views.get_current_user, name="current_user"),
+    path("me/delete/", views.delete_account, name="delete_account"),
     path("test/", views.auth_test, name="auth_test"),
+    path("session/", views.create_session, name="session_create"),
+    path("session/revoke/", views.revoke_all_sessions, name="session_revoke"),
     # Mannequin image endpoints
     path("mannequin/upload-url/", mannequin_views.get_upload_url, name="mannequin_upload_url"),
     path("mannequin/confirm/", mannequin_views.confirm_upload, name="mannequin_confirm"),
     path("mannequin/", mannequin_views.get_mannequin, name="mannequin_get"),
     path("mannequin/delete/", mannequin_views.delete_mannequin, name="mannequin_delete"),
+    path("mannequin/poses/", mannequin_views.list_poses, name="mannequin_poses"),
+    path(
+        "mannequin/poses/<str:mannequin_id>/default/",
+        mannequin_views.set_default_pose,
+        name="mannequin_pose_default",
+    ),
+    path(
+        "mannequin/poses/<str:mannequin_id>/",
+        mannequin_views.delete_pose,
+        name="mannequin_pose_delete",
+    ),
     # Wardrobe endpoints
     path("wardrobe/upload-url/", wardrobe_views.get_upload_url, name="wardrobe_upload_url"),
     path("wardrobe/confirm/", wardrobe_views.confirm_upload, name="wardrobe_confirm"),
     path("wardrobe/", wardrobe_views.list_items, name="wardrobe_list"),
     path("wardrobe/<str:item_id>/", wardrobe_views.delete_item, name="wardrobe_delete"),
+    # Outfit history and favorites
+    path("outfits/", outfit_views.outfits, name="outfits"),
+    path("outfits/<str:outfit_id>/", outfit_views.outfit_detail, name="outfit_detail"),
+    path("outfits/<str:outfit_id>/render/", outfit_views.render_outfit, name="outfit_render"),
+    path("generation-jobs/<str:job_id>/", outfit_views.generation_job, name="generation_job"),
+    path("generation-quota/", outfit_views.generation_quota, name="generation_quota"),
+    # Cloud Storage upload notifications (Pub/Sub push)
+    path("storage/events/", storage_event_views.ingest_storage_events, name="storage_events"),
+    # Signed URLs issued by the local filesystem storage backend
+    path(
+        "storage/local/<path:file_path>",
+        local_storage_views.local_storage_file,
+        name="local_storage_file",
+    ),
 ]
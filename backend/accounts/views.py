@@ -1,10 +1,19 @@
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from .firebase import delete_user as delete_firebase_user
+from .ratelimit import rate_limit
+from .sessions import SessionClaims, get_epoch_cache, issue_session_token, revoke_sessions
+
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -61,3 +70,91 @@ def auth_test(request: Request) -> Response:
         return Response(
             {"authenticated": False, "message": "No authentication credentials provided"}
         )
+
+
+@api_view(["DELETE"])
+@permission_classes([IsAuthenticated])
+def delete_account(request: Request) -> Response:
+    """
+    Delete the authenticated user's account.
+
+    The Firebase user is deleted first, so their tokens can't sign them
+    back in and re-create the account. The user, profile and wardrobe rows
+    are removed immediately; storage objects are purged by a background job
+    so large accounts don't time out the request.
+
+    Returns:
+        {
+            "success": true,
+            "message": "Account deleted successfully"
+        }
+    """
+    user: User = request.user
+    user_profile_id = user.profile.id
+
+    # Nothing is deleted unless Firebase is, so the request can simply be retried
+    try:
+        delete_firebase_user(user.profile.firebase_uid)
+    except Exception as e:
+        return Response(
+            {"error": f"Failed to delete the sign-in account: {str(e)}"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+    # Profile deletion queues the storage purge in the same transaction
+    with transaction.atomic():
+        user.delete()
+    # Session tokens of the account stop working here right away, elsewhere
+    # within SESSION_EPOCH_CHECK_INTERVAL
+    get_epoch_cache().forget(user_profile_id)
+
+    return Response({"success": True, "message": "Account deleted successfully"})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@rate_limit("session")
+def create_session(request: Request) -> Response:
+    """
+    Exchange a Firebase ID token for an app session token.
+
+    Authenticate with the Firebase ID token; afterwards send the session token
+    in its place (Authorization: Bearer <token>) until it expires, then
+    exchange a fresh Firebase ID token again.
+
+    Returns:
+        {
+            "token": "st1.<payload>.<signature>",
+            "expiresAt": "2024-01-01T13:00:00+00:00",
+            "expiresIn": 3600
+        }
+    """
+    if isinstance(request.auth, SessionClaims):
+        return Response(
+            {"error": "A Firebase ID token is required to start a session"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    token, expires_at = issue_session_token(request.user.profile)
+    return Response(
+        {
+            "token": token,
+            "expiresAt": datetime.fromtimestamp(expires_at, tz=dt_timezone.utc).isoformat(),
+            "expiresIn": settings.SESSION_TOKEN_TTL,
+        }
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def revoke_all_sessions(request: Request) -> Response:
+    """
+    Revoke every session token of the authenticated user ("sign out everywhere").
+
+    Firebase ID tokens are not affected; clients sign out of Firebase themselves.
+
+    Returns:
+        {"success": true}
+    """
+    revoke_sessions(request.user.profile)
+    return Response({"success": True})
@@ -4,22 +4,31 @@ import logging
 import uuid
 
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from .models import WardrobeItem
+from .ids import uuid7
+from .load_shedding import StorageUnavailableError, shed_load
+from .metrics import record_cache_lookup
+from .models import PendingUpload, WardrobeItem
+from .ratelimit import rate_limit
 from .storage import (
     ALLOWED_IMAGE_EXTENSIONS,
     MAX_FILE_SIZE_BYTES,
     MAX_FILE_SIZE_MB,
+    UPLOAD_URL_EXPIRATION,
     delete_file,
     file_exists,
+    generate_prepared_input_path,
     generate_wardrobe_item_path,
-    get_download_url,
     get_signed_upload_url,
+    sign_download_url,
+    upload_headers,
     validate_file_extension,
 )
 
@@ -30,6 +39,8 @@ VALID_CATEGORIES = ["top", "bottom"]
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@rate_limit("upload_url")
+@shed_load
 def get_upload_url(request: Request) -> Response:
     """
     Get signed URL for wardrobe item upload.
@@ -45,9 +56,12 @@ def get_upload_url(request: Request) -> Response:
     Returns:
         {
             "uploadUrl": "https://storage.googleapis.com/...",
+            "uploadHeaders": {"Content-Type": "image/jpeg", "Cache-Control": "..."},
             "itemId": "550e8400-e29b-41d4-a716-446655440000",
             "filePath": "users/abc123/wardrobe/tops/550e8400-..."
         }
+
+        The upload must send uploadHeaders.
     """
     user: User = request.user
 
@@ -103,8 +117,8 @@ def get_upload_url(request: Request) -> Response:
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # Generate new UUID for item
-    item_id = uuid.uuid4()
+    # Time-ordered, so new items are appended to the end of the primary key index
+    item_id = uuid7()
 
     # Generate storage path
     firebase_uid = user.profile.firebase_uid
@@ -122,11 +136,40 @@ def get_upload_url(request: Request) -> Response:
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    return Response({"uploadUrl": upload_url, "itemId": str(item_id), "filePath": file_path})
+    # Reserve the item so confirm is a primary key lookup instead of path parsing
+    PendingUpload.objects.create(
+        id=item_id,
+        user_profile=user.profile,
+        category=category,
+        image_path=file_path,
+        content_type=content_type,
+        expected_size=file_size_int,
+        expires_at=timezone.now() + UPLOAD_URL_EXPIRATION,
+    )
+
+    return Response(
+        {
+            "uploadUrl": upload_url,
+            "uploadHeaders": upload_headers(file_path, content_type),
+            "itemId": str(item_id),
+            "filePath": file_path,
+        }
+    )
+
+
+def _serialize_item(item: WardrobeItem) -> dict:
+    """Serialize a wardrobe item for API responses."""
+    return {
+        "id": str(item.id),
+        "category": item.category,
+        "url": item.image_url,
+        "uploadedAt": item.uploaded_at.isoformat(),
+    }
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@shed_load
 def confirm_upload(request: Request) -> Response:
     """
     Confirm wardrobe item upload and create database record.
@@ -164,24 +207,26 @@ def confirm_upload(request: Request) -> Response:
     except ValueError:
         return Response({"error": "Invalid itemId format"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # SECURITY: Verify filePath belongs to this user
-    if not file_path.startswith(f"users/{user.profile.firebase_uid}/wardrobe/"):
-        return Response(
-            {"error": "Invalid filePath. Path does not belong to authenticated user."},
-            status=status.HTTP_403_FORBIDDEN,
-        )
+    profile = user.profile
 
-    # Extract category from path
-    path_parts = file_path.split("/")
-    if len(path_parts) < 4:
-        return Response({"error": "Invalid filePath format"}, status=status.HTTP_400_BAD_REQUEST)
+    # Look up the reservation issued with the upload URL (scoped to this user)
+    reservation = PendingUpload.objects.filter(id=item_id, user_profile=profile).first()
+    if reservation is None:
+        # Retried confirm: the item was already created, so return it unchanged
+        existing_item = WardrobeItem.objects.filter(id=item_id, user_profile=profile).first()
+        if existing_item is not None:
+            return Response({"success": True, "item": _serialize_item(existing_item)})
 
-    category_plural = path_parts[3]  # tops or bottoms
-    category = category_plural.rstrip("s")  # top or bottom
+        return Response(
+            {"error": "Upload not found. The upload URL may have expired."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
 
-    if category not in VALID_CATEGORIES:
+    # SECURITY: Only the exact path the upload URL was signed for can be confirmed
+    if file_path != reservation.image_path:
         return Response(
-            {"error": "Invalid category in filePath"}, status=status.HTTP_400_BAD_REQUEST
+            {"error": "Invalid filePath. Path does not belong to authenticated user."},
+            status=status.HTTP_403_FORBIDDEN,
         )
 
     # Verify file exists in storage
@@ -191,40 +236,30 @@ def confirm_upload(request: Request) -> Response:
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    # Get download URL
+    # Get download URL (existence was just checked, so only sign it)
     try:
-        download_url = get_download_url(file_path)
-        if not download_url:
-            return Response(
-                {"error": "Failed to generate download URL"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        download_url = sign_download_url(file_path)
     except Exception as e:
         return Response(
             {"error": f"Failed to get download URL: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    # Create wardrobe item record
-    wardrobe_item = WardrobeItem.objects.create(
-        id=item_id,
-        user_profile=user.profile,
-        category=category,
-        image_path=file_path,
-        image_url=download_url,
-    )
-
-    return Response(
-        {
-            "success": True,
-            "item": {
-                "id": str(wardrobe_item.id),
-                "category": wardrobe_item.category,
-                "url": wardrobe_item.image_url,
-                "uploadedAt": wardrobe_item.uploaded_at.isoformat(),
+    # Create the item and consume the reservation together; concurrent retries
+    # converge on the same row instead of failing on the primary key
+    with transaction.atomic():
+        wardrobe_item, _ = WardrobeItem.objects.get_or_create(
+            id=reservation.id,
+            defaults={
+                "user_profile": profile,
+                "category": reservation.category,
+                "image_path": reservation.image_path,
+                "image_url": download_url,
             },
-        }
-    )
+        )
+        reservation.delete()
+
+    return Response({"success": True, "item": _serialize_item(wardrobe_item)})
 
 
 @api_view(["GET"])
@@ -268,12 +303,14 @@ def list_items(request: Request) -> Response:
     # Refresh URLs and serialize
     items_data = []
     for item in items:
-        # Regenerate download URL (they expire after 7 days)
+        # Regenerate download URL (they expire after 7 days). A row exists only
+        # for confirmed uploads and wardrobe objects are never overwritten, so
+        # this is a local signature with no storage call, and it stays the same
+        # for a whole rotation period so browsers can cache the image.
         try:
-            fresh_url = get_download_url(item.image_path)
-            # Use fresh URL if available, otherwise fall back to stored URL
+            item_url = sign_download_url(item.image_path)
             # Don't save to database on GET request - keep it read-only
-            item_url = fresh_url if fresh_url else item.image_url
+            record_cache_lookup("signed_url", item_url == item.image_url)
 
             items_data.append(
                 {
@@ -293,6 +330,7 @@ def list_items(request: Request) -> Response:
 
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
+@shed_load
 def delete_item(request: Request, item_id: str) -> Response:
     """
     Delete specific wardrobe item.
@@ -319,9 +357,13 @@ def delete_item(request: Request, item_id: str) -> Response:
             {"error": "Item not found or does not belong to user"}, status=status.HTTP_404_NOT_FOUND
         )
 
-    # Delete from Firebase Storage
+    # Delete from Firebase Storage, with the generation input prepared from it (if any)
     try:
         delete_file(item.image_path)
+        delete_file(generate_prepared_input_path(item.image_path))
+    except StorageUnavailableError:
+        # Keep the row so the object isn't orphaned; the client retries later
+        raise
     except Exception as e:
         # Log but don't fail - continue with DB deletion
         logger.error(f"Error deleting file from storage: {e}")
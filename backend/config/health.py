@@ -0,0 +1,211 @@
+"""
+Liveness, readiness and dependency endpoints.
+
+Liveness only says the process can serve requests. Readiness, the load
+balancer's check, probes only what this instance needs to serve anything:
+its database connection. Storage and Firebase are shared by every instance,
+so an outage there would take all of them out of rotation at once without
+helping; requests degrade instead (see accounts.load_shedding). They are
+probed by the dependencies endpoint, for monitoring.
+
+Every probe carries its own deadline (HEALTH_PROBE_TIMEOUT: a connect and
+statement timeout for the database, a single attempt without retries for
+storage, a request timeout for Firebase), so probe threads finish rather
+than pile up behind a stalled dependency. A probe is never started again
+while its previous run is still going, so one slow dependency can't occupy
+the threads of the others. Results are cached per process for
+HEALTH_CACHE_SECONDS and concurrent requests share one probe run, so
+frequent health checks don't turn into load on the dependencies.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import math
+import threading
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, JsonResponse
+import requests
+
+# Public keys Firebase ID tokens are signed with; verify_id_token fetches these
+FIREBASE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+)
+
+# Object probed for storage reachability; it does not need to exist
+STORAGE_PROBE_PATH = "health/readiness-probe"
+
+_lock = threading.Lock()
+_running: dict[str, Future] = {}
+_cached_results: dict[str, tuple[dict, float]] = {}
+
+
+def check_database() -> dict:
+    timeout = settings.HEALTH_PROBE_TIMEOUT
+    if connection.vendor == "postgresql":
+        # Probes run on their own threads, so this only changes the probe's connection
+        options = dict(connection.settings_dict.get("OPTIONS", {}))
+        options["connect_timeout"] = max(math.ceil(timeout), 2)
+        options["options"] = f"-c statement_timeout={int(timeout * 1000)}"
+        connection.settings_dict = {**connection.settings_dict, "OPTIONS": options}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    finally:
+        # Don't leave a connection open per probe thread
+        connection.close()
+    return {}
+
+
+def check_storage() -> dict:
+    from accounts.storage_backends import get_storage_backend
+
+    # Any answer (even "not found") proves the bucket is reachable and authorized
+    get_storage_backend().probe(STORAGE_PROBE_PATH, timeout=settings.HEALTH_PROBE_TIMEOUT)
+    return {}
+
+
+def check_firebase_keys() -> dict:
+    from accounts.firebase import is_configured
+
+    if not is_configured():
+        return {"status": "skipped"}
+
+    response = requests.get(FIREBASE_CERTS_URL, timeout=settings.HEALTH_PROBE_TIMEOUT)
+    response.raise_for_status()
+    if not response.json():
+        raise ValueError("No signing keys published")
+
+    # Keys are rotated; report how long the current set may still be cached
+    max_age = None
+    for directive in response.headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name == "max-age" and value.isdigit():
+            max_age = int(value)
+    return {"keysMaxAge": max_age}
+
+
+PROBES: dict[str, Callable[[], dict]] = {
+    "database": check_database,
+    "storage": check_storage,
+    "firebase": check_firebase_keys,
+}
+
+# What the load balancer's readiness check waits for
+READINESS_PROBES = ("database",)
+
+# One thread per probe is enough, as a probe never runs twice at once
+_executor = ThreadPoolExecutor(max_workers=len(PROBES), thread_name_prefix="health-probe")
+
+
+def _timed(probe: Callable[[], dict]) -> dict:
+    started = time.perf_counter()
+    try:
+        result = {"status": "ok", **probe()}
+    except Exception as e:
+        result = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    result["latencyMs"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def run_probes(names: tuple[str, ...]) -> dict:
+    """Run dependency probes in parallel, reporting any that exceed the timeout."""
+    futures = {}
+    for name in names:
+        previous = _running.get(name)
+        if previous is not None and not previous.done():
+            # Still stuck since an earlier run; don't start a second one
+            futures[name] = previous
+        else:
+            futures[name] = _running[name] = _executor.submit(_timed, PROBES[name])
+
+    deadline = time.monotonic() + settings.HEALTH_PROBE_TIMEOUT
+    checks = {}
+    for name, future in futures.items():
+        try:
+            checks[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            checks[name] = {
+                "status": "timeout",
+                "latencyMs": round(settings.HEALTH_PROBE_TIMEOUT * 1000, 2),
+            }
+    return checks
+
+
+def probe_results(names: tuple[str, ...]) -> tuple[dict, bool]:
+    """Probe results, refreshed at most every HEALTH_CACHE_SECONDS. Returns (checks, cached)."""
+
+    def fresh() -> bool:
+        return all(
+            name in _cached_results
+            and time.monotonic() - _cached_results[name][1] < settings.HEALTH_CACHE_SECONDS
+            for name in names
+        )
+
+    if not fresh():
+        with _lock:
+            # Another request may have refreshed the results while we waited
+            if not fresh():
+                checks = run_probes(names)
+                now = time.monotonic()
+                _cached_results.update((name, (check, now)) for name, check in checks.items())
+                return checks, False
+
+    return {name: _cached_results[name][0] for name in names}, True
+
+
+def _probe_response(names: tuple[str, ...], ready_status: str) -> JsonResponse:
+    checks, cached = probe_results(names)
+    ready = all(check["status"] in ("ok", "skipped") for check in checks.values())
+    return JsonResponse(
+        {"status": ready_status if ready else "unavailable", "cached": cached, "checks": checks},
+        status=200 if ready else 503,
+    )
+
+
+def health_check(request: HttpRequest) -> JsonResponse:
+    """Simple health check endpoint"""
+    return JsonResponse(
+        {"status": "healthy", "message": "CtrlChic API is running", "version": "1.0.0"}
+    )
+
+
+def liveness(request: HttpRequest) -> JsonResponse:
+    """The process is up and serving requests; dependencies are not checked."""
+    return JsonResponse({"status": "alive"})
+
+
+def readiness(request: HttpRequest) -> JsonResponse:
+    """
+    Whether this instance should receive traffic (its database is reachable).
+
+    Returns 200 when the probes pass, else 503:
+        {
+            "status": "ready",
+            "cached": false,
+            "checks": {"database": {"status": "ok", "latencyMs": 1.2}}
+        }
+    """
+    return _probe_response(READINESS_PROBES, "ready")
+
+
+def dependencies(request: HttpRequest) -> JsonResponse:
+    """
+    Reachability of every dependency, for monitoring (not for load balancing).
+
+    Returns 200 when every probe passes (or is skipped), else 503:
+        {
+            "status": "ok",
+            "cached": false,
+            "checks": {
+                "database": {"status": "ok", "latencyMs": 1.2},
+                "storage": {"status": "ok", "latencyMs": 35.4},
+                "firebase": {"status": "ok", "keysMaxAge": 21600, "latencyMs": 48.0}
+            }
+        }
+    """
+    return _probe_response(tuple(PROBES), "ok")
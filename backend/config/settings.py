@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 from pathlib import Path
+import tempfile
 
 from decouple import config
 import dj_database_url
@@ -50,8 +52,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "accounts.middleware.RequestInstrumentationMiddleware",
+    "accounts.middleware.TracingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "accounts.middleware.RateLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -60,6 +65,26 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Return per-request DB query/storage call counts and timings as X-DB-*/X-Storage-* headers
+EXPOSE_REQUEST_METRICS = config("EXPOSE_REQUEST_METRICS", default=DEBUG, cast=bool)
+
+# Bearer token required to scrape /api/metrics/ (when empty, only served with DEBUG)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Readiness probes: per-dependency timeout and how long results are reused (seconds)
+HEALTH_PROBE_TIMEOUT = config("HEALTH_PROBE_TIMEOUT", default=2.0, cast=float)
+HEALTH_CACHE_SECONDS = config("HEALTH_CACHE_SECONDS", default=5.0, cast=float)
+
+# OpenTelemetry tracing (off by default). Exporters: "otlp" (collector over HTTP),
+# "file" (JSON lines at TRACING_FILE_PATH) or "memory" (discarded, for benchmarks)
+TRACING_ENABLED = config("TRACING_ENABLED", default=False, cast=bool)
+TRACING_SERVICE_NAME = config("TRACING_SERVICE_NAME", default="ctrlchic-backend")
+# Fraction of traces sampled; callers' sampling decisions are honoured
+TRACING_SAMPLE_RATIO = config("TRACING_SAMPLE_RATIO", default=0.05, cast=float)
+TRACING_EXPORTER = config("TRACING_EXPORTER", default="otlp")
+TRACING_OTLP_ENDPOINT = config("TRACING_OTLP_ENDPOINT", default="http://localhost:4318/v1/traces")
+TRACING_FILE_PATH = config("TRACING_FILE_PATH", default=str(BASE_DIR / "traces.jsonl"))
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -101,6 +126,37 @@ else:
         }
     }
 
+# Token-bucket rate limits: "capacity" is the allowed burst, "rate" the refill in
+# requests per second. "global" (per server) and "ip" apply to every API request
+# before authentication; the others per user on the endpoints that use them.
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMITS = {
+    "global": {"capacity": 2000, "rate": 500},
+    "ip": {"capacity": 120, "rate": 20},
+    "upload_url": {"capacity": 20, "rate": 0.5},
+    "generation": {"capacity": 5, "rate": 0.05},
+    "session": {"capacity": 10, "rate": 0.05},
+}
+# Counter store shared by all workers: the database (PostgreSQL only), Redis
+# (accounts.ratelimit.RedisRateLimitStore, needs the redis package) or per-process memory
+RATE_LIMIT_STORE = config(
+    "RATE_LIMIT_STORE",
+    default=(
+        "accounts.ratelimit.DatabaseRateLimitStore"
+        if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql"
+        else "accounts.ratelimit.InMemoryRateLimitStore"
+    ),
+)
+RATE_LIMIT_REDIS_URL = config("RATE_LIMIT_REDIS_URL", default="redis://localhost:6379/0")
+# The "global" limit is split between the worker processes of a server and kept
+# in memory (gunicorn.conf.py exports GUNICORN_WORKERS), so it applies per server
+RATE_LIMIT_PROCESSES = config(
+    "RATE_LIMIT_PROCESSES", default=config("GUNICORN_WORKERS", default=1, cast=int), cast=int
+)
+# Reverse proxies in front of the app; the client IP is taken from X-Forwarded-For
+# that many hops from the right (0: use the connection address)
+RATE_LIMIT_TRUSTED_PROXIES = config("RATE_LIMIT_TRUSTED_PROXIES", default=0, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -155,6 +211,7 @@ CORS_ALLOW_CREDENTIALS = True
 # Django REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        "accounts.authentication.SessionTokenAuthentication",
         "accounts.authentication.FirebaseAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -170,6 +227,82 @@ FIREBASE_CREDENTIALS_JSON = config("FIREBASE_CREDENTIALS_JSON", default="")
 # Firebase credentials file path (recommended for local development)
 FIREBASE_CREDENTIALS_PATH = config("FIREBASE_CREDENTIALS_PATH", default="")
 FIREBASE_STORAGE_BUCKET = config("FIREBASE_STORAGE_BUCKET", default="")
+# App session tokens (accounts.sessions), exchanged for a Firebase ID token so later
+# requests skip Firebase verification. Signed with SESSION_TOKEN_SECRET (default
+# SECRET_KEY); revoked sessions are noticed within SESSION_EPOCH_CHECK_INTERVAL seconds.
+SESSION_TOKEN_SECRET = config("SESSION_TOKEN_SECRET", default="")
+SESSION_TOKEN_TTL = config("SESSION_TOKEN_TTL", default=3600, cast=int)
+SESSION_EPOCH_CHECK_INTERVAL = config("SESSION_EPOCH_CHECK_INTERVAL", default=30, cast=float)
+# Storage backend (dotted path) and its constructor options. Alternatives for local
+# development and load testing:
+#   accounts.storage_backends.LocalFileSystemStorageBackend - files under MEDIA_ROOT
+#   accounts.storage_backends.InMemoryStorageBackend - in-process, with injectable latency
+STORAGE_BACKEND = config(
+    "STORAGE_BACKEND", default="accounts.storage_backends.FirebaseStorageBackend"
+)
+STORAGE_BACKEND_OPTIONS = config("STORAGE_BACKEND_OPTIONS", default="{}", cast=json.loads)
+# Storage HTTP client: connection pool shared by all threads of a worker process.
+# Size it to at least the worker's thread count plus the bulk delete concurrency.
+STORAGE_HTTP_POOL_SIZE = config("STORAGE_HTTP_POOL_SIZE", default=32, cast=int)
+STORAGE_CONNECT_TIMEOUT = config("STORAGE_CONNECT_TIMEOUT", default=3.05, cast=float)
+STORAGE_READ_TIMEOUT = config("STORAGE_READ_TIMEOUT", default=10.0, cast=float)
+# Upper bound for one storage operation including retries
+STORAGE_CALL_DEADLINE = config("STORAGE_CALL_DEADLINE", default=20.0, cast=float)
+# Load shedding (accounts.load_shedding): storage calls in flight per worker process
+# adapt between these bounds; calls slower than STORAGE_SLOW_CALL_SECONDS count as
+# failures, and that many consecutive failures open the circuit for a while, during
+# which reads serve stored URLs and uploads are refused with 503
+STORAGE_CONCURRENCY_MIN = config("STORAGE_CONCURRENCY_MIN", default=2, cast=int)
+STORAGE_CONCURRENCY_MAX = config(
+    "STORAGE_CONCURRENCY_MAX", default=STORAGE_HTTP_POOL_SIZE, cast=int
+)
+STORAGE_SLOW_CALL_SECONDS = config("STORAGE_SLOW_CALL_SECONDS", default=1.0, cast=float)
+STORAGE_BREAKER_FAILURES = config("STORAGE_BREAKER_FAILURES", default=5, cast=int)
+STORAGE_BREAKER_OPEN_SECONDS = config("STORAGE_BREAKER_OPEN_SECONDS", default=10.0, cast=float)
+# Shared secret in the Pub/Sub push endpoint URL for storage upload notifications
+STORAGE_EVENTS_TOKEN = config("STORAGE_EVENTS_TOKEN", default="")
+# Generated renders (accounts.renders): byte budgets enforced by evict_renders, per
+# user and for the whole bucket, and the eviction order ("lru" or "lfu"; favorites
+# are never evicted). Render accesses are written in one UPDATE per worker at most
+# every RENDER_ACCESS_FLUSH_SECONDS, and not at all for renders already marked as
+# accessed within the last RENDER_ACCESS_DEBOUNCE_SECONDS.
+RENDER_BUDGET_BYTES_PER_USER = config(
+    "RENDER_BUDGET_BYTES_PER_USER", default=200 * 1024 * 1024, cast=int
+)
+RENDER_BUDGET_BYTES_TOTAL = config(
+    "RENDER_BUDGET_BYTES_TOTAL", default=50 * 1024 * 1024 * 1024, cast=int
+)
+RENDER_EVICTION_POLICY = config("RENDER_EVICTION_POLICY", default="lru")
+RENDER_ACCESS_FLUSH_SECONDS = config("RENDER_ACCESS_FLUSH_SECONDS", default=30.0, cast=float)
+RENDER_ACCESS_DEBOUNCE_SECONDS = config(
+    "RENDER_ACCESS_DEBOUNCE_SECONDS", default=3600.0, cast=float
+)
+
+# Downscaled inputs for the generation API (accounts.generation_inputs) are stored
+# next to their images and cached on each worker's disk, least recently used
+# first out once the cache holds GENERATION_INPUT_CACHE_BYTES.
+GENERATION_INPUT_CACHE_DIR = config(
+    "GENERATION_INPUT_CACHE_DIR",
+    default=str(Path(tempfile.gettempdir()) / "ctrlchic-generation-inputs"),
+)
+GENERATION_INPUT_CACHE_BYTES = config(
+    "GENERATION_INPUT_CACHE_BYTES", default=1024 * 1024 * 1024, cast=int
+)
+
+# Upstream generation API (accounts.generation). The jobs a worker runs concurrently
+# are sent together in batch calls of up to GENERATION_BATCH_SIZE renders (1 for an
+# API without a batch endpoint), waiting at most GENERATION_BATCH_WAIT_MS for a batch
+# to fill, over at most GENERATION_POOL_SIZE kept-alive connections.
+GENERATION_API_URL = config("GENERATION_API_URL", default="")
+GENERATION_API_KEY = config("GENERATION_API_KEY", default="")
+GENERATION_BATCH_SIZE = config("GENERATION_BATCH_SIZE", default=8, cast=int)
+GENERATION_BATCH_WAIT_MS = config("GENERATION_BATCH_WAIT_MS", default=50.0, cast=float)
+GENERATION_POOL_SIZE = config("GENERATION_POOL_SIZE", default=4, cast=int)
+GENERATION_TIMEOUT = config("GENERATION_TIMEOUT", default=120.0, cast=float)
+# Renders each user can queue per day and per month (UTC); per-user overrides are
+# set on their GenerationQuota row. Failed renders are refunded.
+GENERATION_QUOTA_DAILY = config("GENERATION_QUOTA_DAILY", default=20, cast=int)
+GENERATION_QUOTA_MONTHLY = config("GENERATION_QUOTA_MONTHLY", default=200, cast=int)
 
 # File Upload Settings
 MEDIA_URL = "/media/"
@@ -0,0 +1,50 @@
+"""
+Settings for the API benchmark harness (python manage.py benchmark_api).
+
+Uses the regular database settings (local PostgreSQL by default) with Firebase
+token verification and storage replaced by local stand-ins:
+
+    python manage.py benchmark_api --settings=config.settings_benchmark
+"""
+
+import json
+
+from .settings import *  # noqa: F401,F403
+from .settings import REST_FRAMEWORK, config
+
+DEBUG = False
+ALLOWED_HOSTS = ["*"]
+
+# Per-request query and storage call counts as response headers
+EXPOSE_REQUEST_METRICS = True
+
+# Allows benchmark_api to seed and delete its own users in this database
+BENCHMARK_MODE = True
+
+# Load generators send everything from one address and a few users
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=False, cast=bool)
+
+# Accept "bench:<uid>" bearer tokens instead of verifying Firebase ID tokens
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_AUTHENTICATION_CLASSES": ["accounts.benchmark.FakeFirebaseAuthentication"],
+}
+# Simulated token verification cost in seconds
+BENCHMARK_AUTH_LATENCY = config("BENCHMARK_AUTH_LATENCY", default=0.0, cast=float)
+
+# In-memory storage with a simulated per-call latency (seconds) for storage API calls.
+# benchmark_servers switches to the local filesystem backend (STORAGE_BACKEND) so
+# objects are shared between server processes; BENCHMARK_STORAGE_OPTIONS (JSON) adds
+# backend options such as its root directory.
+STORAGE_BACKEND = config(
+    "STORAGE_BACKEND", default="accounts.storage_backends.InMemoryStorageBackend"
+)
+STORAGE_BACKEND_OPTIONS = {
+    "latency": {
+        "exists": config("BENCHMARK_STORAGE_LATENCY", default=0.02, cast=float),
+        "stat": config("BENCHMARK_STORAGE_LATENCY", default=0.02, cast=float),
+        "delete": config("BENCHMARK_STORAGE_LATENCY", default=0.02, cast=float),
+    },
+    "seed": 0,
+    **config("BENCHMARK_STORAGE_OPTIONS", default="{}", cast=json.loads),
+}
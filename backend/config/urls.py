@@ -18,20 +18,19 @@ Including another URLconf
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.http import JsonResponse
 from django.urls import include, path
 
+from accounts.metrics import metrics_view
 
-def health_check(request):
-    """Simple health check endpoint"""
-    return JsonResponse(
-        {"status": "healthy", "message": "CtrlChic API is running", "version": "1.0.0"}
-    )
-
+from .health import dependencies, health_check, liveness, readiness
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/health/", health_check, name="health_check"),
+    path("api/health/live/", liveness, name="health_live"),
+    path("api/health/ready/", readiness, name="health_ready"),
+    path("api/health/dependencies/", dependencies, name="health_dependencies"),
+    path("api/metrics/", metrics_view, name="metrics"),
     path("api/auth/", include("accounts.urls")),
 ]
 
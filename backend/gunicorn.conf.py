@@ -0,0 +1,143 @@
+"""
+Gunicorn configuration (loaded automatically when gunicorn runs from backend/).
+
+Every setting can be overridden from the environment:
+
+    GUNICORN_WORKER_CLASS   sync | gthread (default) | uvicorn
+    GUNICORN_WORKERS        worker processes (default: derived from CPU and memory)
+    GUNICORN_THREADS        threads per gthread worker (default 8)
+    GUNICORN_WORKER_MEMORY_MB  expected resident size of one worker (default 160)
+    GUNICORN_MAX_REQUESTS   recycle a worker after this many requests (default 1000)
+    GUNICORN_TIMEOUT        seconds before a silent worker is killed (default 30)
+    GUNICORN_PRELOAD        load the app in the master before forking (default true)
+
+Storage calls are I/O bound, so the default is gthread: a few processes with
+several threads each. With preload the app is imported once in the master
+and shared copy-on-write with the workers; anything holding sockets or
+threads (DB connections, the storage client, tracing exporters) is created
+lazily per process.
+
+Workers share Prometheus metrics through files in PROMETHEUS_MULTIPROC_DIR,
+which must be in the environment before any worker imports the app. Each
+worker warms up Firebase once it has loaded the app.
+"""
+
+import gc
+import math
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "ctrlchic-metrics")
+)
+
+WORKER_CLASSES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    # Django runs sync views in a single thread per worker under ASGI
+    "uvicorn": "uvicorn_worker.UvicornWorker",
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name, "")
+    return int(value) if value else default
+
+
+def cpu_count() -> int:
+    """CPUs available to this container (cgroup v2 quota, then CPU affinity)."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+
+def memory_limit_mb() -> int:
+    """Memory available to this container (cgroup v2 limit, then physical memory)."""
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+        if limit != "max":
+            return int(limit) // (1024 * 1024)
+    except (OSError, ValueError):
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+
+
+def default_workers(worker_class: str) -> int:
+    # Threaded/async workers need fewer processes for the same concurrency
+    cpus = cpu_count()
+    by_cpu = 2 * cpus + 1 if worker_class == "sync" else cpus + 1
+    # Leave a quarter of memory for the master, page cache and spikes
+    by_memory = int(memory_limit_mb() * 0.75) // _env_int("GUNICORN_WORKER_MEMORY_MB", 160)
+    return max(1, min(by_cpu, by_memory))
+
+
+_worker_kind = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+if _worker_kind not in WORKER_CLASSES:
+    raise ValueError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}")
+
+wsgi_app = "config.asgi:application" if _worker_kind == "uvicorn" else "config.wsgi:application"
+worker_class = WORKER_CLASSES[_worker_kind]
+workers = _env_int("GUNICORN_WORKERS", default_workers(_worker_kind))
+threads = _env_int("GUNICORN_THREADS", 8) if _worker_kind == "gthread" else 1
+# Settings split per-process limits (RATE_LIMIT_PROCESSES) by the worker count
+os.environ["GUNICORN_WORKERS"] = str(workers)
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Recycle workers periodically to contain slow leaks; jitter keeps them from
+# all restarting at once
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = max_requests // 10
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+accesslog = "-"
+
+
+def on_starting(server):
+    # Samples from a previous run would be aggregated into the new one
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    from django.db import connections
+
+    # Connections must never be shared between processes
+    connections.close_all()
+
+    # Move everything allocated while loading the app to a permanent generation,
+    # so the cyclic GC in workers doesn't touch (and copy) those shared pages
+    gc.collect()
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauge samples (in-flight requests)
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Pay for Firebase/storage client setup at boot rather than in the first request
+    from accounts.firebase import warmup
+    from accounts.tracing import ensure_configured
+
+    warmup()
+    # The exporter and its export thread belong to this worker, not the master
+    ensure_configured()
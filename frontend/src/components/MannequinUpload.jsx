@@ -56,14 +56,12 @@ export default function MannequinUpload() {
         }
       );
 
-      const { uploadUrl, filePath } = uploadUrlResponse.data;
+      const { uploadUrl, uploadHeaders, filePath } = uploadUrlResponse.data;
 
       // Step 2: Upload directly to Firebase Storage
       await fetch(uploadUrl, {
         method: 'PUT',
-        headers: {
-          'Content-Type': file.type
-        },
+        headers: uploadHeaders,
         body: file
       });
 
@@ -74,12 +74,12 @@ export default function WardrobeManager({
         { headers: { Authorization: `Bearer ${token}` } }
       );
 
-      const { uploadUrl, itemId, filePath } = uploadUrlResponse.data;
+      const { uploadUrl, uploadHeaders, itemId, filePath } = uploadUrlResponse.data;
 
       // Step 2: Upload to Firebase Storage
       await fetch(uploadUrl, {
         method: 'PUT',
-        headers: { 'Content-Type': file.type },
+        headers: uploadHeaders,
         body: file,
       });
 